@@ -0,0 +1,1351 @@
+#!/usr/bin/env python3.7
+"""
+::
+
+  File:    buskill_benchmark.py
+
+This is a small benchmark harness for developers of the BusKill app. It is not used by the app itself. Execute it from the 'src' dir, for example:
+
+  python3 buskill_benchmark.py arm --iterations 20
+  python3 buskill_benchmark.py hotplug --events 1000 --rate 200
+  python3 buskill_benchmark.py uevent --events 1000 --rate 200
+  python3 buskill_benchmark.py helper --iterations 100
+  python3 buskill_benchmark.py race --iterations 10 --slow-fail 250
+  python3 buskill_benchmark.py dbus --iterations 100
+  python3 buskill_benchmark.py slowlog --iterations 20 --log-delay 5
+  python3 buskill_benchmark.py diagnostics --iterations 10
+  python3 buskill_benchmark.py imports
+  python3 buskill_benchmark.py cli --iterations 10
+  python3 buskill_benchmark.py datadir --iterations 10 --stall 5000
+  python3 buskill_benchmark.py wipe --iterations 5 --cache-mb 200
+  python3 buskill_benchmark.py gui --iterations 5
+  python3 buskill_benchmark.py capabilities --iterations 100
+  python3 buskill_benchmark.py daemon --iterations 20
+  python3 buskill_benchmark.py mirrors --iterations 10 --mirror-delay 250 --throughput-window 2
+
+The 'imports' check exits non-zero if arming & disarming imports any of the modules that only the upgrade needs (the network & crypto stack), or if `buskill --stats` or `buskill --status` imports libusb or packages.buskill, so it can be used as a regression test.
+
+The 'gui' benchmark launches the GUI, so it needs kivy and a display.
+
+The benchmarks (and the instances of BusKill that they launch) use a data dir in a temp dir that's deleted when they finish, so they never write to the real data dir. The 'arm', 'hotplug' and 'slowlog' benchmarks use a fake libusb context, so they don't need libusb.
+
+The 'mirrors' benchmark serves stub update mirrors on localhost and checks their "signatures" with a fake gpg, so it never touches the real mirrors nor needs the release key.
+
+The 'hotplug' benchmark uses a fake libusb context that injects synthetic events and a mock trigger that records timestamps, so it doesn't need any usb hardware and never actually locks or shuts down the machine. The 'uevent' benchmark does the same for the Linux uevent detector by replaying captured kernel uevents into one end of a socketpair. The 'dbus' benchmark starts a private dbus-daemon with a stub screen locker, so it never locks the real screen.
+
+For more info, see: https://buskill.in/
+"""
+
+################################################################################
+#                                   IMPORTS                                    #
+################################################################################
+
+import argparse, logging, os, queue, shutil, socket, statistics, subprocess, sys, tempfile, threading, time, types
+
+# the 'hotplug' benchmark doesn't need real usb hardware nor libusb, so we
+# fall back to a fake usb1 module with just the constants that we use if the
+# real one isn't installed (eg on a headless CI box)
+try:
+	import usb1
+except ImportError:
+	usb1 = types.ModuleType( 'usb1' )
+	usb1.__version__ = 'fake'
+	usb1.CAP_HAS_HOTPLUG = 0x0001
+	usb1.HOTPLUG_EVENT_DEVICE_ARRIVED = 0x01
+	usb1.HOTPLUG_EVENT_DEVICE_LEFT = 0x02
+	usb1.USBContext = None
+	sys.modules['usb1'] = usb1
+
+import buskill_logging
+import buskill_diagnostics
+import buskill_platform
+import buskill_profile
+import buskill_control
+import packages.buskill
+import packages.buskill.uevent_lin
+import packages.buskill.dbus_lin
+import packages.buskill.capability_cache
+
+################################################################################
+#                                  SETTINGS                                    #
+################################################################################
+
+# kernel uevents captured with a netlink socket while a usb drive was plugged
+# into (and then removed from) a hub. Note that only the 'remove' of the
+# 'usb_device' should be detected as a removal
+CAPTURED_UEVENTS = [
+ b'add@/devices/pci0000:00/0000:00:14.0/usb3/3-1/3-1.4\0ACTION=add\0DEVPATH=/devices/pci0000:00/0000:00:14.0/usb3/3-1/3-1.4\0SUBSYSTEM=usb\0MAJOR=189\0MINOR=260\0DEVNAME=bus/usb/003/005\0DEVTYPE=usb_device\0PRODUCT=1209/2aba/100\0TYPE=0/0/0\0BUSNUM=003\0DEVNUM=005\0SEQNUM=5123\0',
+ b'add@/devices/pci0000:00/0000:00:14.0/usb3/3-1/3-1.4/3-1.4:1.0\0ACTION=add\0DEVPATH=/devices/pci0000:00/0000:00:14.0/usb3/3-1/3-1.4/3-1.4:1.0\0SUBSYSTEM=usb\0DEVTYPE=usb_interface\0PRODUCT=1209/2aba/100\0TYPE=0/0/0\0INTERFACE=8/6/80\0MODALIAS=usb:v1209p2ABAd0100dc00dsc00dp00ic08isc06ip50in00\0SEQNUM=5124\0',
+ b'remove@/devices/pci0000:00/0000:00:14.0/usb3/3-1/3-1.4/3-1.4:1.0\0ACTION=remove\0DEVPATH=/devices/pci0000:00/0000:00:14.0/usb3/3-1/3-1.4/3-1.4:1.0\0SUBSYSTEM=usb\0DEVTYPE=usb_interface\0PRODUCT=1209/2aba/100\0TYPE=0/0/0\0INTERFACE=8/6/80\0MODALIAS=usb:v1209p2ABAd0100dc00dsc00dp00ic08isc06ip50in00\0SEQNUM=5131\0',
+ b'remove@/devices/pci0000:00/0000:00:14.0/usb3/3-1/3-1.4\0ACTION=remove\0DEVPATH=/devices/pci0000:00/0000:00:14.0/usb3/3-1/3-1.4\0SUBSYSTEM=usb\0MAJOR=189\0MINOR=260\0DEVNAME=bus/usb/003/005\0DEVTYPE=usb_device\0PRODUCT=1209/2aba/100\0TYPE=0/0/0\0BUSNUM=003\0DEVNUM=005\0SEQNUM=5132\0',
+]
+
+# modules that only the upgrade needs. None of them should be imported just to
+# arm & disarm
+UPGRADE_ONLY_MODULES = [
+ 'packages.buskill.upgrade', 'urllib.request', 'http.client', 'ssl', 'certifi',
+ 'gnupg', 'distutils', 'setuptools', 'pkg_resources'
+]
+
+# modules that the CLI's clients of a running instance (--stats, --status)
+# shouldn't import, because they'd initialize libusb & the whole core
+CORE_MODULES = [ 'usb1', 'packages.buskill' ]
+
+# executes `main.py <args>` and then prints which of CORE_MODULES it imported
+CLI_IMPORTS_CODE = """
+import sys, runpy
+sys.argv = [ 'main.py', '--quiet' ] + sys.argv[1:]
+try:
+	runpy.run_path( 'main.py', run_name='__main__' )
+except SystemExit:
+	pass
+print( 'imported: ' + ' '.join( name for name in %r if name in sys.modules ) )
+""" % ( CORE_MODULES, )
+
+# the benchmarks replace the dirs in which BusKill may create its data dir (see
+# buskill_platform.get_data_dir_candidates()) with these dirs in a temp dir, so
+# that they never write to the real data dir
+TEMP_DATA_DIR_CANDIDATES = [ 'apps', 'app', 'home' ]
+
+# executes `main.py <args>` like `python3 main.py <args>` would, except that
+# its data dir is in the temp dir chosen by use_temp_data_dir()
+MAIN_CODE = """
+import os, sys, runpy
+sys.argv = sys.argv[1:]
+sys.path[0] = os.path.dirname( os.path.abspath( sys.argv[0] ) )
+import buskill_platform
+temp_dir = os.environ['BUSKILL_BENCHMARK_DATA_DIR']
+buskill_platform.get_data_dir_candidates = lambda apps_dir, app_dir: [
+ os.path.join( temp_dir, name ) for name in %r
+]
+runpy.run_path( sys.argv[0], run_name='__main__' )
+""" % ( TEMP_DATA_DIR_CANDIDATES, )
+
+################################################################################
+#                                   OBJECTS                                    #
+################################################################################
+
+# stands-in for a usb1.USBDevice in the events injected by FakeUSBContext
+class FakeUSBDevice:
+
+	def __init__( self, vendor_id=0x1209, product_id=0x2aba, bus=1, port_numbers=[1] ):
+		self.vendor_id = vendor_id
+		self.product_id = product_id
+		self.bus = bus
+		self.port_numbers = port_numbers
+
+	def getVendorID( self ):
+		return self.vendor_id
+
+	def getProductID( self ):
+		return self.product_id
+
+	def getBusNumber( self ):
+		return self.bus
+
+	def getPortNumberList( self ):
+		return self.port_numbers
+
+	def close( self ):
+		pass
+
+# stands-in for usb1.USBContext. Events are injected with inject() from any
+# thread and delivered to the registered callbacks by handleEvents() in the
+# listener's thread, just like libusb does
+class FakeUSBContext:
+
+	# the context that's currently open, so the benchmark can inject events
+	instance = None
+
+	def __init__( self ):
+		self.events = queue.Queue()
+		self.callbacks = dict()
+		self.deliveries = dict()
+		FakeUSBContext.instance = self
+
+	def __enter__( self ):
+		return self
+
+	def __exit__( self, *args ):
+		FakeUSBContext.instance = None
+
+	def hasCapability( self, capability ):
+		return True
+
+	def hotplugRegisterCallback( self, callback, **kwargs ):
+		opaque = len( self.callbacks )
+		self.callbacks[opaque] = callback
+		return opaque
+
+	def hotplugDeregisterCallback( self, opaque ):
+		del self.callbacks[opaque]
+
+	def getDeviceIterator( self, skip_on_error=False ):
+		return iter( [ FakeUSBDevice() ] )
+
+	def inject( self, event_id, event, device ):
+		self.events.put( (event_id, event, device) )
+
+	def interruptEventHandler( self ):
+		self.events.put( None )
+
+	def handleEventsTimeout( self, tv=0 ):
+
+		try:
+			item = self.events.get( timeout=tv )
+		except queue.Empty:
+			return
+
+		# None is the sentinel from interruptEventHandler()
+		if item == None:
+			return
+
+		event_id, event, device = item
+		self.deliveries[event_id] = time.perf_counter()
+		for callback in list( self.callbacks.values() ):
+			callback( self, device, event )
+
+	def handleEvents( self ):
+		self.handleEventsTimeout( tv=60 )
+
+# a mock trigger that records when it was called (and when it finished) for
+# each event, instead of actually locking or shutting down the machine
+class MockTrigger:
+
+	def __init__( self, duration=0 ):
+		self.duration = duration
+		self.invocations = list()
+		self.completions = list()
+
+	def __call__( self ):
+		self.invocations.append( time.perf_counter() )
+		if self.duration:
+			time.sleep( self.duration )
+		self.completions.append( time.perf_counter() )
+
+# a logging handler that takes 'delay' seconds to write each record, like a
+# log file on a slow (or very busy) usb drive
+class SlowHandler( logging.Handler ):
+
+	def __init__( self, delay ):
+		super().__init__()
+		self.delay = delay
+
+	def emit( self, record ):
+		self.format( record )
+		time.sleep( self.delay )
+
+# a stub D-Bus service that owns the given name on a private bus (standing-in
+# for a desktop's screen locker or logind) and records when Lock and PowerOff
+# calls arrive. Of course, it doesn't actually lock or power off anything
+class StubDBusService:
+
+	def __init__( self, address, name, calls, can_power_off='yes' ):
+
+		self.connection = packages.buskill.dbus_lin.DBusConnection( address )
+		self.connection.request_name( name )
+		self.calls = calls
+		self.can_power_off = can_power_off
+
+		self.thread = threading.Thread( target=self.serve, daemon=True )
+		self.thread.start()
+
+	def serve( self ):
+
+		dbus_lin = packages.buskill.dbus_lin
+		while True:
+			try:
+				call = self.connection.recv_message()
+			except Exception:
+				return
+
+			if call.type != dbus_lin.METHOD_CALL:
+				continue
+
+			if call.member in ['Lock', 'PowerOff']:
+				self.calls.put( time.perf_counter() )
+				self.connection.reply( call )
+			elif call.member in ['GetSessionByPID', 'GetSession']:
+				self.connection.reply( call, 'o', ['/org/freedesktop/login1/session/stub'] )
+			elif call.member == 'CanPowerOff':
+				self.connection.reply( call, 's', [self.can_power_off] )
+			else:
+				self.connection.reply_error( call, 'org.freedesktop.DBus.Error.UnknownMethod' )
+
+# stands-in for a gnupg.GPG; only the signature b'valid' is valid
+class FakeGPG:
+
+	def __init__( self, upgrade ):
+		self.upgrade = upgrade
+
+	def verify_file( self, fd, data_filepath ):
+
+		if fd.read() == b'valid':
+			fingerprint = self.upgrade.RELEASE_KEY_SUB_FINGERPRINT
+		else:
+			fingerprint = None
+
+		return types.SimpleNamespace(
+		 fingerprint = fingerprint,
+		 status = 'signature valid',
+		 sig_info = { 'stub': {
+		  'fingerprint': self.upgrade.RELEASE_KEY_SUB_FINGERPRINT,
+		  'pubkey_fingerprint': self.upgrade.RELEASE_KEY_FINGERPRINT,
+		  'status': 'signature valid',
+		 } }
+		)
+
+################################################################################
+#                                 FUNCTIONS                                    #
+################################################################################
+
+# starts a stub update mirror in a thread and returns the url of its metadata.
+# It serves 'meta.json' and 'meta.json.asc' after waiting 'delay' seconds, and
+# the "signature" is 'signature' (see FakeGPG). Any other file is 'body',
+# trickled at 'bytes_per_second' (if given)
+def start_stub_mirror( delay, signature, body=b'', bytes_per_second=None ):
+
+	# http.server imports the network stack, which the 'imports' check
+	# doesn't expect to find in sys.modules
+	import http.server
+
+	class StubMirrorHandler( http.server.BaseHTTPRequestHandler ):
+
+		def do_GET( self ):
+
+			time.sleep( self.server.delay )
+
+			if self.path.endswith( '.asc' ):
+				body = self.server.signature
+			elif self.path.endswith( 'meta.json' ):
+				body = b'{}'
+			else:
+				body = self.server.body
+
+			self.send_response( 200 )
+			self.send_header( 'Content-Length', str(len(body)) )
+			self.end_headers()
+
+			if self.server.bytes_per_second == None:
+				self.wfile.write( body )
+				return
+
+			try:
+				for offset in range( 0, len(body), 256 ):
+					self.wfile.write( body[offset:offset+256] )
+					self.wfile.flush()
+					time.sleep( 256 / self.server.bytes_per_second )
+			except OSError:
+				# the client gave up on us
+				pass
+
+		def log_message( self, *args ):
+			pass
+
+	server = http.server.ThreadingHTTPServer( ('127.0.0.1', 0), StubMirrorHandler )
+	server.daemon_threads = True
+	server.delay = delay
+	server.signature = signature
+	server.body = body
+	server.bytes_per_second = bytes_per_second
+	threading.Thread( target=server.serve_forever, daemon=True ).start()
+
+	return 'http://127.0.0.1:' +str(server.server_port)+ '/meta.json'
+
+# returns the given percentile of the samples (nearest-rank method)
+def percentile( samples, pct ):
+
+	ordered = sorted( samples )
+	rank = max( 0, int( round( pct / 100 * len(ordered) + 0.5 ) ) - 1 )
+	return ordered[ min( rank, len(ordered) - 1 ) ]
+
+# prints one row of results with the p50/p99/max of the given samples (in
+# seconds) in milliseconds
+def report_percentiles( name, samples ):
+
+	if not samples:
+		print( "  {:<28} n=0".format( name ) )
+		return
+
+	samples_ms = [ sample * 1000 for sample in samples ]
+	print(
+	 "  {:<28} n={:<5} p50={:>9.3f}ms  p99={:>9.3f}ms  max={:>9.3f}ms".format(
+	  name,
+	  len(samples_ms),
+	  percentile( samples_ms, 50 ),
+	  percentile( samples_ms, 99 ),
+	  max(samples_ms)
+	 )
+	)
+
+# prints one row of results with the min/median/max of the given samples
+# (in seconds) in milliseconds
+def report( name, samples ):
+
+	samples_ms = [ sample * 1000 for sample in samples ]
+	print(
+	 "  {:<28} n={:<5} min={:>9.3f}ms  median={:>9.3f}ms  max={:>9.3f}ms".format(
+	  name,
+	  len(samples_ms),
+	  min(samples_ms),
+	  statistics.median(samples_ms),
+	  max(samples_ms)
+	 )
+	)
+
+# points BusKill at data dir candidates in 'temp_dir' (and at 'temp_dir' as its
+# temp dir) in this process and in the processes that it launches, including
+# those launched with MAIN_CODE
+def use_temp_data_dir( temp_dir ):
+
+	for name in TEMP_DATA_DIR_CANDIDATES:
+		os.makedirs( os.path.join( temp_dir, name ), exist_ok=True )
+
+	os.environ['BUSKILL_BENCHMARK_DATA_DIR'] = temp_dir
+	os.environ['TMPDIR'] = temp_dir
+	tempfile.tempdir = temp_dir
+	buskill_platform.get_data_dir_candidates = lambda apps_dir, app_dir: [
+	 os.path.join( temp_dir, name ) for name in TEMP_DATA_DIR_CANDIDATES
+	]
+
+# measures how long it takes to go from disarmed to armed (the listener has
+# registered its callback) and from armed back to disarmed for each of the
+# arm engines supported on this platform
+def benchmark_arm( args ):
+
+	# swap-in our fake libusb context (before the warm-standby child is forked,
+	# so that it uses it too) and our mock trigger
+	real_usb_context = packages.buskill.usb1.USBContext
+	packages.buskill.usb1.USBContext = FakeUSBContext
+
+	bk = packages.buskill.BusKill()
+	bk.TRIGGER_FUNCTION = MockTrigger()
+
+	print( "arm->armed and disarm->idle latency" )
+	try:
+		for engine in bk.SUPPORTED_ARM_ENGINES:
+			bk.set_arm_engine( engine )
+
+			arm_samples = []
+			disarm_samples = []
+			for i in range( args.iterations ):
+
+				start = time.perf_counter()
+				bk.toggle()
+				bk.usb_handler_ready.wait()
+				arm_samples.append( time.perf_counter() - start )
+
+				start = time.perf_counter()
+				bk.toggle()
+				disarm_samples.append( time.perf_counter() - start )
+
+			report( engine+ " arm", arm_samples )
+			report( engine+ " disarm", disarm_samples )
+
+	finally:
+		packages.buskill.usb1.USBContext = real_usb_context
+
+	bk.close()
+
+# injects synthetic DEVICE_ARRIVED/DEVICE_LEFT events into an armed BusKill
+# (with a fake libusb context) and measures the latency from the event being
+# delivered to the callback to the trigger being called & finishing
+def benchmark_hotplug( args ):
+
+	bk = packages.buskill.BusKill()
+
+	# swap-in our fake libusb context and our mock trigger
+	real_usb_context = packages.buskill.usb1.USBContext
+	packages.buskill.usb1.USBContext = FakeUSBContext
+	trigger = MockTrigger( duration = args.trigger_duration / 1000 )
+	bk.TRIGGER_FUNCTION = trigger
+
+	# measure every removal, rather than just the first one
+	bk.set_rearm_policy( 'after-trigger' )
+	bk.trigger_coalesce_window = 0
+
+	try:
+		bk.set_arm_engine( 'thread' )
+		bk.toggle()
+		context = FakeUSBContext.instance
+
+		# every other event is a removal, and only removals call the trigger
+		device = FakeUSBDevice()
+		interval = 1 / args.rate
+		removals = list()
+		start = time.perf_counter()
+		for event_id in range( args.events ):
+
+			if event_id % 2:
+				event = usb1.HOTPLUG_EVENT_DEVICE_LEFT
+				removals.append( event_id )
+			else:
+				event = usb1.HOTPLUG_EVENT_DEVICE_ARRIVED
+
+			context.inject( event_id, event, device )
+
+			# sleep until it's time to inject the next event
+			delay = start + (event_id+1) * interval - time.perf_counter()
+			if delay > 0:
+				time.sleep( delay )
+
+		# wait for the listener to catch-up before we disarm
+		while not context.events.empty():
+			time.sleep( 0.01 )
+		bk.toggle()
+
+	finally:
+		packages.buskill.usb1.USBContext = real_usb_context
+
+	invoke_samples = list()
+	complete_samples = list()
+	for event_id, invocation, completion in zip(
+	 removals, trigger.invocations, trigger.completions
+	):
+		delivery = context.deliveries[event_id]
+		invoke_samples.append( invocation - delivery )
+		complete_samples.append( completion - delivery )
+
+	print(
+	 "hotplug event -> trigger latency (" +str(args.events)+ " events @ " \
+	 +str(args.rate)+ "/s, " +str(len(removals))+ " removals, " \
+	 +str(len(trigger.invocations))+ " triggers)"
+	)
+	report_percentiles( "delivery -> trigger called", invoke_samples )
+	report_percentiles( "delivery -> trigger finished", complete_samples )
+
+	bk.close()
+
+# replays captured kernel uevents through a socketpair into an armed BusKill
+# (with the 'uevent' detector) and measures the latency from the removal
+# being sent to the trigger being called & finishing
+def benchmark_uevent( args ):
+
+	bk = packages.buskill.BusKill()
+	bk.set_detector( 'uevent' )
+
+	# swap-in one end of a socketpair for the netlink socket
+	listener_sock, replay_sock = socket.socketpair( socket.AF_UNIX, socket.SOCK_DGRAM )
+	real_open_socket = packages.buskill.uevent_lin.open_socket
+	packages.buskill.uevent_lin.open_socket = lambda: listener_sock
+	trigger = MockTrigger( duration = args.trigger_duration / 1000 )
+	bk.TRIGGER_FUNCTION = trigger
+
+	# measure every removal, rather than just the first one
+	bk.set_rearm_policy( 'after-trigger' )
+	bk.trigger_coalesce_window = 0
+
+	try:
+		bk.set_arm_engine( 'thread' )
+		bk.toggle()
+
+		# each cycle replays the whole capture, which has exactly one removal
+		interval = len( CAPTURED_UEVENTS ) / args.rate
+		cycles = max( 1, args.events // len( CAPTURED_UEVENTS ) )
+		removals = list()
+		start = time.perf_counter()
+		for cycle in range( cycles ):
+
+			packages.buskill.uevent_lin.replay_uevents( replay_sock, CAPTURED_UEVENTS[0:-1] )
+			removals.append( time.perf_counter() )
+			packages.buskill.uevent_lin.replay_uevents( replay_sock, CAPTURED_UEVENTS[-1:] )
+
+			# sleep until it's time to replay the next cycle
+			delay = start + (cycle+1) * interval - time.perf_counter()
+			if delay > 0:
+				time.sleep( delay )
+
+		# wait for the listener to catch-up before we disarm
+		deadline = time.perf_counter() + 5
+		while len( trigger.completions ) < len( removals ) and time.perf_counter() < deadline:
+			time.sleep( 0.01 )
+		bk.toggle()
+
+	finally:
+		packages.buskill.uevent_lin.open_socket = real_open_socket
+		replay_sock.close()
+
+	invoke_samples = [ invocation - sent for sent, invocation in zip( removals, trigger.invocations ) ]
+	complete_samples = [ completion - sent for sent, completion in zip( removals, trigger.completions ) ]
+
+	print(
+	 "uevent removal -> trigger latency (" +str(cycles * len(CAPTURED_UEVENTS))+ " uevents, " \
+	 +str(len(removals))+ " removals, " +str(len(trigger.invocations))+ " triggers)"
+	)
+	report_percentiles( "sent -> trigger called", invoke_samples )
+	report_percentiles( "sent -> trigger finished", complete_samples )
+
+	bk.close()
+
+# measures how long it takes to execute a trigger's command (a harmless
+# 'true' instead of actually locking the screen) from the moment that the
+# trigger fires, with and without the pre-spawned trigger helper
+def benchmark_helper( args ):
+
+	bk = packages.buskill.BusKill()
+	argv = ['true']
+
+	# respawning the helper after it fires isn't part of the trigger path
+	bk.set_rearm_policy( 'disarm' )
+
+	without_samples = list()
+	with_samples = list()
+	for i in range( args.iterations ):
+
+		start = time.perf_counter()
+		bk.run_trigger_command( argv )
+		without_samples.append( time.perf_counter() - start )
+
+		# spawning the helper happens when we arm, so it's not measured
+		bk.spawn_trigger_helper( argv )
+
+		# and by the time the usb drive is pulled the helper's shell has long
+		# since started and is blocked on read
+		time.sleep( 0.02 )
+
+		start = time.perf_counter()
+		bk.run_trigger_command( argv )
+		with_samples.append( time.perf_counter() - start )
+
+	print( "removal -> trigger command finished" )
+	report( "without trigger helper", without_samples )
+	report( "with trigger helper", with_samples )
+
+	bk.close()
+
+# measures how long it takes for the trigger to succeed when its first
+# mechanism is slow to fail (eg `xdg-screensaver` timing-out on a desktop that
+# it doesn't support), trying the mechanisms serially vs racing them
+def benchmark_race( args ):
+
+	bk = packages.buskill.BusKill()
+
+	slow_fail_seconds = args.slow_fail / 1000
+	candidates = [
+	 ( 'slow-fail', ['sh', '-c', 'sleep ' +str(slow_fail_seconds)+ '; exit 1'] ),
+	 ( 'fast-fail', ['false'] ),
+	 ( 'works', ['true'] ),
+	]
+
+	serial_samples = list()
+	race_samples = list()
+	wins = dict()
+	for i in range( args.iterations ):
+
+		start = time.perf_counter()
+		for name, argv in candidates:
+			if bk.run_trigger_command( argv ).returncode == 0:
+				break
+		serial_samples.append( time.perf_counter() - start )
+
+		start = time.perf_counter()
+		winner = bk.race_trigger_commands( candidates )
+		race_samples.append( time.perf_counter() - start )
+		wins[winner] = wins.get( winner, 0 ) + 1
+
+	print( "trigger fired -> first mechanism succeeded" )
+	report( "serial", serial_samples )
+	report( "race", race_samples )
+
+	print( "race winners: " +str(wins) )
+	print( "last race:" )
+	for result in bk.trigger_race_results:
+		if result['seconds'] == None:
+			print( "  %-12s still running" % result['name'] )
+		else:
+			print( "  %-12s returncode=%s after %8.3fms" % (
+			 result['name'], result['returncode'], result['seconds']*1000
+			) )
+
+	bk.close()
+
+# measures the latency from a removal event being delivered to the trigger
+# being called when every log record takes '--log-delay' ms to write, with
+# the records written synchronously (like logging.basicConfig()) vs queued
+# to a background thread (like buskill_logging.setup_logging())
+def benchmark_slowlog( args ):
+
+	bk = packages.buskill.BusKill()
+
+	# swap-in our fake libusb context
+	real_usb_context = packages.buskill.usb1.USBContext
+	packages.buskill.usb1.USBContext = FakeUSBContext
+
+	# measure every removal, rather than just the first one
+	bk.set_rearm_policy( 'after-trigger' )
+	bk.trigger_coalesce_window = 0
+	bk.set_arm_engine( 'thread' )
+
+	device = FakeUSBDevice()
+	print( "removal -> trigger called with a " +str(args.log_delay)+ "ms/record log" )
+	try:
+		for name, queued in [ ('synchronous logging', False), ('queued logging', True) ]:
+			buskill_logging.install( [ SlowHandler( args.log_delay / 1000 ) ], queued=queued )
+
+			trigger = MockTrigger()
+			bk.TRIGGER_FUNCTION = trigger
+			bk.toggle()
+			context = FakeUSBContext.instance
+
+			samples = list()
+			for event_id in range( args.iterations ):
+				context.inject( event_id, usb1.HOTPLUG_EVENT_DEVICE_LEFT, device )
+				while len( trigger.invocations ) <= event_id:
+					time.sleep( 0.0001 )
+				samples.append( trigger.invocations[event_id] - context.deliveries[event_id] )
+
+			bk.toggle()
+			report( name, samples )
+
+			# let the listener catch-up before the next run
+			buskill_logging.stop_listener()
+
+	finally:
+		packages.buskill.usb1.USBContext = real_usb_context
+		buskill_logging.install( buskill_logging.make_handlers() )
+		bk.close()
+
+# starts a private dbus-daemon with stub services and measures how long it
+# takes from the trigger firing to the stub receiving Lock (or PowerOff),
+# compared to forking `dbus-send` to send the same message. It also checks
+# that arming the soft-shutdown trigger fails if logind won't let us use it
+def benchmark_dbus( args ):
+
+	if shutil.which( 'dbus-daemon' ) == None:
+		print( "ERROR: This benchmark needs 'dbus-daemon'" )
+		return 1
+
+	tmpdir = tempfile.mkdtemp( prefix='buskill-benchmark-' )
+	daemon = subprocess.Popen( [
+	 'dbus-daemon', '--session', '--nofork', '--print-address=1',
+	 '--address=unix:path=' + os.path.join( tmpdir, 'bus' )
+	], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True )
+
+	try:
+		address = daemon.stdout.readline().strip()
+		calls = queue.Queue()
+
+		# the same private bus stands-in for both the session & system buses
+		os.environ['DBUS_SESSION_BUS_ADDRESS'] = address
+		os.environ['DBUS_SYSTEM_BUS_ADDRESS'] = address
+
+		bk = packages.buskill.BusKill()
+		logind = StubDBusService( address, 'org.freedesktop.login1', calls )
+
+		rounds = [
+		 ( 'lock-screen', None ),
+		 ( 'lock-screen', 'org.freedesktop.ScreenSaver' ),
+		 ( 'soft-shutdown', None ),
+		]
+		for trigger, name in rounds:
+			if name != None:
+				StubDBusService( address, name, calls )
+
+			# we don't use set_trigger() because we never want to fallback to
+			# executing the real `shutdown` binary
+			bk.trigger = trigger
+			bk.prepare_dbus_trigger()
+			method = bk.trigger_dbus_method
+			print( trigger+ ": " +str(method) )
+
+			dbus_samples = list()
+			for i in range( args.iterations ):
+				start = time.perf_counter()
+				bk.trigger_lin_dbus()
+				dbus_samples.append( calls.get( timeout=5 ) - start )
+
+			send_samples = list()
+			if shutil.which( 'dbus-send' ) != None:
+				send_args = [ 'boolean:' +str(arg).lower() for arg in method.args ]
+				for i in range( args.iterations ):
+					start = time.perf_counter()
+					subprocess.run( [
+					 'dbus-send', '--bus=' + address, '--print-reply',
+					 '--dest=' + method.destination, method.path,
+					 method.interface + '.' + method.member
+					] + send_args, stdout=subprocess.DEVNULL )
+					send_samples.append( calls.get( timeout=5 ) - start )
+
+			print( "trigger -> stub received " +str(method.member) )
+			report( "pre-opened D-Bus connection", dbus_samples )
+			if len(send_samples) > 0:
+				report( "dbus-send", send_samples )
+
+			bk.close_dbus_trigger()
+
+		# now logind will only let us power off if someone authenticates
+		logind.can_power_off = 'challenge'
+		try:
+			bk.check_trigger()
+			print( "ERROR: arming soft-shutdown didn't fail with CanPowerOff=challenge" )
+			return 1
+		except RuntimeWarning:
+			print( "arming soft-shutdown with CanPowerOff=challenge fails, as expected" )
+
+	finally:
+		daemon.kill()
+		daemon.wait()
+		shutil.rmtree( tmpdir, ignore_errors=True )
+
+################################################################################
+#                                  MAIN BODY                                   #
+################################################################################
+
+# this is executed in a fresh python process by benchmark_diagnostics(), since
+# the platform module caches what it finds. It prints how long (in seconds)
+# the startup diagnostics took in the main thread and until they were written
+def diagnostics_child( mode ):
+
+	use_temp_data_dir( os.environ['BUSKILL_BENCHMARK_DATA_DIR'] )
+	buskill_logging.set_echo( False )
+	buskill_logging.setup_logging(
+	 os.path.join( tempfile.gettempdir(), 'buskill-benchmark.log' )
+	)
+	bk = packages.buskill.BusKill()
+	buskill_logging.flush()
+
+	start = time.monotonic()
+	if mode == 'eager':
+		# what main.py and BusKill.__init__() used to do on every launch
+		for key, value in buskill_diagnostics.collect( bk ):
+			msg = str(key)+ '|' +str(value)+ '|'
+			logging.debug( msg, extra = buskill_logging.NO_ECHO )
+	else:
+		buskill_diagnostics.remember_startup_state()
+	main_thread = time.monotonic() - start
+
+	buskill_logging.flush()
+	written = time.monotonic() - start
+
+	print( str(main_thread)+ ' ' +str(written) )
+
+# measures how much startup time we save by collecting the diagnostics only
+# when they're needed, instead of logging them all on every launch
+def benchmark_diagnostics( args ):
+
+	code = "import buskill_benchmark, sys; buskill_benchmark.diagnostics_child( sys.argv[1] )"
+
+	print( "startup diagnostics, each in a fresh process" )
+	for mode in [ 'eager', 'lazy' ]:
+
+		main_thread_samples = list()
+		written_samples = list()
+		for iteration in range( args.iterations ):
+			result = subprocess.run(
+			 [ sys.executable, '-c', code, mode ],
+			 cwd = os.path.dirname( os.path.abspath( __file__ ) ),
+			 stdout = subprocess.PIPE,
+			 check = True
+			)
+			main_thread, written = result.stdout.decode( 'utf-8' ).split()[-2:]
+			main_thread_samples.append( float(main_thread) )
+			written_samples.append( float(written) )
+
+		report( mode+ ' (main thread)', main_thread_samples )
+		report( mode+ ' (written)', written_samples )
+
+# 'preloaded' are the modules that the interpreter imported on its own (eg by
+# a .pth file) before we imported anything
+def imports_child( preloaded ):
+
+	use_temp_data_dir( os.environ['BUSKILL_BENCHMARK_DATA_DIR'] )
+	buskill_logging.set_echo( False )
+	buskill_logging.setup_logging(
+	 os.path.join( tempfile.gettempdir(), 'buskill-benchmark.log' )
+	)
+	bk = packages.buskill.BusKill()
+
+	packages.buskill.usb1.USBContext = FakeUSBContext
+	bk.TRIGGER_FUNCTION = MockTrigger()
+	bk.set_arm_engine( 'thread' )
+	bk.toggle()
+	bk.usb_handler_ready.wait()
+	bk.toggle()
+	bk.close()
+	buskill_logging.flush()
+
+	print( ' '.join(
+	 name for name in UPGRADE_ONLY_MODULES
+	 if name in sys.modules and name not in preloaded
+	) )
+
+# checks that `buskill --stats` and `buskill --status` (in fresh processes) are
+# just clients of the running instance, which is a BusKill object in this
+# process with its socket in a temp dir. Returns the number of failures
+def check_cli_imports():
+
+	runtime_dir = tempfile.mkdtemp( prefix='buskill-benchmark-' )
+	os.environ['XDG_RUNTIME_DIR'] = runtime_dir
+
+	bk = packages.buskill.BusKill()
+	if not bk.start_control_server():
+		print( "ERROR: Unable to start the control socket" )
+		return 1
+
+	failures = 0
+	try:
+		for command in [ '--stats', '--status' ]:
+			result = subprocess.run(
+			 [ sys.executable, '-c', CLI_IMPORTS_CODE, command ],
+			 cwd = os.path.dirname( os.path.abspath( __file__ ) ),
+			 stdout = subprocess.PIPE,
+			 check = True
+			)
+			imported = result.stdout.decode( 'utf-8' ).splitlines()[-1].split()[1:]
+			if imported:
+				print( "ERROR: `buskill " +command+ "` imported " +', '.join( imported ) )
+				failures += 1
+			else:
+				print( "`buskill " +command+ "` didn't import any of " +', '.join( CORE_MODULES ) )
+
+	finally:
+		bk.close()
+		shutil.rmtree( runtime_dir, ignore_errors=True )
+
+	return failures
+
+# checks that starting BusKill and arming & disarming it (in a fresh process)
+# doesn't import the upgrade's network & crypto stack, and reports how long it
+# takes to import packages.buskill. Then checks that the CLI's clients don't
+# import the core at all
+def benchmark_imports( args ):
+
+	code = "import sys; preloaded = set( sys.modules ); " \
+	 "import buskill_benchmark; buskill_benchmark.imports_child( preloaded )"
+
+	result = subprocess.run(
+	 [ sys.executable, '-X', 'importtime', '-c', code ],
+	 cwd = os.path.dirname( os.path.abspath( __file__ ) ),
+	 stdout = subprocess.PIPE,
+	 stderr = subprocess.PIPE,
+	 check = True
+	)
+
+	# lines look like 'import time:  self [us] | cumulative | module'
+	for line in result.stderr.decode( 'utf-8' ).splitlines():
+		fields = line.split( '|' )
+		if len(fields) == 3 and fields[2].strip() == 'packages.buskill':
+			print( "importing packages.buskill took " +str( int(fields[1]) / 1000 )+ "ms" )
+
+	imported = result.stdout.decode( 'utf-8' ).split()
+	if imported:
+		print( "ERROR: arming & disarming imported " +', '.join( imported ) )
+		return 1
+
+	print( "arming & disarming didn't import any of " +', '.join( UPGRADE_ONLY_MODULES ) )
+
+	if check_cli_imports() > 0:
+		return 1
+	return 0
+
+# measures how long `buskill <args>` takes (from exec to exit) for commands
+# that are answered by buskill_platform.py and, for comparison, one that
+# constructs a full BusKill object
+def benchmark_cli( args ):
+
+	# each command with the exit status it's expected to have; anything else
+	# means it crashed, and its timing would be meaningless
+	commands = [
+	 ( [ '--version' ], 0 ),
+	 ( [ '--list-triggers' ], 1 ),
+	 ( [ '--capabilities' ], 0 ),
+
+	 # with no command, the CLI constructs BusKill() and then does nothing
+	 ( [], 0 ),
+	]
+
+	main_py = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), 'main.py' )
+
+	print( "CLI invocation latency, each in a fresh process" )
+	for command, expected_returncode in commands:
+
+		samples = list()
+		for iteration in range( args.iterations ):
+			start = time.perf_counter()
+			result = subprocess.run(
+			 [ sys.executable, '-c', MAIN_CODE, main_py, '--quiet' ] + command,
+			 stdout = subprocess.DEVNULL
+			)
+			samples.append( time.perf_counter() - start )
+
+			if result.returncode != expected_returncode:
+				print( "ERROR: `buskill " +' '.join( command )+ "` exited with " +str(result.returncode) )
+				return 1
+
+		name = ' '.join( command )
+		if name == '':
+			name = '(full BusKill)'
+		report( name, samples )
+
+# measures how long BusKill.setupDataDir() takes to choose the data dir when
+# it has to probe every candidate, when it can use the cached choice, and when
+# the first candidate is a dead mount (simulated with a probe that hangs for
+# --stall ms)
+def benchmark_datadir( args ):
+
+	bk = packages.buskill.BusKill()
+	cache_path = bk.get_data_dir_cache_path()
+	real_is_writable_dir = bk.is_writable_dir
+	stalled_dir = buskill_platform.get_data_dir_candidates( bk.APPS_DIR, bk.APP_DIR )[0]
+
+	def stalled_is_writable_dir( path ):
+		if path == stalled_dir:
+			time.sleep( args.stall / 1000 )
+		return real_is_writable_dir( path )
+
+	print( "data dir selection (DATA_DIR_PROBE_TIMEOUT=" +str(packages.buskill.DATA_DIR_PROBE_TIMEOUT)+ "s)" )
+	for name in [ 'probe', 'cached', 'stalled probe' ]:
+
+		samples = list()
+		for iteration in range( args.iterations ):
+
+			if name != 'cached' and os.path.exists( cache_path ):
+				os.remove( cache_path )
+
+			if name == 'stalled probe':
+				bk.is_writable_dir = stalled_is_writable_dir
+			else:
+				bk.is_writable_dir = real_is_writable_dir
+
+			start = time.perf_counter()
+			bk.setupDataDir()
+			samples.append( time.perf_counter() - start )
+
+		report( name, samples )
+
+	bk.is_writable_dir = real_is_writable_dir
+	bk.close()
+
+# fills the cache dir with --cache-mb of files (like a downloaded release and
+# its extracted tree) and measures how long wipeCache() blocks its caller,
+# compared to deleting the cache in the foreground like it used to
+def benchmark_wipe( args ):
+
+	bk = packages.buskill.BusKill()
+
+	def fill_cache():
+		chunk = b'\0' * 65536
+		for index in range( int( args.cache_mb * 16 ) ):
+			subdir = os.path.join( bk.CACHE_DIR, str( index % 64 ) )
+			os.makedirs( subdir, exist_ok=True )
+			with open( os.path.join( subdir, str(index) ), 'wb' ) as f:
+				f.write( chunk )
+
+	print( "wiping a " +str(args.cache_mb)+ " MB cache dir in '" +str(bk.CACHE_DIR)+ "'" )
+
+	foreground_samples = list()
+	background_samples = list()
+	for iteration in range( args.iterations ):
+
+		fill_cache()
+		start = time.perf_counter()
+		shutil.rmtree( bk.CACHE_DIR )
+		os.makedirs( bk.CACHE_DIR )
+		foreground_samples.append( time.perf_counter() - start )
+
+		fill_cache()
+		start = time.perf_counter()
+		bk.wipeCache()
+		background_samples.append( time.perf_counter() - start )
+		bk.cache_reaper.join()
+
+	report( "rmtree (foreground)", foreground_samples )
+	report( "wipeCache()", background_samples )
+
+	bk.close()
+
+# launches the GUI with --profile-startup and measures the time from launch to
+# its first frame (as reported by buskill_profile.py) before closing it
+def benchmark_gui( args ):
+
+	main_py = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), 'main.py' )
+	profile_path = os.path.join(
+	 tempfile.gettempdir(), buskill_profile.PROFILE_FILE_NAME
+	)
+
+	print( "GUI time to first frame, each in a fresh process" )
+	samples = list()
+	for iteration in range( args.iterations ):
+
+		if os.path.exists( profile_path ):
+			os.remove( profile_path )
+
+		gui = subprocess.Popen(
+		 [ sys.executable, '-c', MAIN_CODE, main_py, '--profile-startup' ],
+		 stdout = subprocess.DEVNULL,
+		 stderr = subprocess.DEVNULL
+		)
+
+		# the report's 'total' line says how long it took until the first frame
+		total = None
+		deadline = time.monotonic() + 60
+		while total == None and time.monotonic() < deadline and gui.poll() == None:
+			time.sleep( 0.05 )
+			try:
+				with open( profile_path ) as profile:
+					for line in profile:
+						if line.startswith( 'total:' ):
+							total = float( line.split()[1].rstrip( 'ms' ) ) / 1000
+			except OSError:
+				pass
+
+		gui.terminate()
+		gui.wait()
+
+		if total == None:
+			print( "ERROR: The GUI didn't draw its first frame (is there a display?)" )
+			return 1
+
+		samples.append( total )
+
+	report( "launch -> first frame", samples )
+
+# measures how long it takes to load the capability profile that was stored
+# on a previous launch, compared to probing the machine for it
+def benchmark_capabilities( args ):
+
+	capability_cache = packages.buskill.capability_cache
+	path = os.path.join( tempfile.mkdtemp(), capability_cache.CAPABILITY_CACHE_FILE_NAME )
+
+	cache = capability_cache.CapabilityCache( path )
+	cache.revalidate()
+
+	load_samples = list()
+	probe_samples = list()
+	for iteration in range( args.iterations ):
+
+		start = time.perf_counter()
+		capability_cache.CapabilityCache( path ).load()
+		load_samples.append( time.perf_counter() - start )
+
+		start = time.perf_counter()
+		capability_cache.probe_shutdown_binaries()
+		capability_cache.probe_trigger_commands()
+		probe_samples.append( time.perf_counter() - start )
+
+	shutil.rmtree( os.path.dirname( path ) )
+
+	print( "capability profile" )
+	report( "load", load_samples )
+	report( "probe", probe_samples )
+
+# measures what a CLI command costs when a daemon is already running: one
+# round-trip on its control socket (in-process, and `buskill --status` in a
+# fresh process) versus the CLI constructing a full BusKill object. The daemon
+# is a BusKill object in this process with its socket in a temp dir, so it
+# doesn't collide with a real running instance
+def benchmark_daemon( args ):
+
+	runtime_dir = tempfile.mkdtemp( prefix='buskill-benchmark-' )
+	os.environ['XDG_RUNTIME_DIR'] = runtime_dir
+
+	bk = packages.buskill.BusKill()
+	if not bk.start_control_server():
+		print( "ERROR: Unable to start the control socket" )
+		sys.exit(1)
+
+	client = buskill_control.ControlClient( bk.control_server.path )
+	main_py = os.path.join( os.path.dirname( os.path.abspath( __file__ ) ), 'main.py' )
+
+	try:
+		round_trip_samples = list()
+		for iteration in range( args.iterations ):
+			start = time.perf_counter()
+			client.status()
+			round_trip_samples.append( time.perf_counter() - start )
+
+		cli_samples = dict()
+		for name, command in [ ( '--status (client)', [ '--status' ] ), ( '(full BusKill)', [] ) ]:
+			cli_samples[name] = list()
+			for iteration in range( args.iterations ):
+				start = time.perf_counter()
+				result = subprocess.run(
+				 [ sys.executable, '-c', MAIN_CODE, main_py, '--quiet' ] + command,
+				 stdout = subprocess.DEVNULL
+				)
+				cli_samples[name].append( time.perf_counter() - start )
+
+				# don't report the timing of a crash (eg if the client didn't
+				# find our daemon)
+				if result.returncode != 0:
+					print( "ERROR: `buskill " +' '.join( command )+ "` exited with " +str(result.returncode) )
+					return 1
+
+	finally:
+		bk.close()
+		shutil.rmtree( runtime_dir, ignore_errors=True )
+
+	print( "control socket" )
+	report( "status round-trip", round_trip_samples )
+	print( "CLI invocation latency, each in a fresh process" )
+	for name in cli_samples:
+		report( name, cli_samples[name] )
+
+# measures how long upgrade.race_metadata() takes to choose the metadata when
+# one mirror is black-holed (it accepts connections but never answers), one
+# answers immediately with an invalid signature, and one answers with a valid
+# signature after --mirror-delay ms. Then measures how long a download takes
+# to give up on a mirror that trickles 1 KB/s (with a --throughput-window
+# second window) and finish from the next mirror
+def benchmark_mirrors( args ):
+
+	from packages.buskill import upgrade
+
+	black_hole = socket.socket( socket.AF_INET, socket.SOCK_STREAM )
+	black_hole.bind( ('127.0.0.1', 0) )
+	black_hole.listen( 64 )
+
+	upgrade.UPGRADE_MIRRORS[:] = [
+	 'http://127.0.0.1:' +str(black_hole.getsockname()[1])+ '/meta.json',
+	 start_stub_mirror( 0, b'invalid' ),
+	 start_stub_mirror( args.mirror_delay / 1000, b'valid' ),
+	]
+
+	cache_dir = tempfile.mkdtemp( prefix='buskill-benchmark-' )
+	metadata_filepath = os.path.join( cache_dir, 'meta.json' )
+	signature_filepath = os.path.join( cache_dir, 'meta.json.asc' )
+	gpg = FakeGPG( upgrade )
+
+	samples = list()
+	for iteration in range( args.iterations ):
+		start = time.perf_counter()
+		upgrade.race_metadata( gpg, metadata_filepath, signature_filepath, 30 )
+		samples.append( time.perf_counter() - start )
+
+	black_hole.close()
+
+	print( "metadata race (black-holed, invalid, and valid after " +str(args.mirror_delay)+ "ms)" )
+	report( "race", samples )
+
+	upgrade.UPGRADE_THROUGHPUT_WINDOW = args.throughput_window
+	archive = os.urandom( 1024 * 1024 )
+	urls = [
+	 start_stub_mirror( 0, b'', archive, bytes_per_second=1024 ).replace( 'meta.json', 'archive' ),
+	 start_stub_mirror( 0, b'', archive ).replace( 'meta.json', 'archive' ),
+	]
+
+	samples = list()
+	for iteration in range( args.iterations ):
+		start = time.perf_counter()
+		for url in urls:
+			try:
+				with open( os.path.join( cache_dir, 'archive' ), 'wb' ) as out_file:
+					upgrade.download( url, out_file, upgrade.UPGRADE_DOWNLOAD_MAX_BYTES )
+				break
+			except upgrade.SlowMirror as e:
+				status = e.status
+		samples.append( time.perf_counter() - start )
+
+	shutil.rmtree( cache_dir )
+
+	print( "download (1 MB; trickling mirror, then a fast one)" )
+	report( "fallback", samples )
+	print( "status: " +str(status) )
+
+BENCHMARKS = {
+ 'arm': benchmark_arm,
+ 'capabilities': benchmark_capabilities,
+ 'cli': benchmark_cli,
+ 'daemon': benchmark_daemon,
+ 'datadir': benchmark_datadir,
+ 'dbus': benchmark_dbus,
+ 'diagnostics': benchmark_diagnostics,
+ 'gui': benchmark_gui,
+ 'helper': benchmark_helper,
+ 'hotplug': benchmark_hotplug,
+ 'imports': benchmark_imports,
+ 'mirrors': benchmark_mirrors,
+ 'race': benchmark_race,
+ 'slowlog': benchmark_slowlog,
+ 'uevent': benchmark_uevent,
+ 'wipe': benchmark_wipe,
+}
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(
+	 prog = "buskill_benchmark",
+	 description = 'Benchmarks for developers of the BusKill app'
+	)
+	parser.add_argument(
+	 "benchmark",
+	 help="Which benchmark to run",
+	 choices=BENCHMARKS.keys()
+	)
+	parser.add_argument(
+	 "-n", "--iterations",
+	 help="How many times to repeat each measurement",
+	 type=int,
+	 default=10
+	)
+	parser.add_argument(
+	 "--events",
+	 help="hotplug & uevent: how many synthetic events to inject",
+	 type=int,
+	 default=1000
+	)
+	parser.add_argument(
+	 "--rate",
+	 help="hotplug & uevent: how many synthetic events to inject per second",
+	 type=float,
+	 default=100
+	)
+	parser.add_argument(
+	 "--log-delay",
+	 help="slowlog: how long (in ms) each log record takes to write",
+	 type=float,
+	 default=5
+	)
+	parser.add_argument(
+	 "--slow-fail",
+	 help="race: how long (in ms) the slow mechanism takes to fail",
+	 type=float,
+	 default=250
+	)
+	parser.add_argument(
+	 "--mirror-delay",
+	 help="mirrors: how long (in ms) the mirror with valid metadata takes to answer",
+	 type=float,
+	 default=250
+	)
+	parser.add_argument(
+	 "--throughput-window",
+	 help="mirrors: the window (in seconds) over which the minimum throughput is enforced",
+	 type=float,
+	 default=2
+	)
+	parser.add_argument(
+	 "--cache-mb",
+	 help="wipe: how many MB of files to put in the cache dir",
+	 type=float,
+	 default=200
+	)
+	parser.add_argument(
+	 "--stall",
+	 help="datadir: how long (in ms) probing the dead mount hangs",
+	 type=float,
+	 default=5000
+	)
+	parser.add_argument(
+	 "--trigger-duration",
+	 help="hotplug & uevent: how long (in ms) the mock trigger takes to finish",
+	 type=float,
+	 default=0
+	)
+	args = parser.parse_args()
+
+	# BusKill() expects logging to be setup by main.py first. We don't echo the
+	# log to stdout so that it doesn't drown-out the results
+	buskill_logging.set_echo( False )
+	buskill_logging.setup_logging(
+	 os.path.join( tempfile.gettempdir(), 'buskill-benchmark.log' )
+	)
+
+	# BusKill writes to its data dir (eg its cache and capabilities.json), so we
+	# point it at a temp dir that we delete when we're done
+	temp_dir = tempfile.mkdtemp( prefix='buskill-benchmark-' )
+	use_temp_data_dir( temp_dir )
+	try:
+		sys.exit( BENCHMARKS[args.benchmark]( args ) )
+	finally:
+		shutil.rmtree( temp_dir, ignore_errors=True )
@@ -17,10 +17,16 @@ For more info, see: https://buskill.in/
 #                                   IMPORTS                                    #
 ################################################################################
 
-import packages.buskill
 from buskill_version import BUSKILL_VERSION
+import buskill_logging
+import buskill_platform
+import buskill_profile
+import buskill_diagnostics
 
-import argparse, sys, platform
+import argparse, json, os, sys, platform, signal, threading
+
+# note that packages.buskill (and libusb) is only imported after we've handled
+# the commands that don't need it; see BusKillCLI()
 
 import logging
 logger = logging.getLogger( __name__ )
@@ -35,6 +41,60 @@ logger = logging.getLogger( __name__ )
 #                                 FUNCTIONS                                    #
 ################################################################################
 
+# prints the status of an instance of BusKill (see BusKill.get_status())
+def print_status( status ):
+
+	if status['armed']:
+		print( "BusKill is armed." )
+	else:
+		print( "BusKill is disarmed." )
+
+	print( "Trigger: " +str(status['trigger']) )
+	print( "Arm engine: " +str(status['arm_engine']) )
+	print( "Detector: " +str(status['detector']) )
+	print( "PID: " +str(status['pid']) )
+
+# holds one BusKill object (armed or not) until we're killed, and lets other
+# instances (`buskill --arm`, `--disarm`, `--status`, and the GUI) control it
+# over our control socket. Returns our exit code
+def run_daemon( bk, arm ):
+
+	bk.is_daemon = True
+	if not bk.start_control_server():
+		msg = "ERROR: Unable to start the daemon's control socket (is another instance of BusKill already running?)"
+		logger.error( msg )
+		bk.close()
+		return 1
+
+	# exit cleanly on SIGTERM (eg from `kill` or systemd) and on ^C
+	stop = threading.Event()
+	signal.signal( signal.SIGTERM, lambda signum, frame: stop.set() )
+
+	if arm:
+		try:
+			bk.arm()
+		except RuntimeWarning as e:
+			msg = "ERROR: Unable to arm\n\t" +str(e)
+			logger.error( msg )
+			bk.close()
+			return 1
+
+	msg = "INFO: BusKill daemon is running (pid " +str(os.getpid())+ "). Control it with `buskill --arm`, `buskill --disarm`, and `buskill --status`"
+	logger.info( msg )
+
+	try:
+		while not stop.wait( 1 ):
+			pass
+	except KeyboardInterrupt:
+		pass
+
+	msg = "INFO: Stopping the BusKill daemon"
+	logger.info( msg )
+
+	bk.disarm()
+	bk.close()
+	return 0
+
 def BusKillCLI():
 
 	####################
@@ -53,12 +113,30 @@ def BusKillCLI():
 	 action="store_true"
 	)
 
+	parser.add_argument(
+	 "-q", "--quiet",
+	 help="Only echo errors to stdout (all log messages are still written to the log file)",
+	 action="store_true"
+	)
+
 	parser.add_argument(
 	 "--list-triggers",
 	 help="List all available triggers.",
 	 action="store_true"
 	)
 
+	parser.add_argument(
+	 "--capabilities",
+	 help="List what BusKill supports on this platform (triggers, arm engines, detectors, etc) and exit",
+	 action="store_true"
+	)
+
+	parser.add_argument(
+	 "--list-devices",
+	 help="List all connected USB devices (for use with --device).",
+	 action="store_true"
+	)
+
 	parser.add_argument(
 	 "-v", "--verbose",
 	 help="increase output verbosity",
@@ -67,10 +145,15 @@ def BusKillCLI():
 
 	parser.add_argument(
 	 "-t", "--trigger",
-	 help="Choose trigger to execute. See --list-triggers for all possible values.",
+	 help="Choose trigger to execute (default 'lock-screen'). See --list-triggers for all possible values. If BusKill is already running, this changes its trigger",
 	 metavar='',
 	 choices=['l','lock-screen','s','soft-shutdown'],
-	 default='lock-screen'
+	)
+
+	parser.add_argument(
+	 "-d", "--device",
+	 help="Only listen for removal of this USB device. Either 'VVVV:PPPP' (hex vendor & product id), 'BUS-PORT.PORT' (port path), both as 'VVVV:PPPP@BUS-PORT.PORT', or 'pick' to choose from a list. See --list-devices",
+	 metavar='',
 	)
 
 	parser.add_argument(
@@ -81,7 +164,107 @@ def BusKillCLI():
 
 	parser.add_argument(
 	 "-a", "--arm",
-	 help="Arms BusKill",
+	 help="Arms BusKill. If BusKill is already running (eg with --daemon or in the GUI), this arms it and exits; otherwise BusKill is armed until this command exits",
+	 action="store_true"
+	)
+
+	parser.add_argument(
+	 "--disarm",
+	 help="Disarms the running instance of BusKill (eg one started with --daemon or in the GUI)",
+	 action="store_true"
+	)
+
+	parser.add_argument(
+	 "--status",
+	 help="Print whether the running instance of BusKill is armed (and with which trigger) and exit",
+	 action="store_true"
+	)
+
+	parser.add_argument(
+	 "--daemon",
+	 help="Keep running (in the foreground) and let other instances arm, disarm, and change the trigger of this one over its control socket. Add --arm to arm on start",
+	 action="store_true"
+	)
+
+	parser.add_argument(
+	 "-e", "--arm-engine",
+	 help="Choose how the listener is run when armed: 'thread' (fast, default on Linux & MacOS), 'standby' (a pre-spawned process), or 'process'",
+	 metavar='',
+	 choices=['thread','standby','process'],
+	)
+
+	parser.add_argument(
+	 "-D", "--detector",
+	 help="Choose how usb removal is detected: 'libusb' (default) or 'uevent' (Linux only; reads the kernel's uevents from a netlink socket)",
+	 metavar='',
+	 choices=['libusb','uevent'],
+	)
+
+	parser.add_argument(
+	 "--rearm",
+	 help="Choose what re-arms the trigger after it fires: 'disarm' (default; it fires only once per arm), 'after-trigger', or 'cooldown'",
+	 metavar='',
+	 choices=['disarm','after-trigger','cooldown'],
+	)
+
+	parser.add_argument(
+	 "--rearm-cooldown",
+	 help="Seconds to wait before the trigger can fire again with '--rearm cooldown' (default 5)",
+	 metavar='',
+	 type=float,
+	)
+
+	parser.add_argument(
+	 "--trigger-strategy",
+	 help="Choose how the trigger's mechanisms are tried on Linux: 'serial' (default; one-at-a-time) or 'race' (all at once; the first to succeed wins)",
+	 metavar='',
+	 choices=['serial','race'],
+	)
+
+	parser.add_argument(
+	 "--trigger-deadline",
+	 help="Seconds to wait for any mechanism to succeed with '--trigger-strategy race' (default 5)",
+	 metavar='',
+	 type=float,
+	)
+
+	parser.add_argument(
+	 "--trace",
+	 help="Record timing spans of the removal->trigger pipeline to files in this directory (same as setting $BUSKILL_TRACE)",
+	 metavar='',
+	)
+
+	parser.add_argument(
+	 "--export-trace",
+	 help="Merge the spans recorded with --trace into this Chrome trace-event JSON file (for chrome://tracing or ui.perfetto.dev) and exit",
+	 metavar='',
+	)
+
+	parser.add_argument(
+	 "--export-log",
+	 help="Write the whole log (including its older, compressed segments) to this file and exit",
+	 metavar='',
+	)
+
+	parser.add_argument(
+	 "--stats",
+	 help="Print the metrics (counters & latency histograms) of the running instance of BusKill and exit. Optionally in 'prometheus' text format or as 'json'",
+	 nargs='?',
+	 const='text',
+	 choices=['text','prometheus','json'],
+	)
+
+	parser.add_argument(
+	 "--diagnostics",
+	 help="Write diagnostics about this system (environment, paths, platform) to the log file, for a bug report",
+	 action="store_true"
+	)
+
+	# this is handled by main.py (before anything is imported); it's only
+	# here so that it's listed by --help
+	parser.add_argument(
+	 "--profile-startup",
+	 help="Time each import and each phase of startup, and write a report sorted by cost to buskill-startup-profile.txt in the temp dir",
 	 action="store_true"
 	)
 
@@ -91,9 +274,26 @@ def BusKillCLI():
 	 action="store_true"
 	)
 
+	parser.add_argument(
+	 "--upgrade-strategy",
+	 help="Choose how --upgrade polls the update mirrors for the latest version: 'race' (default; all at once, the first with a valid signature wins) or 'serial' (one-at-a-time)",
+	 metavar='',
+	 choices=['race','serial'],
+	)
+
+	parser.add_argument(
+	 "--upgrade-deadline",
+	 help="Seconds to wait for any mirror to answer with '--upgrade-strategy race' (default 30)",
+	 metavar='',
+	 type=float,
+	)
+
 	# process command-line arguments
 	args = parser.parse_args()
 
+	if args.quiet:
+		buskill_logging.set_echo( False )
+
 	# standardize trigger name
 	if args.trigger == 'l': args.trigger = 'lock-screen'
 	if args.trigger == 's': args.trigger = 'soft-shutdown'
@@ -109,23 +309,178 @@ def BusKillCLI():
 		print( "Commit timestamp " +str(BUSKILL_VERSION['SOURCE_DATE_EPOCH']) )
 		sys.exit(0)
 
+	# the following commands don't need a BusKill object, whose constructor
+	# looks for a writable data dir, wipes the cache, checks for upgrades, etc.
+	# They're answered by buskill_platform.py, which doesn't touch the
+	# filesystem
+	capabilities = buskill_platform.get_capabilities()
+
+	# did the user ask us to just list all available triggers?
+	if args.list_triggers:
+
+		# is the OS that we're running on supported?
+		if not capabilities['is_platform_supported']:
+			msg = buskill_platform.ERR_PLATFORM_NOT_SUPPORTED
+			logger.error( msg )
+			sys.exit(1)
+
+		print( "" )
+		print( "Supported triggers include:" )
+		for trigger in capabilities['supported_triggers']:
+			print( "\t" +str(trigger))
+		sys.exit(1)
+
+	# did the user ask what we support on this platform?
+	if args.capabilities:
+		print( "Platform: " +str(capabilities['platform']) )
+		print( "Supported: " +str(capabilities['is_platform_supported']) )
+		print( "Triggers: " +', '.join( capabilities['supported_triggers'] ) )
+		print( "Arm engines: " +', '.join( capabilities['supported_arm_engines'] )+ " (default: " +str(capabilities['arm_engine'])+ ")" )
+		print( "Detectors: " +', '.join( capabilities['supported_detectors'] )+ " (default: " +str(capabilities['detector'])+ ")" )
+		print( "Re-arm policies: " +', '.join( capabilities['supported_rearm_policies'] ) )
+		print( "Trigger strategies: " +', '.join( capabilities['supported_trigger_strategies'] ) )
+		print( "Upgrade strategies: " +', '.join( capabilities['supported_upgrade_strategies'] ) )
+		print( "Control socket (--stats, --status, --daemon): " +str(capabilities['control_socket']) )
+		sys.exit(0)
+
+	# did the user ask us to export the log?
+	if args.export_log:
+		buskill_logging.export_log( args.export_log )
+		print( "Wrote the log to '" +str(args.export_log)+ "'" )
+		sys.exit(0)
+
+	# did the user ask for the metrics of the running instance?
+	if args.stats:
+		import buskill_control, buskill_metrics
+
+		# the running instance put its control socket in its data dir (unless
+		# it's in $XDG_RUNTIME_DIR), which is one of these
+		data_dirs = buskill_platform.get_data_dirs()
+
+		try:
+			path = buskill_control.find_control_socket_path( data_dirs )
+			if path == None:
+				msg = "No running instance of BusKill found"
+				raise RuntimeWarning( msg )
+
+			reply = buskill_control.request( path, 'stats' )
+			snapshot = json.loads( reply.decode( 'utf-8' ) )
+		except (RuntimeWarning, OSError, ValueError) as e:
+			msg = "ERROR: Unable to get stats\n\t" +str(e)
+			logger.error( msg )
+			sys.exit(1)
+
+		if args.stats == 'prometheus':
+			sys.stdout.write( buskill_metrics.format_prometheus( snapshot ) )
+		elif args.stats == 'json':
+			print( json.dumps( snapshot, indent=1 ) )
+		else:
+			sys.stdout.write( buskill_metrics.format_text( snapshot ) )
+		sys.exit(0)
+
+	# if another instance (a daemon, the GUI, or an armed CLI) is already
+	# running, then we're just its client: --arm, --disarm, --status, and
+	# --trigger are sent to it over its control socket, which is much faster
+	# than initializing BusKill ourselves
+	if ( args.arm or args.disarm or args.status ) and not args.daemon:
+		import buskill_control
+
+		instance = buskill_control.find_running_instance( buskill_platform.get_data_dirs() )
+		if instance != None:
+
+			# the rest of the options configure the listener, which the control
+			# socket can't change; refuse them rather than silently ignore them
+			ignored = [
+			 option for option, value in [
+			  ( '--device', args.device ),
+			  ( '--run-trigger', args.run_trigger or None ),
+			  ( '--arm-engine', args.arm_engine ),
+			  ( '--detector', args.detector ),
+			  ( '--rearm', args.rearm ),
+			  ( '--rearm-cooldown', args.rearm_cooldown ),
+			  ( '--trigger-strategy', args.trigger_strategy ),
+			  ( '--trigger-deadline', args.trigger_deadline ),
+			 ] if value != None
+			]
+			if ignored:
+				msg = "ERROR: BusKill is already running, and it can't change " \
+				 +', '.join( ignored )+ ". Give them to `buskill --daemon` when starting it instead"
+				logger.error( msg )
+				sys.exit(1)
+
+			try:
+				if args.trigger:
+					instance.command( 'trigger', args.trigger )
+				if args.arm:
+					instance.command( 'arm' )
+				if args.disarm:
+					instance.command( 'disarm' )
+				status = instance.status()
+			except (RuntimeWarning, OSError, ValueError) as e:
+				msg = "ERROR: The running instance of BusKill failed\n\t" +str(e)
+				logger.error( msg )
+				sys.exit(1)
+
+			print_status( status )
+			sys.exit(0)
+
+		if args.disarm or args.status:
+			msg = "ERROR: No running instance of BusKill found"
+			logger.error( msg )
+			sys.exit(1)
+
+	if args.trigger == None:
+		args.trigger = 'lock-screen'
+
+	import packages.buskill
+	from packages.buskill import tracing
+
+	if args.trace:
+		tracing.enable( args.trace )
+
+	# did the user ask us to export the spans from a previous --trace run?
+	if args.export_trace:
+		if not tracing.enabled():
+			msg = "ERROR: Use --trace (or $BUSKILL_TRACE) to say where the spans were recorded"
+			logger.error( msg )
+			sys.exit(1)
+
+		count = tracing.export_chrome( tracing.TRACE_DIR, args.export_trace )
+		print( "Wrote " +str(count)+ " trace events to '" +str(args.export_trace)+ "'" )
+		sys.exit(0)
+
+	tracing.set_process_name( 'buskill' )
+
 	bk = packages.buskill.BusKill()
 
+	# with --profile-startup, the CLI's startup is over once BusKill is ready
+	buskill_profile.finish( 'BusKill was initialized' )
+
+	if args.diagnostics:
+		buskill_diagnostics.write_snapshot( '--diagnostics', bk )
+
 	# is the OS that we're running on supported?
 	if not bk.is_platform_supported():
 		# the current platform isn't supported; show critical error window
 
 		msg = bk.ERR_PLATFORM_NOT_SUPPORTED
-		print( msg ); logger.error( msg )
+		logger.error( msg )
 		sys.exit(1)
 
-	# did the user ask us to just list all available triggers?
-	if args.list_triggers:
+	# did the user ask us to list all connected usb devices?
+	if args.list_devices:
+		try:
+			devices = bk.list_usb_devices()
+		except RuntimeWarning as e:
+			msg = "ERROR: Unable to list devices\n\t" +str(e)
+			logger.error( msg )
+			sys.exit(1)
+
 		print( "" )
-		print( "Supported triggers include:" )
-		for trigger in bk.SUPPORTED_TRIGGERS:
-			print( "\t" +str(trigger))
-		sys.exit(1)
+		print( "Connected USB devices include:" )
+		for device in devices:
+			print( "\t" +str(device['selector']) )
+		sys.exit(0)
 
 	# did the user ask us to do a software upgrade?
 	if args.upgrade:
@@ -134,14 +489,23 @@ def BusKillCLI():
 		if bk.UPGRADED_TO:
 			new_version_exe = bk.UPGRADED_TO['EXE_PATH']
 			msg = "INFO: A newer upgrade has already been installed. Thew new executable is '" +str(new_version_exe)+ "'"
-			print( msg ); logger.error( msg )
+			logger.error( msg )
 			sys.exit(1)
 
+		# did the user choose how the mirrors should be polled?
+		if args.upgrade_strategy:
+			try:
+				bk.set_upgrade_strategy( args.upgrade_strategy, args.upgrade_deadline )
+			except RuntimeWarning as e:
+				msg = "ERROR: Unable to set the upgrade strategy to '" +str(args.upgrade_strategy)+ "'\n\t" +str(e)
+				logger.error( msg )
+				sys.exit(1)
+
 		try:
 			new_version_exe = bk.upgrade()
 		except RuntimeWarning as e:
 			msg = "ERROR: Unable to upgrade buskill\n\t" +str(e)
-			print( msg ); logger.error( msg )
+			logger.error( msg )
 			sys.exit(1)
 
 		print( "Upgrade complete. New executable is '" +str(new_version_exe)+ "'" )
@@ -153,9 +517,77 @@ def BusKillCLI():
 		bk.set_trigger( args.trigger )
 	except RuntimeWarning as e:
 		msg = "ERROR: Unable to set the trigger to '" +str(args.trigger)+ "'\n\t" +str(e)
-		print( msg ); logger.error( msg )
+		logger.error( msg )
 		sys.exit(1)
 
+	# did the user choose a specific arm engine?
+	if args.arm_engine:
+		try:
+			bk.set_arm_engine( args.arm_engine )
+		except RuntimeWarning as e:
+			msg = "ERROR: Unable to set the arm engine to '" +str(args.arm_engine)+ "'\n\t" +str(e)
+			logger.error( msg )
+			sys.exit(1)
+
+	# did the user ask us to only listen for one specific device?
+	if args.device == 'pick':
+		try:
+			devices = bk.list_usb_devices()
+		except RuntimeWarning as e:
+			msg = "ERROR: Unable to list devices\n\t" +str(e)
+			logger.error( msg )
+			sys.exit(1)
+
+		print( "" )
+		for i, device in enumerate( devices ):
+			print( "\t[" +str(i)+ "] " +str(device['selector']) )
+		choice = input( "Which device is your BusKill cable? " )
+
+		try:
+			args.device = devices[ int(choice) ]['selector']
+		except (ValueError, IndexError):
+			msg = "ERROR: Invalid choice '" +str(choice)+ "'"
+			logger.error( msg )
+			sys.exit(1)
+
+	if args.device:
+		try:
+			bk.set_device_selector( args.device )
+		except RuntimeWarning as e:
+			msg = "ERROR: Unable to set the device to '" +str(args.device)+ "'\n\t" +str(e)
+			logger.error( msg )
+			sys.exit(1)
+
+	# did the user choose a specific detector?
+	if args.detector:
+		try:
+			bk.set_detector( args.detector )
+		except RuntimeWarning as e:
+			msg = "ERROR: Unable to set the detector to '" +str(args.detector)+ "'\n\t" +str(e)
+			logger.error( msg )
+			sys.exit(1)
+
+	# did the user choose a specific re-arm policy?
+	if args.rearm:
+		try:
+			bk.set_rearm_policy( args.rearm, args.rearm_cooldown )
+		except RuntimeWarning as e:
+			msg = "ERROR: Unable to set the re-arm policy to '" +str(args.rearm)+ "'\n\t" +str(e)
+			logger.error( msg )
+			sys.exit(1)
+
+	# did the user choose how the trigger's mechanisms should be tried?
+	if args.trigger_strategy:
+		try:
+			bk.set_trigger_strategy( args.trigger_strategy, args.trigger_deadline )
+		except RuntimeWarning as e:
+			msg = "ERROR: Unable to set the trigger strategy to '" +str(args.trigger_strategy)+ "'\n\t" +str(e)
+			logger.error( msg )
+			sys.exit(1)
+
+	if args.daemon:
+		sys.exit( run_daemon( bk, args.arm ) )
+
 	# did the user say that we should execute the trigger immediately on startup?
 	if args.run_trigger:
 		try:
@@ -166,12 +598,12 @@ def BusKillCLI():
 				bk.simulate_hotplug_removal()
 			else:
 				msg = "INFO: User chose not to execute trigger now. Exiting."
-				print( msg ); logger.info( msg )
+				logger.info( msg )
 				bk.close()
 				sys.exit(0)
 		except RuntimeWarning as e:
 			msg = "ERROR: Unable execute trigger\n\t" +str(e)
-			print( msg ); logger.error( msg )
+			logger.error( msg )
 			bk.close()
 			sys.exit(1)
 
@@ -179,10 +611,37 @@ def BusKillCLI():
 		sys.exit(0)
 
 	if args.arm:
-		bk.toggle()
+		try:
+			bk.toggle()
+		except RuntimeWarning as e:
+			msg = "ERROR: Unable to arm\n\t" +str(e)
+			logger.error( msg )
+			bk.close()
+			sys.exit(1)
+
+		# let `buskill --stats`, `buskill --disarm`, etc. talk to us while we're
+		# armed
+		bk.start_control_server()
+
+		# the listener may be a thread in this process, so we block here until
+		# it exits, another instance disarms us (the 'standby' engine's listener
+		# stays alive when disarmed), or the user disarms with ^C. Another
+		# instance may change our trigger, which re-arms (and replaces the
+		# listener) while holding the toggle_lock
+		try:
+			while True:
+				with bk.toggle_lock:
+					usb_handler = bk.usb_handler
+					if not bk.is_armed or not usb_handler.is_alive():
+						break
+				usb_handler.join( 1 )
+		except KeyboardInterrupt:
+			bk.disarm()
+
+		bk.stop_control_server()
 
 	else:
 		msg = "Nothing to do."
-		print( msg ); logger.warning( msg )
+		logger.warning( msg )
 
 	return 0
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3.7
+"""
+::
+
+  File:    buskill_control.py
+
+This is a small control socket (a Unix domain socket) that lets another BusKill process (eg `buskill --stats` or `buskill --disarm`) ask the running instance (eg `buskill --daemon` or the GUI) questions and tell it what to do. A client connects, sends one command (its name, optionally followed by arguments separated by spaces) on one line, and reads the reply until the server closes the connection. Replies to commands that failed start with 'error:'.
+
+It doesn't import packages.buskill (or libusb), so a client like `buskill --status` only pays for this module.
+
+The socket is put in $XDG_RUNTIME_DIR (or else in our DATA_DIR), which only the user can access, and it's created with permissions 0600.
+
+For more info, see: https://buskill.in/
+"""
+
+################################################################################
+#                                   IMPORTS                                    #
+################################################################################
+
+import os, socket, threading
+
+import logging
+logger = logging.getLogger( __name__ )
+
+################################################################################
+#                                  SETTINGS                                    #
+################################################################################
+
+CONTROL_SOCKET_NAME = 'buskill.sock'
+
+# commands are short; anything longer than this isn't one of ours
+CONTROL_MAX_COMMAND = 1024
+
+# how long (in seconds) the server waits for a client to send its command, and
+# a client waits for the reply to a query (eg 'status' or 'stats')
+CONTROL_TIMEOUT = 2
+
+# how long (in seconds) a client waits for the reply to a command that changes
+# the running instance's state. Arming may probe D-Bus and spawn the trigger
+# helper, and changing the trigger re-arms, so these take longer than queries
+CONTROL_STATE_TIMEOUT = 30
+CONTROL_STATE_COMMANDS = [ 'arm', 'disarm', 'trigger' ]
+
+################################################################################
+#                                 FUNCTIONS                                    #
+################################################################################
+
+def is_supported():
+	return hasattr( socket, 'AF_UNIX' )
+
+# returns the path to the control socket, or None if there's nowhere to put it
+def get_control_socket_path( data_dir ):
+
+	runtime_dir = os.environ.get( 'XDG_RUNTIME_DIR' )
+	if runtime_dir != None and os.path.isdir( runtime_dir ):
+		return os.path.join( runtime_dir, CONTROL_SOCKET_NAME )
+
+	if data_dir != None and data_dir != '':
+		return os.path.join( data_dir, CONTROL_SOCKET_NAME )
+
+	return None
+
+# returns the path to the control socket of the running instance, which may be
+# in any of the given data dirs, or None if there isn't one. Unlike a BusKill
+# object, this doesn't create anything (see buskill_platform.py)
+def find_control_socket_path( data_dirs ):
+
+	path = get_control_socket_path( None )
+	if path != None:
+		return path
+
+	for data_dir in data_dirs:
+		path = get_control_socket_path( data_dir )
+		if os.path.exists( path ):
+			return path
+
+	return None
+
+# returns a ControlClient for the running instance, or None if there isn't one
+def find_running_instance( data_dirs ):
+
+	path = find_control_socket_path( data_dirs )
+	if path == None:
+		return None
+
+	try:
+		request( path, 'ping', timeout=0.5 )
+	except (RuntimeWarning, OSError):
+		return None
+
+	return ControlClient( path )
+
+# sends one command to the running instance and returns its reply (as bytes)
+def request( path, command, timeout=CONTROL_TIMEOUT ):
+
+	if not is_supported() or path == None:
+		msg = "The control socket isn't supported on this platform"
+		raise RuntimeWarning( msg )
+
+	with socket.socket( socket.AF_UNIX, socket.SOCK_STREAM ) as sock:
+		sock.settimeout( timeout )
+
+		try:
+			sock.connect( path )
+		except (FileNotFoundError, ConnectionRefusedError):
+			msg = "No running instance of BusKill found (at '" +str(path)+ "')"
+			raise RuntimeWarning( msg )
+
+		sock.sendall( command.encode( 'utf-8' ) + b"\n" )
+		sock.shutdown( socket.SHUT_WR )
+
+		reply = list()
+		while True:
+			data = sock.recv( 65536 )
+			if not data:
+				break
+			reply.append( data )
+
+	return b''.join( reply )
+
+################################################################################
+#                                   OBJECTS                                    #
+################################################################################
+
+class ControlServer:
+
+	# path     = where to create the socket
+	# commands = dict of command name -> function that returns the reply (as
+	#            a string or bytes)
+	def __init__( self, path, commands ):
+
+		self.path = path
+		self.commands = commands
+		self.sock = None
+		self.thread = None
+
+	# creates the socket and starts answering commands in a daemon thread.
+	# Raises RuntimeWarning if another instance is already listening
+	def start( self ):
+
+		if os.path.exists( self.path ):
+			try:
+				request( self.path, 'ping', timeout=0.5 )
+			except (RuntimeWarning, OSError):
+				# nobody is listening; it was left behind by an instance that died
+				os.remove( self.path )
+			else:
+				msg = "Another instance of BusKill is already listening on '" +str(self.path)+ "'"
+				raise RuntimeWarning( msg )
+
+		self.sock = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+		self.sock.bind( self.path )
+
+		# only the user can connect to the socket. Nobody can connect before we
+		# listen, so we don't need to change the (process-wide) umask to bind
+		os.chmod( self.path, 0o600 )
+		self.sock.listen( 4 )
+
+		self.thread = threading.Thread( target=self.serve, daemon=True )
+		self.thread.start()
+
+		msg = "DEBUG: Control socket listening on '" +str(self.path)+ "'"
+		logger.debug( msg )
+
+	def serve( self ):
+
+		while True:
+			try:
+				conn, address = self.sock.accept()
+			except OSError:
+				# the socket was closed by stop()
+				return
+
+			with conn:
+				try:
+					self.handle( conn )
+				except Exception as e:
+					msg = "WARNING: Control socket command failed (" +str(e)+ ")"
+					logger.warning( msg )
+
+	def handle( self, conn ):
+
+		conn.settimeout( CONTROL_TIMEOUT )
+
+		command = b''
+		while b"\n" not in command and len(command) <= CONTROL_MAX_COMMAND:
+			data = conn.recv( CONTROL_MAX_COMMAND )
+			if not data:
+				break
+			command += data
+
+		command = command.split( b"\n" )[0].decode( 'utf-8', 'replace' ).split()
+		if len(command) == 0:
+			command = ['']
+		name, args = command[0], command[1:]
+
+		if name == 'ping':
+			reply = 'pong'
+		elif name in self.commands:
+			try:
+				reply = self.commands[name]( *args )
+			except Exception as e:
+				reply = 'error: ' +str(e)
+		else:
+			reply = 'error: unknown command'
+
+		if isinstance( reply, str ):
+			reply = reply.encode( 'utf-8' )
+
+		conn.sendall( reply )
+
+	def stop( self ):
+
+		if self.sock == None:
+			return
+
+		# closing the socket doesn't wake-up accept() on every platform, so we
+		# also shut it down
+		try:
+			self.sock.shutdown( socket.SHUT_RDWR )
+		except OSError:
+			pass
+		self.sock.close()
+		self.sock = None
+
+		try:
+			os.remove( self.path )
+		except OSError:
+			pass
+
+class ControlClient:
+
+	def __init__( self, path ):
+		self.path = path
+
+	# sends the command and returns its reply (as a string). Raises
+	# RuntimeWarning if the command failed
+	def command( self, name, *args ):
+
+		timeout = CONTROL_TIMEOUT
+		if name in CONTROL_STATE_COMMANDS:
+			timeout = CONTROL_STATE_TIMEOUT
+
+		reply = request( self.path, ' '.join( (name,) + args ), timeout ).decode( 'utf-8' )
+		if reply.startswith( 'error:' ):
+			raise RuntimeWarning( reply[ len('error:'): ].strip() )
+
+		return reply
+
+	# returns the running instance's status (see BusKill.get_status())
+	def status( self ):
+
+		import json
+		return json.loads( self.command( 'status' ) )
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3.7
+"""
+::
+
+  File:    buskill_diagnostics.py
+  Authors: Michael Altfield <michael@buskill.in>
+
+This collects the diagnostics that are useful in a bug report (the app's version, the environment, python's paths, the platform, the distro, and the BusKill app's own paths). They used to be written to the log file on every launch before the UI appeared; now main.py only remembers the (cheap) state that may change after startup, and the rest is collected into an in-memory snapshot the first time that it's needed. The snapshot is written to the log file (once per launch) when the user opens the Debug Log, goes to report a bug, or passes --diagnostics to the CLI.
+
+For more info, see: https://buskill.in/
+"""
+
+################################################################################
+#                                   IMPORTS                                    #
+################################################################################
+
+import os, platform, sys, threading
+
+from buskill_version import BUSKILL_VERSION
+import buskill_logging
+
+import logging
+logger = logging.getLogger( __name__ )
+
+################################################################################
+#                                  SETTINGS                                    #
+################################################################################
+
+# copies of the state that the app changes after startup
+startup_environ = None
+startup_argv = None
+
+# the in-memory snapshot (a list of (key, value) tuples) and whether it has
+# already been written to the log file by this process
+snapshot = None
+written = False
+snapshot_lock = threading.Lock()
+
+################################################################################
+#                                 FUNCTIONS                                    #
+################################################################################
+
+# this is called by main.py at startup. It only copies the environment and
+# our arguments, which is much cheaper than formatting & logging everything
+def remember_startup_state():
+
+	global startup_environ, startup_argv
+
+	startup_environ = dict( os.environ )
+	startup_argv = list( sys.argv )
+
+# returns a list of (key, value) tuples describing this system. The given
+# BusKill object (if any) adds the app's paths
+def collect( bk=None ):
+
+	environ = startup_environ
+	if environ == None:
+		environ = dict( os.environ )
+
+	argv = startup_argv
+	if argv == None:
+		argv = list( sys.argv )
+
+	diagnostics = [
+	 ( 'BUSKILL_VERSION', BUSKILL_VERSION ),
+	 ( 'os.environ', environ ),
+	 ( 'sys.argv', argv ),
+	 ( 'sys.builtin_modules_names', sys.builtin_module_names ),
+	 ( 'sys.executable', sys.executable ),
+	 ( 'sys.path', sys.path ),
+	 ( 'sys.prefix', sys.prefix ),
+	 ( 'sys.version', sys.version ),
+	 ( 'sys.api_version', sys.api_version ),
+	 ( 'sys.version_info', sys.version_info ),
+
+	 # platform info
+	 ( 'sys.platform', sys.platform ),
+	 ( 'platform.platform()', platform.platform() ),
+	 ( 'platform.system()', platform.system() ),
+	 ( 'platform.release()', platform.release() ),
+	 ( 'platform.version()', platform.version() ),
+	 ( 'platform.machine()', platform.machine() ),
+	]
+
+	# what platform are they running?
+	CURRENT_PLATFORM = platform.system().upper()
+	if CURRENT_PLATFORM.startswith( 'LINUX' ):
+		# they're running linux; what distro and version of linux?
+		try:
+			with open( "/etc/os-release" ) as f:
+				diagnostics.append( ( '/etc/os-release', f.read() ) )
+		except Exception:
+			pass
+
+	if CURRENT_PLATFORM.startswith( 'WIN' ):
+		# they're running windows; what version of windows?
+		try:
+			diagnostics.append( ( 'sys.getwindowsversion()', sys.getwindowsversion() ) )
+		except Exception:
+			pass
+
+	if CURRENT_PLATFORM.startswith( 'DARWIN' ):
+		# they're running mac; what version of macos?
+		try:
+			diagnostics.append( ( 'platform.uname()', platform.uname() ) )
+			diagnostics.append( ( 'platform.mac_ver()', platform.mac_ver() ) )
+		except Exception:
+			pass
+
+	if bk != None:
+		diagnostics += bk.get_path_diagnostics()
+
+	return diagnostics
+
+# returns the snapshot, collecting it the first time that it's called
+def get_snapshot( bk=None ):
+
+	global snapshot
+
+	with snapshot_lock:
+		if snapshot == None:
+			snapshot = collect( bk )
+
+		return snapshot
+
+# writes the snapshot to the log file (but not to stdout), unless it was
+# already written by this process. 'reason' says what asked for it. Returns
+# after the snapshot has been written, so the caller can read the log file
+def write_snapshot( reason, bk=None ):
+
+	global written
+
+	with snapshot_lock:
+		if written:
+			return
+		written = True
+
+	msg = "INFO: Writing diagnostics to the log file (" +str(reason)+ ")"
+	logger.info( msg, extra = buskill_logging.NO_ECHO )
+
+	for key, value in get_snapshot( bk ):
+		msg = str(key)+ '|' +str(value)+ '|'
+		logger.debug( msg, extra = buskill_logging.NO_ECHO )
+
+	buskill_logging.flush()
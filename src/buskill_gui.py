@@ -21,8 +21,13 @@ import packages.buskill
 from packages.garden.navigationdrawer import NavigationDrawer
 from packages.garden.progressspinner import ProgressSpinner
 from buskill_version import BUSKILL_VERSION
+import buskill_logging
+import buskill_platform
+import buskill_profile
+import buskill_diagnostics
+import buskill_control
 
-import os, sys, re, webbrowser
+import os, sys, re, time, webbrowser
 
 import multiprocessing, threading
 from multiprocessing import util
@@ -62,7 +67,13 @@ from kivy.core.text import LabelBase
 #                                  SETTINGS                                    #
 ################################################################################
 
-# n/a
+# how many of the log's most recent lines are shown on the DebugLog screen
+DEBUG_LOG_MAX_LINES = 5000
+
+# our global BusKill object. Initializing it can be slow (eg when our data dir
+# is on a usb drive), so it's done in a background thread after the window is
+# shown; see BusKillApp.init_core()
+bk = None
 
 ################################################################################
 #                                   CLASSES                                    #
@@ -77,17 +88,48 @@ class MainWindow(Screen):
 
 	dialog = None
 
+	# a ControlClient for the running instance (eg a `buskill --daemon`) whose
+	# armed state we control, if one was already running when we started (see
+	# core_ready()), and its status as of the last time that we polled it
+	daemon = None
+	daemon_status = None
+
 	def __init__(self, **kwargs):
 
 		# set local instance fields that reference our global variables
 		global bk
 		self.bk = bk
 
+		super(MainWindow, self).__init__(**kwargs)
+
+		# we can't be armed until BusKill is initialized; see core_ready()
+		self.status.text = 'BusKill is initializing...'
+		self.toggle_btn.disabled = True
+
+	# called (in the main thread) when our BusKill object is initialized.
+	# daemon = a ControlClient for an already running instance of BusKill (eg
+	#          `buskill --daemon`) that our arm button should control, or None
+	def core_ready( self, core, daemon=None ):
+
+		self.bk = core
+		self.toggle_btn.disabled = False
+
+		# the daemon may be armed & disarmed by other instances too, so we poll
+		# it. That's a request over its control socket, which would freeze the
+		# UI if it's slow, so it's done in a worker thread
+		if daemon != None:
+			self.daemon = daemon
+			threading.Thread( target=self.poll_daemon, daemon=True ).start()
+
+		self.update_armed_state()
+
 		# check to see if this is an old version that was already upgraded
 		# as soon as we've loaded
 		Clock.schedule_once(self.handle_upgrades, 1)
 
-		super(MainWindow, self).__init__(**kwargs)
+	# called (in the main thread) if our BusKill object couldn't be initialized
+	def core_failed( self, msg ):
+		self.status.text = msg
 
 	# called to close the app
 	def close( self, *args ):
@@ -99,17 +141,143 @@ class MainWindow(Screen):
 
 	def toggle_buskill(self):
 
-		self.bk.toggle()
+		# commands to the daemon may take a while (eg arming), so they're sent
+		# from a worker thread. The button is disabled until it's done
+		if self.daemon != None:
+			command = 'disarm' if self.is_armed() else 'arm'
+			self.toggle_btn.disabled = True
+			threading.Thread(
+			 target=self.command_daemon, args=(command,), daemon=True
+			).start()
+			return
+
+		try:
+			if self.is_armed():
+				self.bk.disarm()
+			else:
+				self.bk.arm()
+
+		except RuntimeWarning as e:
+			self.show_arm_error( str(e) )
+
+		self.update_armed_state()
+
+	# if we couldn't arm (eg the trigger wouldn't work), alert the user
+	def show_arm_error( self, error, *args ):
+
+		# close the dialog if it's already opened
+		if self.dialog != None:
+			self.dialog.dismiss()
+
+		self.dialog = DialogConfirmation(
+		 title = '[font=mdicons][size=30]\ue002[/size][/font] Unable to Arm',
+		 body = error,
+		 button = "",
+		 continue_function=None
+		)
+		self.dialog.b_cancel.text = "OK"
+		self.dialog.open()
+
+	# loops in a worker thread, polling the daemon every second until we lose it
+	def poll_daemon( self ):
+
+		while self.daemon != None:
+			self.query_daemon()
+			time.sleep( 1 )
+
+	# asks the daemon for its status (in a worker thread) and then shows it on
+	# the main screen (in the main thread)
+	def query_daemon( self ):
+
+		daemon = self.daemon
+		if daemon == None:
+			return
+
+		try:
+			status = daemon.status()
+		except (RuntimeWarning, OSError, ValueError) as e:
+			reason = str(e)
+			Clock.schedule_once( lambda dt: self.lost_daemon( reason ) )
+			return
+
+		Clock.schedule_once( lambda dt: self.show_daemon_status( status ) )
+
+	# sends 'arm' or 'disarm' to the daemon (in a worker thread)
+	def command_daemon( self, command ):
+
+		try:
+			self.daemon.command( command )
+		except RuntimeWarning as e:
+			error = str(e)
+			Clock.schedule_once( lambda dt: self.show_arm_error( error ) )
+		except (OSError, AttributeError):
+			# the daemon is gone (or we already lost it); query_daemon() handles it
+			pass
+
+		self.query_daemon()
+		Clock.schedule_once( self.enable_toggle )
+
+	def enable_toggle( self, *args ):
+		self.toggle_btn.disabled = False
+
+	def show_daemon_status( self, status ):
+
+		if self.daemon == None:
+			return
+
+		self.daemon_status = status
+		self.update_armed_state()
+
+	# called (in the main thread) when the daemon stopped answering. From now on
+	# our arm button controls our own BusKill object, which takes over the
+	# control socket
+	def lost_daemon( self, reason ):
+
+		if self.daemon == None:
+			return
+
+		msg = "WARNING: Lost the BusKill daemon (" +str(reason)+ "); controlling this instance instead"
+		logger.warning( msg )
+
+		self.daemon = None
+		self.daemon_status = None
+		self.bk.start_control_server()
+		self.update_armed_state()
+
+	# returns True if BusKill (or the daemon that we control) is armed. For the
+	# daemon, that's as of the last time that we polled it
+	def is_armed( self ):
+
+		if self.daemon != None:
+			return self.daemon_status != None and bool( self.daemon_status.get( 'armed' ) )
+
+		return bool( self.bk.is_armed )
+
+	# updates the arm button & status to show whether we're armed. This is also
+	# called after another instance armed or disarmed us (or our daemon)
+	def update_armed_state( self, *args ):
 
-		if self.bk.is_armed:
+		if self.bk == None:
+			return
+
+		# only a `buskill --daemon` says so in its status; the running instance
+		# may also be eg an armed `buskill --arm`
+		if self.daemon_status != None and self.daemon_status.get( 'daemon' ):
+			suffix = ' (by the BusKill daemon)'
+		elif self.daemon != None:
+			suffix = ' (by another instance of BusKill)'
+		else:
+			suffix = ''
+
+		if self.is_armed():
 			self.toggle_btn.text = 'Disarm'
-			self.status.text = 'BusKill is currently armed.'
+			self.status.text = 'BusKill is currently armed' +suffix+ '.'
 			self.toggle_btn.md_bg_color = [1,0,0,1]
 			self.toggle_btn.background_color = self.color_red
 			self.actionview.background_color = self.color_red
 		else:
 			self.toggle_btn.text = 'Arm'
-			self.status.text = 'BusKill is currently disarmed.'
+			self.status.text = 'BusKill is currently disarmed' +suffix+ '.'
 			self.toggle_btn.background_color = self.color_primary
 			self.actionview.background_color = self.color_primary
 
@@ -147,6 +315,11 @@ class MainWindow(Screen):
 			self.dialog.open()
 
 	def about_ref_press(self, ref):
+
+		# our links are stored in the BusKill object
+		if self.bk == None:
+			return
+
 		if ref == 'gui_help':
 			return self.webbrowser_open_url( bk.url_documentation_gui )
 		elif ref == 'contribute':
@@ -156,7 +329,7 @@ class MainWindow(Screen):
 
 	def webbrowser_open_url(self, url ):
 		msg = "DEBUG: Opening URL in webbrowser = " +str(url)
-		print( msg ); logger.debug( msg )
+		logger.debug( msg )
 		webbrowser.open( url )
 
 	def about(self):
@@ -183,12 +356,16 @@ class MainWindow(Screen):
 		# first close the navigation drawer
 		self.nav_drawer.toggle_state()
 
+		# we can't upgrade until BusKill is initialized
+		if self.bk == None:
+			return
+
 		# check to see if an upgrade was already done
 		if bk.UPGRADED_TO and bk.UPGRADED_TO['EXE_PATH'] != '1':
 			# a newer version has already been installed; skip upgrade() step and
 			# just prompt the user to restart to the newer version
 			msg = "DEBUG: Detected upgrade already installed " +str(bk.UPGRADED_TO)
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 			self.upgrade4_restart_prompt()
 			return
 
@@ -338,7 +515,7 @@ class MainWindow(Screen):
 			new_version_exe = self.upgrade_result
 
 		msg = "DEBUG: Exiting and launching " +str(new_version_exe)
-		print( msg ); logger.debug( msg )
+		logger.debug( msg )
 
 		# TODO: fix the restart on Windows so that the recursive delete after
 		#       upgrade works and doesn't require a manual restart. See also:
@@ -349,7 +526,7 @@ class MainWindow(Screen):
 			# TODO: remove me (after fixing Windows restart fail)
 			msg = 'os.environ|' +str(os.environ)+ "|\n"
 			msg+= "DEBUG: os.environ['PATH']:|" +str(os.environ['PATH'])+  "|\n"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			# cleanup env; remove references to now-old version
 			oldVersionPaths = [
@@ -360,7 +537,7 @@ class MainWindow(Screen):
 
 			# TODO: remove me (after fixing Windows restart fail)
 			msg = 'DEBUG: removing oldVersionPaths from PATH (' +str(oldVersionPaths)+ ')'
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			os.environ['PATH'] = os.pathsep.join( [ path for path in os.environ['PATH'].split(os.pathsep) if not re.match( ".*(" +"|".join(oldVersionPaths)+ ").*", path) ] )
 
@@ -370,7 +547,7 @@ class MainWindow(Screen):
 			# TODO: remove me (after fixing Windows restart fail)
 			msg = 'os.environ|' +str(os.environ)+ "|\n"
 			msg+= "DEBUG: os.environ['PATH']:|" +str(os.environ['PATH'])+  "|\n"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			# replace this process with the newer version
 			bk.close()
@@ -379,7 +556,7 @@ class MainWindow(Screen):
 		except Exception as e:
 
 			msg = "DEBUG: Restart failed (" +str(e) + ")"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			# close the dialog if it's already opened
 			if self.dialog != None:
@@ -438,13 +615,14 @@ class DebugLog(Screen):
 		global bk
 		self.bk = bk
 		self.show_debug_log_thread = None
+		self.debug_log_contents = ''
 
 		super(DebugLog, self).__init__(**kwargs)
 
 	def on_pre_enter(self, *args):
 
 		msg = "DEBUG: User switched to 'DebugLog' screen"
-		print( msg ); logger.debug( msg )
+		logger.debug( msg )
 
 		# register the function for clicking the "help" icon at the top
 		self.debug_header.bind( on_ref_press=self.ref_press )
@@ -459,11 +637,8 @@ class DebugLog(Screen):
 		# the "main" screen
 		self.dialog = self.main_screen.dialog
 
-		if logger.root.hasHandlers():
-			self.logfile_path = logger.root.handlers[0].baseFilename
-
-			with open(self.logfile_path) as log_file:
-				self.debug_log_contents = log_file.read()
+		self.logfile_path = buskill_logging.get_log_file_path()
+		if self.logfile_path != None:
 
 			# we use treading.Thread() instead of multiprocessing.Process
 			# because it can update the widget's contents directly without
@@ -476,19 +651,30 @@ class DebugLog(Screen):
 			self.show_debug_log_thread.start()
 
 	def show_debug_log( self ):
+
+		# the diagnostics aren't written at startup, so we write them (once)
+		# before the user sees or copies the log
+		buskill_diagnostics.write_snapshot( 'opened the Debug Log', self.bk )
+
+		# the log can be rotated into many (compressed) segments, so we only read
+		# as much of its end as we're going to show
+		log_lines = buskill_logging.read_log_tail( DEBUG_LOG_MAX_LINES )
+		self.debug_log_contents = "\n".join( log_lines )
+
 		lines = []
-		for line in self.debug_log_contents.splitlines(keepends=False):
+		for line in log_lines:
 			lines.append({'text': line})
 		self.rv.data = lines
 
 	def copy_debug_log( self ):
 
 		msg = "DEBUG: User copied contents of 'DebugLog' to clipboard"
-		print( msg ); logger.debug( msg )
+		logger.debug( msg )
 
 		Clipboard.copy( self.debug_log_contents )
 
-		msg = "The full Debug Log has been copied to your clipboard.\n\n"
+		msg = "The last " +str(DEBUG_LOG_MAX_LINES)+ " lines of the Debug Log have been copied to your clipboard.\n\n"
+		msg+= "Your full Debug Log is stored in " +str(self.logfile_path)+ " (and its older, compressed segments)\n\n"
 		self.dialog = DialogConfirmation(
 		 title = '[font=mdicons][size=31]\ue88f[/size][/font] Debug Log',
 		 body = msg,
@@ -526,18 +712,28 @@ class DebugLog(Screen):
 
 	def report_bug( self ):
 
+		buskill_diagnostics.write_snapshot( 'reporting a bug', self.bk )
+
+		# our links are stored in the BusKill object
+		if self.bk == None:
+			return
+
 		# for privacy reasons, we don't do in-app bug reporting; just point the
 		# user to our documentation
-		self.main_screen.webbrowser_open_url( bk.url_documentation_bug_report )
+		self.main_screen.webbrowser_open_url( self.bk.url_documentation_bug_report )
 
 class BusKillApp(App):
 
-	# instantiate our global BusKill object instance and screen manager so they can
-	# be accessed by other objects for doing Buskill stuff & changing the kivy screen
-	global bk
-	bk = packages.buskill.BusKill()
+	# instantiate our screen manager so it can be accessed by other objects for
+	# changing the kivy screen
 	manager = ScreenManager()
 
+	# our BusKill object, once it's initialized (see init_core())
+	bk = None
+
+	# how long (in seconds) after launch we drew our first frame
+	first_frame_seconds = None
+
 	# register font aiases so we don't have to specify their full file path
 	# when setting font names in our kivy language .kv files
 	LabelBase.register(
@@ -562,13 +758,99 @@ class BusKillApp(App):
 
 	# does rapid-fire UI-agnostic cleanup stuff when the GUI window is closed
 	def close( self, *args ):
-		bk.close()
+		if self.bk != None:
+			self.bk.close()
 
-	def build(self):
+	def on_start( self ):
+		Window.bind( on_flip = self.on_first_frame )
+
+	# called when we've drawn (and flipped) our first frame, which is when the
+	# user sees the app. This is also the end of startup for --profile-startup
+	def on_first_frame( self, *args ):
+
+		Window.unbind( on_flip = self.on_first_frame )
+		self.first_frame_seconds = buskill_profile.since_launch()
+
+		msg = "INFO: Drew the first frame " +str( int( self.first_frame_seconds * 1000 ) )+ "ms after launch"
+		logger.info( msg )
+
+		if self.bk != None:
+			self.bk.metrics.observe( 'first_frame_seconds', self.first_frame_seconds )
+
+		buskill_profile.finish( 'the first frame' )
+
+	# initializes our BusKill object. This is executed in a background thread
+	def init_core( self ):
+
+		try:
+			core = packages.buskill.BusKill()
+		except Exception as e:
+			msg = "ERROR: Unable to initialize BusKill (" +str(e)+ ")"
+			logger.exception( msg )
+			Clock.schedule_once( lambda dt: self.core_failed( msg ) )
+			return
+
+		# kivy widgets must only be changed in the main thread
+		Clock.schedule_once( lambda dt: self.core_ready( core ) )
+
+	def core_ready( self, core ):
 
-		# set local instance fields that reference our global variables
 		global bk
-		self.bk = bk
+		bk = core
+		self.bk = core
+
+		ready_seconds = buskill_profile.since_launch()
+		self.bk.metrics.observe( 'core_ready_seconds', ready_seconds )
+		if self.first_frame_seconds != None:
+			self.bk.metrics.observe( 'first_frame_seconds', self.first_frame_seconds )
+
+		msg = "INFO: BusKill was initialized " +str( int( ready_seconds * 1000 ) )+ "ms after launch"
+		logger.info( msg )
+
+		# optionally use a different arm engine. For example, 'standby' spawns
+		# the listener process once now so that toggling the arm button
+		# doesn't have to wait for a new python interpreter on MacOS
+		arm_engine = os.environ.get( 'BUSKILL_ARM_ENGINE' )
+		if arm_engine:
+			try:
+				self.bk.set_arm_engine( arm_engine )
+			except RuntimeWarning as e:
+				msg = "WARNING: Ignoring BUSKILL_ARM_ENGINE (" +str(e)+ ")"
+				logger.warning( msg )
+
+		# optionally poll the update mirrors one-at-a-time (see upgrade.py)
+		upgrade_strategy = os.environ.get( 'BUSKILL_UPGRADE_STRATEGY' )
+		if upgrade_strategy:
+			try:
+				self.bk.set_upgrade_strategy( upgrade_strategy )
+			except RuntimeWarning as e:
+				msg = "WARNING: Ignoring BUSKILL_UPGRADE_STRATEGY (" +str(e)+ ")"
+				logger.warning( msg )
+
+		# let `buskill --stats`, `buskill --disarm`, etc. talk to us. When they
+		# arm or disarm us, the main screen has to be updated in the main thread
+		main_screen = self.manager.get_screen( 'main' )
+		self.bk.control_listener = lambda: Clock.schedule_once( main_screen.update_armed_state )
+
+		# if we can't listen, then maybe a `buskill --daemon` already is. If so,
+		# our arm button controls *its* armed state
+		daemon = None
+		if not self.bk.start_control_server():
+			daemon = buskill_control.find_running_instance(
+			 buskill_platform.get_data_dirs()
+			)
+			if daemon != None:
+				msg = "INFO: Found a running instance of BusKill; the arm button controls it"
+				logger.info( msg )
+
+		self.manager.get_screen( 'debug_log' ).bk = self.bk
+		main_screen.core_ready( self.bk, daemon )
+
+	def core_failed( self, msg ):
+		self.manager.get_screen( 'main' ).core_failed( msg )
+
+	@buskill_profile.profiled
+	def build(self):
 
 		# this doesn't work in Linux, so instead we just overwrite the built-in
 		# kivy icons with ours, but that's done in the linux build script
@@ -576,21 +858,29 @@ class BusKillApp(App):
 		self.icon = 'buskill-icon-150.png'
 
 		# is the OS that we're running on supported?
-		if self.bk.IS_PLATFORM_SUPPORTED:
+		if buskill_platform.get_capabilities()['is_platform_supported']:
 
 			# yes, this platform is supported; show the main window
 			Window.bind( on_request_close = self.close )
 
-			self.manager.add_widget( MainWindow(name='main') )
-			self.manager.add_widget( DebugLog(name='debug_log') )
+			with buskill_profile.phase( 'MainWindow' ):
+				self.manager.add_widget( MainWindow(name='main') )
+			with buskill_profile.phase( 'DebugLog' ):
+				self.manager.add_widget( DebugLog(name='debug_log') )
+
+			# the window is shown while our BusKill object looks for its data dir,
+			# wipes its cache, handles upgrades, etc. Then it's bound to our
+			# screens by core_ready()
+			threading.Thread( target=self.init_core, daemon=True ).start()
+
 			return self.manager
 
 		else:
 			# the current platform isn't supported; show critical error window
 
-			msg = buskill.ERR_PLATFORM_NOT_SUPPORTED
-			print( msg ); logger.error( msg )
+			msg = buskill_platform.ERR_PLATFORM_NOT_SUPPORTED
+			logger.error( msg )
 
 			crit = CriticalError()
-			crit.showError( buskill.ERR_PLATFORM_NOT_SUPPORTED )
+			crit.showError( buskill_platform.ERR_PLATFORM_NOT_SUPPORTED )
 			return crit
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3.7
+"""
+::
+
+  File:    buskill_logging.py
+
+This sets-up logging for the BusKill app. Log calls only put the record on a queue; a background thread (a logging.handlers.QueueListener) does the formatting and the writes to the log file (which may be on a slow usb drive) and the echo to stdout (which can be limited to errors). That way the code that executes the trigger never waits on the disk or the terminal.
+
+The log file is rotated when it reaches a size cap, and the older segments are gzip'd (buskill.log.1.gz, buskill.log.2.gz, ...). The cap and the number of segments kept can be set with $BUSKILL_LOG_MAX_BYTES and $BUSKILL_LOG_BACKUPS. Many processes may write to the same log file (eg a daemon, the GUI, and short-lived CLI clients), so only the one that holds a lock on buskill.log.lock rotates it; the others just append to it, and re-open it after it's been rotated.
+
+For more info, see: https://buskill.in/
+"""
+
+################################################################################
+#                                   IMPORTS                                    #
+################################################################################
+
+import atexit, collections, gzip, logging, logging.handlers, multiprocessing.util
+import os, queue, shutil, sys, threading
+
+# there's no flock() on Windows, where the process that set-up logging always
+# rotates the log file (see SegmentedFileHandler)
+try:
+	import fcntl
+except ImportError:
+	fcntl = None
+
+################################################################################
+#                                  SETTINGS                                    #
+################################################################################
+
+LOG_FORMAT = '%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s'
+LOG_DATEFMT = '%H:%M:%S'
+
+# the stdout echo is just the message, like the print()s that it replaced
+ECHO_FORMAT = '%(message)s'
+
+# pass this as the 'extra' of a log call to only write it to the log file
+NO_ECHO = { 'echo': False }
+
+# the log file is rotated when it would grow past this many bytes (0 means
+# never), and this many rotated segments are kept
+DEFAULT_LOG_MAX_BYTES = 10485760
+DEFAULT_LOG_BACKUP_COUNT = 5
+
+# the gzip level of the rotated segments. Rotation happens in the listener
+# thread, but we don't need the extra few percent that level 9 would give us
+LOG_COMPRESS_LEVEL = 6
+
+# how much of the log file we read at a time when reading it backwards
+LOG_READ_BLOCK_SIZE = 65536
+
+log_file_path = None
+log_level = logging.DEBUG
+log_max_bytes = DEFAULT_LOG_MAX_BYTES
+log_backup_count = DEFAULT_LOG_BACKUP_COUNT
+echo = True
+
+# the log file is rotated by at most one process: whichever one holds the lock
+# on this file (next to the log file). A fork()ed child never rotates it
+LOG_LOCK_SUFFIX = '.lock'
+rotate = True
+
+# the QueueListener thread that's currently handling our records
+listener = None
+
+################################################################################
+#                                 FUNCTIONS                                    #
+################################################################################
+
+# returns the handlers that do the actual (slow) work of writing the records
+def make_handlers():
+
+	handlers = list()
+
+	if log_file_path != None:
+
+		file_handler = SegmentedFileHandler(
+		 log_file_path,
+		 mode = 'a',
+		 maxBytes = log_max_bytes,
+		 backupCount = log_backup_count
+		)
+		file_handler.setFormatter( logging.Formatter( LOG_FORMAT, LOG_DATEFMT ) )
+		handlers.append( file_handler )
+
+	echo_handler = logging.StreamHandler( sys.stdout )
+	echo_handler.setFormatter( logging.Formatter( ECHO_FORMAT ) )
+	echo_handler.addFilter( lambda record: getattr( record, 'echo', True ) )
+	if not echo:
+		# even when we're quiet, errors are still shown
+		echo_handler.setLevel( logging.ERROR )
+	handlers.append( echo_handler )
+
+	return handlers
+
+# the rotated segments are gzip'd, so they get a '.gz' suffix
+def segment_namer( default_name ):
+	return default_name + '.gz'
+
+# called by the RotatingFileHandler (after it has closed the log file) to move
+# the log file to its first rotated segment. It's renamed out of the way first,
+# so the other processes' handlers start a new log file on their next record
+# rather than writing to the one that we're about to delete
+def segment_rotator( source, dest ):
+
+	rotating = source + '.rotating'
+	os.replace( source, rotating )
+
+	with open( rotating, 'rb' ) as source_file:
+		with gzip.open( dest, 'wb', compresslevel=LOG_COMPRESS_LEVEL ) as dest_file:
+			shutil.copyfileobj( source_file, dest_file )
+
+	os.remove( rotating )
+
+# replaces the root logger's handlers with the given handlers. If 'queued' is
+# True, the root logger only gets a QueueHandler and the given handlers are
+# called from a QueueListener thread instead
+def install( handlers, queued=True ):
+
+	global listener
+
+	stop_listener()
+
+	root = logging.getLogger()
+	for handler in list( root.handlers ):
+		root.removeHandler( handler )
+		handler.close()
+
+	if queued:
+		records = queue.SimpleQueue()
+		root.addHandler( logging.handlers.QueueHandler( records ) )
+		listener = Listener( records, *handlers, respect_handler_level=True )
+		listener.start()
+	else:
+		for handler in handlers:
+			root.addHandler( handler )
+
+	root.setLevel( log_level )
+
+# stops the QueueListener thread after it has written everything in its queue
+def stop_listener():
+
+	global listener
+
+	if listener == None:
+		return
+
+	listener.stop()
+	for handler in listener.handlers:
+		handler.close()
+	listener = None
+
+# returns the integer in the given environment variable, or 'default' if it's
+# unset or invalid
+def get_env_int( name, default ):
+
+	value = os.environ.get( name )
+	if value == None:
+		return default
+
+	try:
+		value = int( value )
+	except ValueError:
+		value = -1
+
+	if value < 0:
+		msg = "WARNING: Ignoring invalid $" +str(name)+ " (" +str(os.environ[name])+ ")"
+		print( msg, file=sys.stderr )
+		return default
+
+	return value
+
+# blocks until the listener has written every record that was logged before
+# this call (or until 'timeout' seconds have passed). Returns False on timeout
+def flush( timeout=5 ):
+
+	if listener == None:
+		return True
+
+	flushed = threading.Event()
+	listener.queue.put( logging.makeLogRecord( { 'flushed': flushed } ) )
+	return flushed.wait( timeout )
+
+# this is called by main.py (instead of logging.basicConfig()) to set-up
+# logging to the given file. If 'max_bytes' or 'backup_count' aren't given,
+# they're taken from the environment (or our defaults)
+def setup_logging( file_path, level=logging.DEBUG, max_bytes=None, backup_count=None ):
+
+	global log_file_path, log_level, log_max_bytes, log_backup_count
+
+	if max_bytes == None:
+		max_bytes = get_env_int( 'BUSKILL_LOG_MAX_BYTES', DEFAULT_LOG_MAX_BYTES )
+	if backup_count == None:
+		backup_count = get_env_int( 'BUSKILL_LOG_BACKUPS', DEFAULT_LOG_BACKUP_COUNT )
+
+	log_file_path = os.path.abspath( file_path )
+	log_level = level
+	log_max_bytes = max_bytes
+	log_backup_count = backup_count
+	install( make_handlers() )
+
+def get_log_file_path():
+	return log_file_path
+
+# returns the paths of the log's segments that exist, newest first (the log
+# file itself, then buskill.log.1.gz, buskill.log.2.gz, ...)
+def get_log_segments():
+
+	if log_file_path == None:
+		return list()
+
+	segments = list()
+	if os.path.exists( log_file_path ):
+		segments.append( log_file_path )
+
+	# we look past log_backup_count in case it was lowered since the last run
+	index = 1
+	while True:
+		segment = log_file_path + '.' +str(index)+ '.gz'
+		if not os.path.exists( segment ):
+			break
+		segments.append( segment )
+		index += 1
+
+	return segments
+
+# yields the lines of the (uncompressed) file at 'path', last line first,
+# reading it backwards one block at a time
+def read_lines_backwards( path ):
+
+	with open( path, 'rb' ) as log_file:
+
+		position = log_file.seek( 0, os.SEEK_END )
+		remainder = b''
+
+		while position > 0:
+			size = min( LOG_READ_BLOCK_SIZE, position )
+			position -= size
+			log_file.seek( position )
+
+			lines = ( log_file.read( size ) + remainder ).split( b'\n' )
+
+			# the first line may continue in the previous block
+			remainder = lines.pop( 0 )
+			for line in reversed( lines ):
+				yield line
+
+		yield remainder
+
+# returns (at most) the last 'max_lines' lines of the log, across its
+# segments, oldest first. Only the segments that are needed are read, and
+# only 'max_lines' lines are held in memory at a time
+def read_log_tail( max_lines ):
+
+	tail = collections.deque()
+
+	for segment in get_log_segments():
+
+		if len(tail) >= max_lines:
+			break
+		wanted = max_lines - len(tail)
+
+		try:
+			if segment.endswith( '.gz' ):
+				# we can't read a gzip file backwards, so we stream through it
+				# and keep only its last lines
+				with gzip.open( segment, 'rb' ) as segment_file:
+					lines = collections.deque( segment_file, maxlen=wanted )
+				lines = [ line.rstrip( b'\n' ) for line in lines ]
+			else:
+				lines = list()
+				for line in read_lines_backwards( segment ):
+					# skip the empty "line" after the file's final newline
+					if len(lines) == 0 and line == b'':
+						continue
+					lines.append( line )
+					if len(lines) >= wanted:
+						break
+				lines.reverse()
+
+		except (OSError, EOFError) as e:
+			# eg the segment was rotated away while we were reading it
+			msg = "WARNING: Unable to read log segment '" +str(segment)+ "' (" +str(e)+ ")"
+			logging.warning( msg )
+			continue
+
+		tail.extendleft( reversed( lines ) )
+
+	return [ line.decode( 'utf-8', 'replace' ) for line in tail ]
+
+# writes the whole log, across its segments (oldest first), to a single
+# uncompressed file at 'output_path', streaming one segment at a time
+def export_log( output_path ):
+
+	with open( output_path, 'wb' ) as output_file:
+		for segment in reversed( get_log_segments() ):
+			if segment.endswith( '.gz' ):
+				with gzip.open( segment, 'rb' ) as segment_file:
+					shutil.copyfileobj( segment_file, output_file )
+			else:
+				with open( segment, 'rb' ) as segment_file:
+					shutil.copyfileobj( segment_file, output_file )
+
+# turns the echo of log messages to stdout on or off (except for errors)
+def set_echo( enabled ):
+
+	global echo
+
+	if enabled == echo:
+		return
+
+	echo = enabled
+	if listener != None:
+		install( make_handlers() )
+
+# a child that multiprocessing fork()ed (eg the 'process' arm engine on Linux)
+# gets a copy of our queue but not the listener thread, so it needs its own
+# handlers & listener. The child doesn't run atexit, so we also ask
+# multiprocessing to stop the child's listener (writing everything in its
+# queue) when the child exits
+def after_fork_in_child( root ):
+
+	global listener, rotate
+
+	if listener == None:
+		return
+
+	# the parent's listener (and its handlers' locks) don't exist here. We
+	# share the parent's lock on the log file, but it's the parent that rotates
+	listener = None
+	rotate = False
+	install( make_handlers() )
+
+	multiprocessing.util.Finalize( None, stop_listener, exitpriority=-100 )
+
+################################################################################
+#                                   OBJECTS                                    #
+################################################################################
+
+# a RotatingFileHandler that only rotates the log file if this process holds
+# the lock on LOG_LOCK_SUFFIX (which it tries to take when the log file is
+# full), and that re-opens the log file (like a WatchedFileHandler) if another
+# process has rotated it
+class SegmentedFileHandler( logging.handlers.RotatingFileHandler ):
+
+	def __init__( self, *args, **kwargs ):
+
+		self.lock_fd = None
+		self.stream_id = None
+		super().__init__( *args, **kwargs )
+		self.namer = segment_namer
+		self.rotator = segment_rotator
+
+	def _open( self ):
+
+		stream = super()._open()
+		stat = os.fstat( stream.fileno() )
+		self.stream_id = ( stat.st_dev, stat.st_ino )
+		return stream
+
+	def reopen_if_rotated( self ):
+
+		if self.stream == None:
+			return
+
+		try:
+			stat = os.stat( self.baseFilename )
+			if ( stat.st_dev, stat.st_ino ) == self.stream_id:
+				return
+		except FileNotFoundError:
+			pass
+
+		self.stream.close()
+		self.stream = self._open()
+
+	# returns True if we may rotate the log file
+	def is_rotation_owner( self ):
+
+		if not rotate:
+			return False
+		if fcntl == None or self.lock_fd != None:
+			return True
+
+		fd = os.open( self.baseFilename + LOG_LOCK_SUFFIX, os.O_RDWR | os.O_CREAT, 0o600 )
+		try:
+			fcntl.flock( fd, fcntl.LOCK_EX | fcntl.LOCK_NB )
+		except OSError:
+			# another process is the owner
+			os.close( fd )
+			return False
+
+		self.lock_fd = fd
+		return True
+
+	def shouldRollover( self, record ):
+
+		if not super().shouldRollover( record ):
+			return False
+		return self.is_rotation_owner()
+
+	def emit( self, record ):
+
+		self.reopen_if_rotated()
+		super().emit( record )
+
+	def close( self ):
+
+		super().close()
+		if self.lock_fd != None:
+			os.close( self.lock_fd )
+			self.lock_fd = None
+
+# a QueueListener that also understands the markers put on its queue by flush()
+class Listener( logging.handlers.QueueListener ):
+
+	def handle( self, record ):
+
+		flushed = getattr( record, 'flushed', None )
+		if flushed != None:
+			# every record that was queued before this marker has been written
+			for handler in self.handlers:
+				handler.flush()
+			flushed.set()
+			return
+
+		super().handle( record )
+
+################################################################################
+#                                  MAIN BODY                                   #
+################################################################################
+
+# write everything that's still in the queue before we exit
+atexit.register( stop_listener )
+
+# multiprocessing only keeps a weak reference to the object that the callback
+# is registered with, so we use the root logger (which lives forever)
+multiprocessing.util.register_after_fork( logging.getLogger(), after_fork_in_child )
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3.7
+"""
+::
+
+  File:    buskill_metrics.py
+
+These are the runtime metrics (counters and fixed-bucket histograms) that the BusKill object keeps about itself, so we can see how it behaves in the field. They're read from a running instance with `buskill --stats` (see buskill_control.py).
+
+It doesn't import packages.buskill (or libusb), so `buskill --stats` can format the metrics without initializing BusKill.
+
+The set of metrics is fixed, so all of their values fit in one array of doubles. That array is shared memory (a multiprocessing.RawArray), so the events counted by a listener in another process (the 'standby' and 'process' arm engines) or the phases of an upgrade running in the background are seen by the process that serves the stats.
+
+Those processes may be killed while they hold the lock on the array (eg the 'process' arm engine's listener is SIGKILLed on disarm), so nobody waits for that lock for longer than METRICS_LOCK_TIMEOUT. The metrics are best-effort; they must never hang the process that's counting them.
+
+For more info, see: https://buskill.in/
+"""
+
+################################################################################
+#                                   IMPORTS                                    #
+################################################################################
+
+import bisect, multiprocessing, time
+
+import logging
+logger = logging.getLogger( __name__ )
+
+################################################################################
+#                                  SETTINGS                                    #
+################################################################################
+
+METRIC_PREFIX = 'buskill_'
+
+# how long (in seconds) to wait for the lock on the shared values before we
+# assume that it was abandoned by a killed process, and stop using it
+METRICS_LOCK_TIMEOUT = 0.1
+
+# the upper bounds (in seconds) of the histograms' buckets
+LATENCY_BUCKETS = (
+ 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+PHASE_BUCKETS = ( 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600 )
+
+UPGRADE_PHASES = (
+ 'setup_gpg', 'poll_metadata', 'verify_metadata', 'download',
+ 'verify_signature', 'verify_integrity', 'install'
+)
+
+# ( name, help )
+COUNTERS = (
+ ( 'events_seen', "USB hotplug events received by the detector" ),
+ ( 'events_filtered', "Events dropped because they weren't a removal of the selected device" ),
+ ( 'events_coalesced', "Removal events ignored because the trigger had already fired" ),
+ ( 'triggers_fired', "Times that the trigger was executed" ),
+)
+
+# ( name, help, buckets, label name, label values )
+HISTOGRAMS = (
+ ( 'arm_seconds', "Time taken to arm", LATENCY_BUCKETS, None, ( None, ) ),
+ ( 'disarm_seconds', "Time taken to disarm", LATENCY_BUCKETS, None, ( None, ) ),
+ ( 'trigger_seconds', "Time from detecting a removal to the trigger finishing", LATENCY_BUCKETS, None, ( None, ) ),
+ ( 'first_frame_seconds', "Time from launch to the GUI drawing its first frame", LATENCY_BUCKETS, None, ( None, ) ),
+ ( 'core_ready_seconds', "Time from launch to the GUI's BusKill object being initialized", LATENCY_BUCKETS, None, ( None, ) ),
+ ( 'upgrade_phase_seconds', "Time taken by each phase of an upgrade", PHASE_BUCKETS, 'phase', UPGRADE_PHASES ),
+)
+
+################################################################################
+#                                 FUNCTIONS                                    #
+################################################################################
+
+# formats a snapshot (as returned by Metrics.snapshot()) in the Prometheus
+# text exposition format
+#  * https://prometheus.io/docs/instrumenting/exposition_formats/
+def format_prometheus( snapshot ):
+
+	lines = list()
+
+	for name, help in COUNTERS:
+		metric = METRIC_PREFIX + name + '_total'
+		lines.append( '# HELP ' +metric+ ' ' +help )
+		lines.append( '# TYPE ' +metric+ ' counter' )
+		lines.append( metric+ ' ' +format_number( snapshot['counters'][name] ) )
+
+	for name, help, buckets, label_name, label_values in HISTOGRAMS:
+		metric = METRIC_PREFIX + name
+		lines.append( '# HELP ' +metric+ ' ' +help )
+		lines.append( '# TYPE ' +metric+ ' histogram' )
+
+		for label, histogram in snapshot['histograms'][name].items():
+
+			labels = ''
+			if label_name != None:
+				labels = label_name+ '="' +label+ '",'
+
+			for le, count in histogram['buckets']:
+				lines.append(
+				 metric+ '_bucket{' +labels+ 'le="' +str(le)+ '"} ' +format_number(count)
+				)
+
+			labels = labels.rstrip( ',' )
+			if labels != '':
+				labels = '{' +labels+ '}'
+			lines.append( metric+ '_sum' +labels+ ' ' +repr( histogram['sum'] ) )
+			lines.append( metric+ '_count' +labels+ ' ' +format_number( histogram['count'] ) )
+
+	return "\n".join( lines ) + "\n"
+
+# formats a snapshot for humans, estimating percentiles from the buckets
+def format_text( snapshot ):
+
+	lines = list()
+
+	for name, help in COUNTERS:
+		lines.append( '{:<34} {}'.format( name, format_number( snapshot['counters'][name] ) ) )
+
+	for name, help, buckets, label_name, label_values in HISTOGRAMS:
+		for label, histogram in snapshot['histograms'][name].items():
+
+			title = name
+			if label_name != None:
+				title += '{' +label_name+ '=' +label+ '}'
+
+			count = histogram['count']
+			if count == 0:
+				lines.append( '{:<34} n=0'.format( title ) )
+				continue
+
+			lines.append( '{:<34} n={:<5} mean={:.3f}ms  p50<={}  p99<={}'.format(
+			 title,
+			 format_number( count ),
+			 histogram['sum'] / count * 1000,
+			 estimate_percentile( histogram, 50 ),
+			 estimate_percentile( histogram, 99 )
+			) )
+
+	return "\n".join( lines ) + "\n"
+
+# returns the upper bound of the bucket that contains the given percentile
+def estimate_percentile( histogram, pct ):
+
+	rank = pct / 100 * histogram['count']
+	for le, count in histogram['buckets']:
+		if count >= rank:
+			if le == '+Inf':
+				return le
+			return '{:g}ms'.format( le * 1000 )
+
+	return '+Inf'
+
+# the values are stored as doubles, but counts should look like integers
+def format_number( value ):
+
+	if value == int( value ):
+		return str( int( value ) )
+
+	return repr( value )
+
+################################################################################
+#                                   OBJECTS                                    #
+################################################################################
+
+class Metrics:
+
+	def __init__( self ):
+
+		# the offset of each metric's values in the shared array. A histogram
+		# has one value per bucket (plus the +Inf bucket), then its sum & count
+		self.offsets = dict()
+		self.buckets = dict()
+
+		size = 0
+		for name, help in COUNTERS:
+			self.offsets[ (name, None) ] = size
+			size += 1
+
+		for name, help, buckets, label_name, label_values in HISTOGRAMS:
+			self.buckets[name] = buckets
+			for label in label_values:
+				self.offsets[ (name, label) ] = size
+				size += len(buckets) + 3
+
+		self.values = multiprocessing.RawArray( 'd', size )
+		self.lock = multiprocessing.Lock()
+
+		# this is set (only in this process) once we stop using the lock
+		self.lock_abandoned = False
+
+	# acquires self.lock, unless we've given up on it. Returns whether we hold
+	# it (and so have to release it). If we don't, then we update the values
+	# without it, which can lose an update to a race with another writer, but
+	# that's better than waiting forever for a lock that a killed process held
+	def acquire( self ):
+
+		if self.lock_abandoned:
+			return False
+
+		if self.lock.acquire( timeout = METRICS_LOCK_TIMEOUT ):
+			return True
+
+		self.lock_abandoned = True
+		msg = "WARNING: The lock on the metrics wasn't released (was its holder killed?); updating them without it"
+		logger.warning( msg )
+		return False
+
+	def inc( self, name, amount=1 ):
+
+		offset = self.offsets[ (name, None) ]
+		locked = self.acquire()
+		try:
+			self.values[offset] += amount
+		finally:
+			if locked:
+				self.lock.release()
+
+	# records one observation (in seconds) in the given histogram
+	def observe( self, name, value, label=None ):
+
+		buckets = self.buckets[name]
+		offset = self.offsets[ (name, label) ]
+
+		# the first bucket whose upper bound is >= value (or the +Inf bucket)
+		bucket = bisect.bisect_left( buckets, value )
+
+		locked = self.acquire()
+		try:
+			self.values[ offset + bucket ] += 1
+			self.values[ offset + len(buckets) + 1 ] += value
+			self.values[ offset + len(buckets) + 2 ] += 1
+		finally:
+			if locked:
+				self.lock.release()
+
+	# observes the time since 'start' (as returned by time.monotonic())
+	def observe_since( self, name, start, label=None ):
+		self.observe( name, time.monotonic() - start, label )
+
+	# returns a copy of all the metrics as a dict that can be sent as json.
+	# The histograms' buckets are cumulative, like Prometheus expects
+	def snapshot( self ):
+
+		locked = self.acquire()
+		try:
+			values = list( self.values )
+		finally:
+			if locked:
+				self.lock.release()
+
+		snapshot = { 'counters': dict(), 'histograms': dict() }
+
+		for name, help in COUNTERS:
+			snapshot['counters'][name] = values[ self.offsets[ (name, None) ] ]
+
+		for name, help, buckets, label_name, label_values in HISTOGRAMS:
+			snapshot['histograms'][name] = dict()
+			for label in label_values:
+
+				offset = self.offsets[ (name, label) ]
+				cumulative = 0
+				histogram_buckets = list()
+				for index, le in enumerate( buckets + ('+Inf',) ):
+					cumulative += values[ offset + index ]
+					histogram_buckets.append( [ le, cumulative ] )
+
+				if label == None:
+					label = ''
+
+				snapshot['histograms'][name][label] = {
+				 'buckets': histogram_buckets,
+				 'sum': values[ offset + len(buckets) + 1 ],
+				 'count': values[ offset + len(buckets) + 2 ],
+				}
+
+		return snapshot
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3.7
+"""
+::
+
+  File:    buskill_platform.py
+  Authors: Michael Altfield <michael@buskill.in>
+
+This describes the platform that we're running on: what BusKill supports here (triggers, arm engines, detectors, etc) and where the app's files are. Unlike packages.buskill.BusKill(), it doesn't import libusb and it doesn't touch the filesystem (it doesn't look for a writable data dir, wipe the cache, or check for upgrades), so the CLI uses it to answer trivial commands like --list-triggers, --capabilities, and --stats. BusKill() gets the same information from here.
+
+For more info, see: https://buskill.in/
+"""
+
+################################################################################
+#                                   IMPORTS                                    #
+################################################################################
+
+import os, platform, re, socket, sys
+
+################################################################################
+#                                  SETTINGS                                    #
+################################################################################
+
+CURRENT_PLATFORM = platform.system().upper()
+
+# the name of our data dir, which is created in the first of the dirs
+# returned by get_data_dir_candidates() that we can write to
+DATA_DIR_NAME = '.buskill'
+
+SUPPORTED_TRIGGERS = ['lock-screen', 'soft-shutdown']
+SUPPORTED_REARM_POLICIES = ['disarm', 'after-trigger', 'cooldown']
+SUPPORTED_TRIGGER_STRATEGIES = ['serial', 'race']
+SUPPORTED_UPGRADE_STRATEGIES = ['race', 'serial']
+
+ERR_PLATFORM_NOT_SUPPORTED = 'ERROR: Your platform (' +str(platform.system())+ ') is not supported. If you believe this is an error, please file a bug report:\n\nhttps://github.com/BusKill/buskill-app/issues'
+
+################################################################################
+#                                 FUNCTIONS                                    #
+################################################################################
+
+# returns a dict describing what BusKill supports on this platform
+def get_capabilities():
+
+	capabilities = {
+	 'platform': CURRENT_PLATFORM,
+	 'is_platform_supported': False,
+	 'os_name_short': None,
+	 'supported_triggers': list( SUPPORTED_TRIGGERS ),
+	 'supported_arm_engines': ['process'],
+	 'arm_engine': None,
+	 'supported_detectors': [],
+	 'detector': None,
+	 'supported_rearm_policies': list( SUPPORTED_REARM_POLICIES ),
+	 'supported_trigger_strategies': list( SUPPORTED_TRIGGER_STRATEGIES ),
+	 'supported_upgrade_strategies': list( SUPPORTED_UPGRADE_STRATEGIES ),
+
+	 # `buskill --stats` talks to the running instance over a unix socket
+	 'control_socket': hasattr( socket, 'AF_UNIX' ),
+	}
+
+	if CURRENT_PLATFORM.startswith( 'LINUX' ):
+		capabilities['is_platform_supported'] = True
+		capabilities['os_name_short'] = 'lin'
+
+		# on Linux, we can interrupt libusb's event loop, so we don't need to
+		# spawn (and SIGKILL) a child process to arm & disarm
+		capabilities['supported_arm_engines'] = ['thread', 'standby', 'process']
+		capabilities['arm_engine'] = 'thread'
+
+		capabilities['supported_detectors'] = ['libusb', 'uevent']
+		capabilities['detector'] = 'libusb'
+
+	if CURRENT_PLATFORM.startswith( 'WIN' ):
+		capabilities['is_platform_supported'] = True
+		capabilities['os_name_short'] = 'win'
+
+		# TODO: add support for the 'thread' engine to armWin()
+		capabilities['supported_arm_engines'] = ['process']
+		capabilities['arm_engine'] = 'process'
+
+		capabilities['supported_detectors'] = ['win32']
+		capabilities['detector'] = 'win32'
+
+	if CURRENT_PLATFORM.startswith( 'DARWIN' ):
+		capabilities['is_platform_supported'] = True
+		capabilities['os_name_short'] = 'mac'
+
+		# on MacOS, the 'thread' engine is especially helpful because we use
+		# the 'spawn' start method there, which re-imports the whole app in a
+		# new python interpreter every time that we arm with the 'process' engine
+		capabilities['supported_arm_engines'] = ['thread', 'standby', 'process']
+		capabilities['arm_engine'] = 'thread'
+
+		capabilities['supported_detectors'] = ['libusb']
+		capabilities['detector'] = 'libusb'
+
+	return capabilities
+
+# returns a dict with the paths relative to the buskill executable, which are:
+#
+# 1. EXE_PATH = the absolute path to the executable for running BusKill,
+#               which is:
+#                 [a] the 'buskill-<version>.AppImage' file in Linux
+#                 [b] the 'buskill.exe' file in Windows
+#                 [c] the 'buskill' binary file in MacOS
+# 2. EXE_FILE = just the filename (basename) of the EXE_PATH
+# 3. EXE_DIR = the directory (dirname) where EXE_FILE lives
+# 4. APP_DIR = the root directory for a given version of the buskill app,
+#              which is 'buskill-<lin|win|mac>-<version>-x86_64' and:
+#                 [a] the dir containing the EXE_FILE file in Linux
+#                 [b] 1 dir above the dir containing the EXE_FILE in
+#                     Windows
+#                 [c] 2 dirs above the dir containing the EXE_FILE in
+#                     MacOS
+# 4. APPS_DIR = the directory where the app dirs live (one dir above
+#               APP_DIR)
+# 5. SRC_DIR =  the absolute path to the directory where the 'src' directory
+#               lives. This is where files like 'KEYS' and directories like
+#               'packages' are stored. On some platforms like Linux, this is
+#               distinct from the APP_DIR because the contents of the AppImage
+#               is extracted to a temp dir at runtime
+#
+# and EXECUTED_AS_SCRIPT, which is True if we were executed as `main.py`
+# (rather than as a PyInstaller executable)
+def get_app_paths():
+
+	capabilities = get_capabilities()
+
+	# get the absolute path to the file that the user executes to start buskill
+	exe_path = sys.executable
+
+	# if the executable is actually just the python interpreter, then what
+	# we want is the first argument
+	if re.match( ".*python([1-9]\.?)*$", exe_path ):
+		exe_path = os.path.abspath( sys.argv[0] )
+
+	# split the EXE_PATH into dir & file parts
+	exe_dir = os.path.split( exe_path )[0]
+	exe_file = os.path.split( exe_path )[1]
+
+	app_dir = None
+	src_dir = None
+
+	if CURRENT_PLATFORM.startswith( 'LINUX' ):
+
+		# on Linux, the buskill AppImage is directly inside the APP_DIR
+		app_dir = exe_dir
+
+		# on Linux, the AppImage is extracted to a root-owned temporary directory
+		# at runtime
+		src_dir = sys.path[0]
+
+	if CURRENT_PLATFORM.startswith( 'WIN' ):
+
+		# on Windows, the buskill binary is 1 dir below the APP_DIR
+		app_dir = os.sep.join( exe_path.split( os.sep )[0:-2] )
+
+		# on Windows, the exe lives in the same dir with all our other src files
+		src_dir = exe_dir
+
+	if CURRENT_PLATFORM.startswith( 'DARWIN' ):
+
+		# on MacOS, the binary is 2 dirs below the .app dir
+		app_dir = os.sep.join( exe_path.split( os.sep )[0:-3] )
+
+		# on MacOS, the exe lives in the same dir with all our other src files
+		src_dir = exe_dir
+
+	# normally the BusKill app is built into a platform-specific executable with
+	# PyInstaller. But if we're executing it directly as a script, then some of
+	# the logic will change throught the app
+	#if exe_file == 'main.py' and os.path.split(app_dir)[1] == 'src':
+	if exe_file == 'main.py':
+		executed_as_script = True
+
+		app_dir = os.path.abspath(
+		 os.path.join( app_dir, os.pardir)
+		)
+	else:
+		executed_as_script = False
+
+	# We package our .zip inside a single root dir to prevent zip-bombing.
+	# When extracted on most platforms, this root dir is dropped into the
+	# the cwd. But when using the Windows file Explorer GUI to extract
+	# our .zip release, it actually creates an additional root dir with
+	# the same name as our .zip file (minus the .zip extension). This
+	# inconsistency means that we may have to go one dir up again
+	if re.match(
+	 "^buskill-" +str(capabilities['os_name_short'])+ "-.*",
+	 app_dir.split(os.sep)[-2]
+	):
+		# the dir that we expected to be our APP_DIR is actually inside of
+		# another dir that has the name "buskil-...", so let's make
+		# *that* dir our APP_DIR
+
+		app_dir = os.path.abspath(
+		 os.path.join( app_dir, os.pardir)
+		)
+
+	return {
+	 'EXECUTED_AS_SCRIPT': executed_as_script,
+	 'EXE_PATH': exe_path,
+	 'EXE_DIR': exe_dir,
+	 'EXE_FILE': exe_file,
+	 'APP_DIR': app_dir,
+
+	 # the APPS_DIR is one dir above the APP_DIR
+	 'APPS_DIR': os.path.abspath( os.path.join( app_dir, os.pardir ) ),
+
+	 'SRC_DIR': src_dir,
+	}
+
+# returns the dirs in which we may create our data dir, in order of preference
+def get_data_dir_candidates( apps_dir, app_dir ):
+
+	return [
+
+	 # first try to create our data dir in the same dir that holds the dir
+	 # where the buskill app was installed (and where future updates will be
+	 # installed). This may be the BusKill USB drive itself.
+	 apps_dir,
+
+	 # Fall-back to the dir in which the executable is located
+	 app_dir,
+
+	 # finally, try the users's $HOME dir
+	 os.path.join( os.path.expanduser('~') ),
+	]
+
+# returns the paths that our DATA_DIR may be at (one in each of the candidates
+# above), without checking which one of them we can write to
+def get_data_dirs():
+
+	paths = get_app_paths()
+	return [
+	 os.path.join( data_dir, DATA_DIR_NAME )
+	 for data_dir in get_data_dir_candidates( paths['APPS_DIR'], paths['APP_DIR'] )
+	]
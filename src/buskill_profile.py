@@ -0,0 +1,256 @@
+#!/usr/bin/env python3.7
+"""
+::
+
+  File:    buskill_profile.py
+
+This is the startup profiler that's enabled by passing --profile-startup to main.py. It times every module that's imported (by hooking `import`, so it also works in our PyInstaller builds where `python -X importtime` isn't available) and the phases of BusKill.__init__() (in the CLI; the GUI initializes BusKill in a background thread, which isn't timed) and BusKillApp.build(), then writes a report sorted by cost when startup is over (when the GUI draws its first frame or the CLI has initialized BusKill).
+
+When it isn't enabled, phase() returns a shared no-op object and @profiled just calls the function, so they can be left in the startup path.
+
+For more info, see: https://buskill.in/
+"""
+
+################################################################################
+#                                   IMPORTS                                    #
+################################################################################
+
+import builtins, functools, os, sys, tempfile, threading, time
+
+import logging
+logger = logging.getLogger( __name__ )
+
+################################################################################
+#                                  SETTINGS                                    #
+################################################################################
+
+PROFILE_FILE_NAME = 'buskill-startup-profile.txt'
+
+# how many of the most expensive imports are listed in the report
+PROFILE_MAX_IMPORTS = 40
+
+# main.py imports us first, so this is (roughly) when the app was launched
+launched_at = time.perf_counter()
+
+profiling = False
+started_at = None
+
+# the real __import__ that our hook wraps
+real_import = builtins.__import__
+
+# only imports & phases in the main thread are timed, so we don't mix the
+# time spent by other threads into our stack
+main_thread_id = None
+
+# each frame is [ name, start, time spent in children, is it a phase? ]
+stack = list()
+
+# name -> [ cumulative seconds, self seconds ]
+imports = dict()
+
+# [ name, depth, cumulative seconds, self seconds, seconds since start when
+#   it ended ]
+phases = list()
+
+################################################################################
+#                                 FUNCTIONS                                    #
+################################################################################
+
+def enabled():
+	return profiling
+
+# returns how many seconds have passed since the app was launched. This works
+# whether or not we're profiling
+def since_launch():
+	return time.perf_counter() - launched_at
+
+# starts profiling. This should be called before importing anything that we
+# want to measure
+def start():
+
+	global profiling, started_at, main_thread_id
+
+	started_at = time.perf_counter()
+	main_thread_id = threading.get_ident()
+	profiling = True
+	builtins.__import__ = profiling_import
+
+def push( name, is_phase=False ):
+	stack.append( [ name, time.perf_counter(), 0.0, is_phase ] )
+
+# returns the name, start, cumulative & self time of the frame on the top of
+# the stack. The self time doesn't include nested phases nor imports
+def pop():
+
+	name, start, children, is_phase = stack.pop()
+	cumulative = time.perf_counter() - start
+
+	# our time counts as time spent in our parent's children
+	if stack:
+		stack[-1][2] += cumulative
+
+	return name, start, cumulative, cumulative - children
+
+def profiling_import( name, globals=None, locals=None, fromlist=(), level=0 ):
+
+	# skip the (very common) imports of modules that are already loaded, and
+	# anything outside the main thread
+	if not profiling or threading.get_ident() != main_thread_id or \
+	 ( level == 0 and not fromlist and name in sys.modules ):
+		return real_import( name, globals, locals, fromlist, level )
+
+	# name relative imports (eg `from . import tracing`) after their package,
+	# and `from x import y` after what they import from x
+	label = name
+	if level > 0 and globals != None:
+		package = globals.get( '__package__' ) or ''
+		label = package + '.' + name if name else package
+	if fromlist and label in sys.modules:
+		label += '.(' + ', '.join( fromlist ) + ')'
+
+	push( label )
+	try:
+		return real_import( name, globals, locals, fromlist, level )
+	finally:
+		label, start, cumulative, self_time = pop()
+		totals = imports.setdefault( label, [ 0.0, 0.0 ] )
+		totals[0] += cumulative
+		totals[1] += self_time
+
+# returns a context manager that times the code inside it as a phase
+def phase( name ):
+
+	if not profiling:
+		return NULL_PHASE
+
+	return Phase( name )
+
+# decorator that times each call of the decorated function as a phase
+def profiled( function ):
+
+	@functools.wraps( function )
+	def wrapper( *args, **kwargs ):
+
+		if not profiling:
+			return function( *args, **kwargs )
+
+		with Phase( function.__qualname__ ):
+			return function( *args, **kwargs )
+
+	return wrapper
+
+# stops profiling and writes the report. Returns the path to the report
+def finish( reason ):
+
+	global profiling
+
+	if not profiling:
+		return None
+
+	profiling = False
+	builtins.__import__ = real_import
+	elapsed = time.perf_counter() - started_at
+
+	path = os.path.join( tempfile.gettempdir(), PROFILE_FILE_NAME )
+	try:
+		with open( path, 'w' ) as report_file:
+			report_file.write( format_report( reason, elapsed ) )
+	except OSError as e:
+		msg = "ERROR: Unable to write the startup profile to '" +str(path)+ "' (" +str(e)+ ")"
+		logger.error( msg )
+		return None
+
+	msg = "INFO: Startup took " +ms(elapsed)+ " (until " +str(reason)+ "). Wrote the profile to '" +str(path)+ "'"
+	logger.info( msg )
+
+	return path
+
+def format_report( reason, elapsed ):
+
+	lines = [
+	 "BusKill startup profile",
+	 "",
+	 "total:   " +ms(elapsed)+ " from main.py until " +str(reason),
+	 "imports: " +ms( sum( self_time for cumulative, self_time in imports.values() ) )+ " in " +str(len(imports))+ " modules",
+	 "",
+	 "phases (most expensive first; nested phases are indented)",
+	 "  {:>10}  {:>10}  {:>10}  {}".format( 'cumulative', 'self', 'ended at', 'phase' ),
+	]
+
+	# sort the top-level phases by cost, keeping each one's nested phases
+	# (which were recorded before it) right under it
+	trees = list()
+	children = list()
+	for entry in phases:
+		name, depth, cumulative, self_time, at = entry
+		if depth == 0:
+			trees.append( ( entry, sort_tree( children ) ) )
+			children = list()
+		else:
+			children.append( entry )
+
+	for entry, nested in sorted( trees, key = lambda tree: -tree[0][2] ):
+		for name, depth, cumulative, self_time, at in [ entry ] + nested:
+			lines.append( "  {:>10}  {:>10}  {:>10}  {}{}".format(
+			 ms(cumulative), ms(self_time), ms(at), '  ' * depth, name
+			) )
+
+	lines += [
+	 "",
+	 "imports (most expensive self time first)",
+	 "  {:>10}  {:>10}  {}".format( 'cumulative', 'self', 'module' ),
+	]
+
+	ordered = sorted( imports.items(), key = lambda item: -item[1][1] )
+	for name, ( cumulative, self_time ) in ordered[:PROFILE_MAX_IMPORTS]:
+		lines.append( "  {:>10}  {:>10}  {}".format( ms(cumulative), ms(self_time), name ) )
+
+	if len(ordered) > PROFILE_MAX_IMPORTS:
+		lines.append( "  ... and " +str( len(ordered) - PROFILE_MAX_IMPORTS )+ " more" )
+
+	return "\n".join( lines ) + "\n"
+
+# phases are recorded when they end, so a phase's nested phases come before
+# it. This puts them in the order that they started, for the report
+def sort_tree( entries ):
+	return sorted( entries, key = lambda entry: entry[4] - entry[2] )
+
+def ms( seconds ):
+	return '{:.1f}ms'.format( seconds * 1000 )
+
+################################################################################
+#                                   OBJECTS                                    #
+################################################################################
+
+class Phase:
+
+	def __init__( self, name ):
+		self.name = name
+
+	def __enter__( self ):
+
+		if threading.get_ident() == main_thread_id:
+			self.depth = sum( 1 for frame in stack if frame[3] )
+			push( self.name, is_phase=True )
+		else:
+			self.depth = None
+
+		return self
+
+	def __exit__( self, exc_type, exc_value, traceback ):
+
+		if self.depth == None:
+			return
+
+		name, start, cumulative, self_time = pop()
+		phases.append( [ name, self.depth, cumulative, self_time, start - started_at + cumulative ] )
+
+class NullPhase:
+
+	def __enter__( self ):
+		return self
+
+	def __exit__( self, exc_type, exc_value, traceback ):
+		pass
+
+NULL_PHASE = NullPhase()
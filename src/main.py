@@ -17,6 +17,13 @@ For more info, see: https://buskill.in/
 
 """
 
+# --profile-startup has to hook `import` before we import anything else; see
+# buskill_profile.py
+import sys, buskill_profile
+if '--profile-startup' in sys.argv:
+	sys.argv.remove( '--profile-startup' )
+	buskill_profile.start()
+
 # this is needed for supporting Windows 10 with OpenGL < v2.0
 # Example: VirtualBox w/ OpenGL v1.1
 import platform, os
@@ -36,6 +43,8 @@ import argparse, logging, sys, multiprocessing, tempfile
 
 #BUSKILL_VERSION = '0.1'
 from buskill_version import BUSKILL_VERSION
+import buskill_logging
+import buskill_diagnostics
 
 ################################################################################
 #                                  MAIN BODY                                   #
@@ -51,62 +60,24 @@ if __name__ == '__main__':
 	# TODO: be able to override the path to the log file with an env var or argument value; make these just the defaults
 	log_file_path = os.path.join( tempfile.gettempdir(), 'buskill.log' )
 
-	logging.basicConfig(
-	 filename = log_file_path,
-	 filemode = 'a',
-	 format = '%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s',
-	 datefmt = '%H:%M:%S',
-	 level = logging.DEBUG
-	)
+	# the CLI's --quiet (and --stats, whose output may be parsed by another
+	# program) have to take effect before our first log message
+	for arg in sys.argv[1:]:
+		if arg in ['-q', '--quiet'] or arg.startswith( '--stats' ):
+			buskill_logging.set_echo( False )
+
+	# log records are written (and echoed to stdout) by a background thread so
+	# that logging never blocks the trigger; see buskill_logging.py
+	buskill_logging.setup_logging( log_file_path, level = logging.DEBUG )
 	msg = "==============================================================================="
-	print( msg ); logging.info( msg )
+	logging.info( msg )
 	msg = "INFO: Writing to log file '" +str(log_file_path)+ "'"
-	print( msg ); logging.info( msg )
-
-	logging.debug( 'BUSKILL_VERSION|' +str(BUSKILL_VERSION)+ '|' )
-	logging.debug( 'os.environ|' +str(os.environ)+ '|' )
-	logging.debug( 'sys.argv|' +str(sys.argv)+ '|' )
-	logging.debug( 'sys.builtin_modules_names|' +str(sys.builtin_module_names)+ '|' )
-	logging.debug( 'sys.executable|' +str(sys.executable)+ '|' )
-	logging.debug( 'sys.path|' +str(sys.path)+ '|' )
-	logging.debug( 'sys.prefix|' +str(sys.prefix)+ '|' )
-	logging.debug( 'sys.version|' +str(sys.version)+ '|' )
-	logging.debug( 'sys.api_version|' +str(sys.api_version)+ '|' )
-	logging.debug( 'sys.version_info|' +str(sys.version_info)+ '|' )
-	logging.debug( '__name__|' +str(__name__)+ '|' )
-
-	# platform info
-	logging.debug( 'sys.platform|' +str(sys.platform)+ '|' )
-	logging.debug( 'platform.platform()|' +str(platform.platform())+ '|' )
-	logging.debug( 'platform.system()|' +str(platform.system())+ '|' )
-	logging.debug( 'platform.release()|' +str(platform.release())+ '|' )
-	logging.debug( 'platform.version()|' +str(platform.version())+ '|' )
-	logging.debug( 'platform.machine()|' +str(platform.machine())+ '|' )
-
-	# what platform are they running?
-	CURRENT_PLATFORM = platform.system().upper()
-	if CURRENT_PLATFORM.startswith( 'LINUX' ):
-		# they're running linux; what distro and version of linux?
-		try:
-			with open( "/etc/os-release" ) as f:
-				logging.debug( str(f.read()) )
-		except Exception:
-			pass
-
-	if CURRENT_PLATFORM.startswith( 'WIN' ):
-		# they're running windows; what version of windows?
-		try:
-			logging.debug( 'sys.getwindowsversion()|' +str(sys.getwindowsversion())+ '|' )
-		except Exception:
-			pass
-	
-	if CURRENT_PLATFORM.startswith( 'DARWIN' ):
-		# they're running mac; what version of macos?
-		try:
-			logging.debug( 'platform.uname()|' +str(platform.uname())+ '|' )
-			logging.debug( 'platform.mac_ver()|' +str(platform.mac_ver())+ '|' )
-		except Exception:
-			pass
+	logging.info( msg )
+
+	# the environment, python's paths, the platform, etc are only collected
+	# and written to the log file when they're needed (eg for a bug report);
+	# see buskill_diagnostics.py
+	buskill_diagnostics.remember_startup_state()
 
 	###########
 	# PREREQS #
@@ -121,7 +92,7 @@ if __name__ == '__main__':
 		multiprocessing.set_start_method('spawn')
 
 	msg = "buskill version " +str(BUSKILL_VERSION)
-	print( msg ); logging.info( msg )
+	logging.info( msg )
 
 	#############
 	# LAUNCH UI #
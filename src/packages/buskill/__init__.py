@@ -18,12 +18,19 @@ For more info, see: https://buskill.in/
 #                                   IMPORTS                                    #
 ################################################################################
 
-import platform, multiprocessing, traceback, subprocess
-import urllib.request, re, json, certifi, sys, os, math, shutil, tempfile, random, gnupg
+import platform, multiprocessing, threading, traceback, subprocess, time, queue
+import re, sys, os, shutil, tempfile
 import os.path
 from buskill_version import BUSKILL_VERSION
-from distutils.version import LooseVersion
-from hashlib import sha256
+import buskill_logging
+import buskill_platform
+import buskill_profile
+import buskill_metrics
+import buskill_control
+from . import tracing, capability_cache
+
+# note that the upgrade code (and the network & crypto modules that it needs)
+# is in upgrade.py, which is only imported by BusKill.upgrade()
 
 import logging
 logger = logging.getLogger( __name__ )
@@ -32,8 +39,9 @@ logger = logging.getLogger( __name__ )
 CURRENT_PLATFORM = platform.system().upper()
 if CURRENT_PLATFORM.startswith( 'LINUX' ):
 	import usb1
+	from . import uevent_lin, dbus_lin
 	msg = "usb1.__version__:|" +str(usb1.__version__)+ "|"
-	print( msg ); logger.debug( msg )
+	logger.debug( msg )
 
 if CURRENT_PLATFORM.startswith( 'WIN' ):
 	import win32api, win32con, win32gui
@@ -43,7 +51,7 @@ if CURRENT_PLATFORM.startswith( 'DARWIN' ):
 	import usb1, ctypes, ctypes.util
 	from ctypes import byref
 	msg = "usb1.__version__:|" +str(usb1.__version__)+ "|"
-	print( msg ); logger.debug( msg )
+	logger.debug( msg )
 
 ################################################################################
 #                                  SETTINGS                                    #
@@ -54,16 +62,31 @@ if CURRENT_PLATFORM.startswith( 'DARWIN' ):
 global APP_DIR
 APP_DIR = sys.path[0]
 
-UPGRADE_MIRRORS = [
- 'https://raw.githubusercontent.com/BusKill/buskill-app/master/updates/v1/meta.json',
- 'https://gitlab.com/buskill/buskill-app/-/raw/master/updates/v1/meta.json',
- 'https://repo.buskill.in/buskill-app/v1/meta.json',
- 'https://repo.michaelaltfield.net/buskill-app/v1/meta.json',
-]
-random.shuffle(UPGRADE_MIRRORS)
+# how long (in seconds) toggle() will wait for an in-process listener thread
+# to register its callbacks before giving up on arming
+ARM_THREAD_READY_TIMEOUT = 10
+
+# how often (in seconds) an in-process listener thread wakes up to check if
+# it should exit when the libusb in use can't interrupt handleEvents()
+ARM_THREAD_POLL_INTERVAL = 1
+
+# how long (in seconds) setupDataDir() waits for the candidate data dirs to
+# answer. Each is probed in its own thread, so a dead mount (eg a stalled
+# network share or a failing usb drive) can't block startup for longer
+DATA_DIR_PROBE_TIMEOUT = 2
+
+# the data dir that we chose is remembered (per APP_DIR) in this file in the
+# temp dir, so we don't have to probe every candidate on every launch
+DATA_DIR_CACHE_FILE_NAME = 'buskill-data-dir.json'
 
-RELEASE_KEY_FINGERPRINT = 'E0AFFF57DC00FBE0563587614AE21E1936CE786A'
-RELEASE_KEY_SUB_FINGERPRINT = '798DC1101F3DEC428ADE124D68B8BCB0C5023905'
+# wipeCache() renames the cache dir to a "tombstone" (a dir in the DATA_DIR
+# whose name starts with this) and deletes it in the background
+CACHE_TOMBSTONE_PREFIX = 'cache.deleted-'
+
+# the trigger helper is a tiny shell that's spawned when we arm, blocks on
+# reading a line from its stdin, and then exec()s the trigger's command. It
+# exits without doing anything if its stdin is closed (eg we die or disarm)
+TRIGGER_HELPER_SCRIPT = 'read -r _ || exit 1; exec "$@"'
 
 #####################
 # WINDOWS CONSTANTS #
@@ -168,41 +191,49 @@ if CURRENT_PLATFORM.startswith( 'WIN' ):
 		#  lParam - what's changed?
 		#    if it's a volume then...
 		#  lParam - what's changed more exactly
+		@tracing.traced
 		def hotplugCallbackWin(self, hwnd, message, wparam, lparam):
 	
+			detected_at = time.monotonic()
+			self.bk.metrics.inc( 'events_seen' )
+
 			dev_broadcast_hdr = DEV_BROADCAST_HDR.from_address(lparam)
 	
 			if wparam == DBT_DEVICEREMOVECOMPLETE:
 	
-				self.bk.triggerWin()
+				self.bk.fire_trigger( detected_at )
 	
 				msg = "hwnd:|" +str(hwnd)+ "|"
-				print( msg ); logger.debug( msg )
+				logger.debug( msg )
 
 				msg = "message:|" +str(message)+ "|"
-				print( msg ); logger.debug( msg )
+				logger.debug( msg )
 
 				msg= "wparam:|" +str(wparam)+ "|"
-				print( msg ); logger.debug( msg )
+				logger.debug( msg )
 
 				msg = "lparam:|" +str(lparam)+ "|"
-				print( msg ); logger.debug( msg )
+				logger.debug( msg )
 	
 				dev_broadcast_volume = DEV_BROADCAST_VOLUME.from_address(lparam)
 				msg = "dev_broadcast_volume:|" +str(dev_broadcast_volume)+ "|"
-				print( msg ); logger.debug( msg )
+				logger.debug( msg )
 
 				drive_letter = drive_from_mask(dev_broadcast_volume.dbcv_unitmask)
 				msg = "drive_letter:|" +str(drive_letter)+ "|"
-				print( msg ); logger.debug( msg )
+				logger.debug( msg )
 
 				msg = "ch( ord('A') + drive_letter):|" +str( chr(ord('A') + drive_letter) )+ '|'
-				print( msg ); logger.debug( msg )
+				logger.debug( msg )
+
+			else:
+				self.bk.metrics.inc( 'events_filtered' )
 	
 			return 1
 
 class BusKill:
 
+	@buskill_profile.profiled
 	def __init__(self):
 
 		###############################
@@ -219,7 +250,7 @@ class BusKill:
 		self.TRIGGER_FUNCTION = None
 
 		self.EXECUTED_AS_SCRIPT = None
-		self.LOG_FILE_PATH = logger.root.handlers[0].baseFilename
+		self.LOG_FILE_PATH = buskill_logging.get_log_file_path()
 		self.EXE_PATH = None
 		self.EXE_DIR = None
 		self.EXE_FILE = None
@@ -237,15 +268,122 @@ class BusKill:
 
 		self.is_armed = None
 		self.usb_handler = None
+
+		# the 'thread' arming engine runs the listener inside this process, and
+		# these are used to tell it to exit (and to wake it up so it can do so)
+		self.ARM_ENGINE = None
+		self.SUPPORTED_ARM_ENGINES = ['process']
+		self.usb_handler_ready = None
+		self.usb_handler_stop = None
+		self.usb_handler_lock = None
+		self.usb_handler_interrupt = None
+		self.usb_handler_error = None
+
+		# the 'standby' arming engine keeps a listener process running with its
+		# libusb context already open, and arming is just a command on this pipe
+		self.standby_process = None
+		self.standby_conn = None
+		self.standby_armed = False
+		self.standby_opaque = None
+
+		# an optional filter so that we only listen for events from one device
+		# (eg the BusKill cable), which is a dict with any of the keys
+		# 'vendor_id', 'product_id', 'bus', and 'port_numbers'
+		self.device_selector = None
+
+		# how we detect usb removal events:
+		#  * 'libusb' = libusb's hotplug API (linux & macos)
+		#  * 'uevent' = the kernel's uevents from a netlink socket (linux only)
+		#  * 'win32'  = WM_DEVICECHANGE window messages (windows only)
+		self.DETECTOR = None
+		self.SUPPORTED_DETECTORS = []
+
 		self.upgrade_status_msg = None
 		self.upgrade_result = None
 
-		self.SUPPORTED_TRIGGERS = ['lock-screen', 'soft-shutdown']
+		# the thread that's deleting the old cache dirs (see wipeCache())
+		self.cache_reaper = None
+
+		# the phase of upgrade() that's being timed and when it started
+		self.upgrade_phase_name = None
+		self.upgrade_phase_started = None
+
+		# how upgrade() polls the mirrors for the latest version's metadata:
+		#  * 'race'   = all at once; the first with a valid signature within
+		#               'upgrade_metadata_deadline' seconds wins (default)
+		#  * 'serial' = one-at-a-time, falling back when one fails
+		self.SUPPORTED_UPGRADE_STRATEGIES = list( buskill_platform.SUPPORTED_UPGRADE_STRATEGIES )
+		self.UPGRADE_STRATEGY = 'race'
+		self.upgrade_metadata_deadline = 30
+
+		self.SUPPORTED_TRIGGERS = list( buskill_platform.SUPPORTED_TRIGGERS )
 		self.trigger = 'lock-screen'
+
+		# the trigger latch makes sure that the trigger is only executed once
+		# when many removal events arrive at once (eg when a whole hub or dock
+		# is removed). What re-opens the latch after it fires is one of:
+		#  * 'disarm'        = only disarming & re-arming BusKill (default)
+		#  * 'after-trigger' = the trigger finishing, plus 'trigger_coalesce_window'
+		#                      seconds without another removal event
+		#  * 'cooldown'      = 'trigger_rearm_cooldown' seconds passing
+		#
+		# the window is needed because libusb delivers the events that queued-up
+		# while the trigger was running one-after-another as soon as it returns
+		self.SUPPORTED_REARM_POLICIES = list( buskill_platform.SUPPORTED_REARM_POLICIES )
+		self.TRIGGER_REARM_POLICY = 'disarm'
+		self.trigger_rearm_cooldown = 5
+		self.trigger_coalesce_window = 1
+		self.trigger_latch_lock = threading.Lock()
+		self.trigger_latched = False
+		self.trigger_fired_at = None
+		self.trigger_finished_at = None
+		self.trigger_events_coalesced = 0
+
+		# how the Linux triggers try their mechanisms (eg `xdg-screensaver lock`
+		# and `xscreensaver -lock`). This is one of:
+		#  * 'serial' = one-at-a-time, falling back when one fails (default)
+		#  * 'race'   = all at once; the first to succeed within
+		#               'trigger_race_deadline' seconds wins
+		self.SUPPORTED_TRIGGER_STRATEGIES = list( buskill_platform.SUPPORTED_TRIGGER_STRATEGIES )
+		self.TRIGGER_STRATEGY = 'serial'
+		self.trigger_race_deadline = 5
+		self.trigger_race_results = None
+
+		# the pre-spawned trigger helper process (see spawn_trigger_helper())
+		# and the command that it will exec() when we write to it
+		self.trigger_helper = None
+		self.trigger_helper_argv = None
+
+		# the D-Bus method that locks the screen or powers off the machine,
+		# looked-up when we arm (see prepare_dbus_trigger())
+		self.trigger_dbus_method = None
+
+		# counters & histograms about how we behave in the field (see buskill_metrics.py)
+		# and the control socket that serves them to `buskill --stats` (and lets
+		# other instances arm, disarm, etc. this one)
+		self.metrics = buskill_metrics.Metrics()
+		self.control_server = None
+
+		# True if we were started with `buskill --daemon` (rather than, eg, by
+		# the GUI or `buskill --arm`); it's reported in our status
+		self.is_daemon = False
+
+		# arm() and disarm() hold this lock, since they may be called from both
+		# the GUI's thread and the control socket's thread
+		self.toggle_lock = threading.RLock()
+
+		# a function that's called (in the control socket's thread) after
+		# another instance changed our state, so eg the GUI can update its button
+		self.control_listener = None
+
 		self.trigger_softshutdown_lin_shutdown_path = None
 		self.trigger_softshutdown_lin_poweroff_path = None
 		self.trigger_softshutdown_lin_systemctl_path = None
 
+		# what we learned about this machine on previous launches, like where
+		# the binaries above are (see capability_cache.py)
+		self.capability_cache = capability_cache.CapabilityCache()
+
 		# documentation links
 		if BUSKILL_VERSION['VERSION'] == '':
 			ver = 'stable'
@@ -258,121 +396,42 @@ class BusKill:
 		self.url_documentation_gui = 'https://docs.buskill.in/buskill-app/en/' +str(ver)+ '/software_usr/gui.html'
 
 		self.CURRENT_PLATFORM = platform.system().upper()
-		self.ERR_PLATFORM_NOT_SUPPORTED = 'ERROR: Your platform (' +str(platform.system())+ ') is not supported. If you believe this is an error, please file a bug report:\n\nhttps://github.com/BusKill/buskill-app/issues'
-
-		# NOTE about instance fields used for storing path info relative to the
-		#      buskill executable:
-		#
-		# 1. EXE_PATH = the absolute path to the executable for running BusKill,
-		#               which is:
-		#                 [a] the 'buskill-<version>.AppImage' file in Linux
-		#                 [b] the 'buskill.exe' file in Windows
-		#                 [c] the 'buskill' binary file in MacOS
-		# 2. EXE_FILE = just the filename (basename) of the EXE_PATH
-		# 3. EXE_DIR = the directory (dirname) where EXE_FILE lives
-		# 4. APP_DIR = the root directory for a given version of the buskill app,
-		#              which is 'buskill-<lin|win|mac>-<version>-x86_64' and:
-		#                 [a] the dir containing the EXE_FILE file in Linux
-		#                 [b] 1 dir above the dir containing the EXE_FILE in
-		#                     Windows
-		#                 [c] 2 dirs above the dir containing the EXE_FILE in
-		#                     MacOS
-		# 4. APPS_DIR = the directory where the app dirs live (one dir above
-		#               APP_DIR)
-		# 5. SRC_DIR =  the absolute path to the directory where the 'src' directory
-		#               lives. This is where files like 'KEYS' and directories like
-		#               'packages' are stored. On some platforms like Linux, this is
-		#               distinct from the APP_DIR because the contents of the AppImage
-		#               is extracted to a temp dir at runtime
-
-		# get the absolute path to the file that the user executes to start buskill
-		self.EXE_PATH = sys.executable
-
-		# if the executable is actually just the python interpreter, then what
-		# we want is the first argument
-		if re.match( ".*python([1-9]\.?)*$", self.EXE_PATH ):
-			self.EXE_PATH = os.path.abspath( sys.argv[0] )
-
-		# split the EXE_PATH into dir & file parts
-		self.EXE_DIR = os.path.split(self.EXE_PATH)[0]
-		self.EXE_FILE = os.path.split(self.EXE_PATH)[1]
+		self.ERR_PLATFORM_NOT_SUPPORTED = buskill_platform.ERR_PLATFORM_NOT_SUPPORTED
+
+		# what BusKill supports on this platform (see buskill_platform.py)
+		capabilities = buskill_platform.get_capabilities()
+		self.IS_PLATFORM_SUPPORTED = capabilities['is_platform_supported']
+		self.OS_NAME_SHORT = capabilities['os_name_short']
+		self.SUPPORTED_ARM_ENGINES = capabilities['supported_arm_engines']
+		self.ARM_ENGINE = capabilities['arm_engine']
+		self.SUPPORTED_DETECTORS = capabilities['supported_detectors']
+		self.DETECTOR = capabilities['detector']
+
+		# the paths relative to the buskill executable (see get_app_paths() in
+		# buskill_platform.py for what each of them is)
+		paths = buskill_platform.get_app_paths()
+		self.EXECUTED_AS_SCRIPT = paths['EXECUTED_AS_SCRIPT']
+		self.EXE_PATH = paths['EXE_PATH']
+		self.EXE_DIR = paths['EXE_DIR']
+		self.EXE_FILE = paths['EXE_FILE']
+		self.APP_DIR = paths['APP_DIR']
+		self.APPS_DIR = paths['APPS_DIR']
+		self.SRC_DIR = paths['SRC_DIR']
 
 		# platform-specific setup
 		if CURRENT_PLATFORM.startswith( 'LINUX' ):
-			self.IS_PLATFORM_SUPPORTED = True
-			self.OS_NAME_SHORT = 'lin'
 			self.ARM_FUNCTION = self.armNix
 			self.TRIGGER_FUNCTION = self.triggerLin
 
-			# on Linux, the buskill AppImage is directly inside the APP_DIR
-			self.APP_DIR = self.EXE_DIR
-
-			# on Linux, the AppImage is extracted to a root-owned temporary directory
-			# at runtime
-			self.SRC_DIR = sys.path[0]
-
 		if CURRENT_PLATFORM.startswith( 'WIN' ):
-			self.IS_PLATFORM_SUPPORTED = True
-			self.OS_NAME_SHORT = 'win'
 			self.ARM_FUNCTION = self.armWin
 			self.TRIGGER_FUNCTION = self.triggerWin
 
-			# on Windows, the buskill binary is 1 dir below the APP_DIR
-			self.APP_DIR = self.EXE_PATH.split( os.sep )[0:-2]
-			self.APP_DIR = os.sep.join( self.APP_DIR )
-
-			# on Windows, the exe lives in the same dir with all our other src files
-			self.SRC_DIR = self.EXE_DIR
-
 		if CURRENT_PLATFORM.startswith( 'DARWIN' ):
-			self.IS_PLATFORM_SUPPORTED = True
-			self.OS_NAME_SHORT = 'mac'
-
 			self.KERNEL_VERSION = str(platform.release()).split('.')[0]
 			self.ARM_FUNCTION = self.armNix
 			self.TRIGGER_FUNCTION = self.triggerMac
 
-			# on MacOS, the binary is 2 dirs below the .app dir
-			self.APP_DIR = self.EXE_PATH.split( os.sep )[0:-3]
-			self.APP_DIR = os.sep.join( self.APP_DIR )
-
-			# on MacOS, the exe lives in the same dir with all our other src files
-			self.SRC_DIR = self.EXE_DIR
-
-		# normally the BusKill app is built into a platform-specific executable with
-		# PyInstaller. But if we're executing it directly as a script, then some of
-		# the logic will change throught the app
-		#if self.EXE_FILE == 'main.py' and os.path.split(self.APP_DIR)[1] == 'src':
-		if self.EXE_FILE == 'main.py':
-			self.EXECUTED_AS_SCRIPT = True
-
-			self.APP_DIR = os.path.abspath(
-			 os.path.join( self.APP_DIR, os.pardir)
-			)
-		else:
-			self.EXECUTED_AS_SCRIPT = False
-
-		# We package our .zip inside a single root dir to prevent zip-bombing.
-		# When extracted on most platforms, this root dir is dropped into the
-		# the cwd. But when using the Windows file Explorer GUI to extract
-		# our .zip release, it actually creates an additional root dir with
-		# the same name as our .zip file (minus the .zip extension). This
-		# inconsistency means that we may have to go one dir up again
-		if re.match(
-		 "^buskill-" +str(self.OS_NAME_SHORT)+ "-.*",
-		 self.APP_DIR.split(os.sep)[-2]
-		):
-			# the dir that we expected to be our APP_DIR is actually inside of
-			# another dir that has the name "buskil-...", so let's make
-			# *that* dir our APP_DIR
-
-			self.APP_DIR = os.path.abspath(
-			 os.path.join( self.APP_DIR, os.pardir)
-			)
-
-		# the APPS_DIR is one dir above the APP_DIR
-		self.APPS_DIR = os.path.abspath( os.path.join(self.APP_DIR, os.pardir) )
-
 		# update PATH to include the dir where main.py lives (the second one is
 		# MacOS .app compatibility weirdness) so that we can find `gpg` there
 		os.environ['PATH'] += \
@@ -388,25 +447,151 @@ class BusKill:
 		# for upgraded_from.py)
 		sys.path.append( self.EXE_DIR )
 
-		msg = "DEBUG: EXECUTED_AS_SCRIPT:|" +str(self.EXECUTED_AS_SCRIPT)+  "|\n"
-		msg+= "DEBUG: EXE_PATH:|" +str(self.EXE_PATH)+  "|\n"
-		msg+= "DEBUG: EXE_DIR:|" +str(self.EXE_DIR)+  "|\n"
-		msg+= "DEBUG: EXE_FILE:|" +str(self.EXE_FILE)+  "|\n"
-		msg+= "DEBUG: APP_DIR:|" +str(self.APP_DIR)+  "|\n"
-		msg+= "DEBUG: APPS_DIR:|" +str(self.APPS_DIR)+  "|\n"
-		msg+= "DEBUG: SRC_DIR:|" +str(self.SRC_DIR)+  "|\n"
-		msg+= "DEBUG: os.environ['PATH']:|" +str(os.environ['PATH'])+  "|\n"
-		print( msg ); logger.debug( msg )
-
 		# create a data dir in some safe place where we have write access
 		# TODO: move this to main.py so the log file gets put in the CACHE_DIR
 		# (that--or maybe just move the buskill.init() into main.py)
 		self.setupDataDir()
+		self.load_capability_cache()
 
 		# handle conditions where this version was already upgraded by a newer
 		# version or if this is a version that upgraded an older version
 		self.handle_upgrades()
 
+	# returns the paths that we found (as a list of (key, value) tuples) for
+	# the diagnostics that are written to the log file when they're needed
+	def get_path_diagnostics(self):
+
+		return [
+		 ( 'EXECUTED_AS_SCRIPT', self.EXECUTED_AS_SCRIPT ),
+		 ( 'EXE_PATH', self.EXE_PATH ),
+		 ( 'EXE_DIR', self.EXE_DIR ),
+		 ( 'EXE_FILE', self.EXE_FILE ),
+		 ( 'APP_DIR', self.APP_DIR ),
+		 ( 'APPS_DIR', self.APPS_DIR ),
+		 ( 'SRC_DIR', self.SRC_DIR ),
+		 ( 'DATA_DIR', self.DATA_DIR ),
+		 ( 'CACHE_DIR', self.CACHE_DIR ),
+		 ( "os.environ['PATH']", os.environ.get( 'PATH' ) ),
+		]
+
+	# starts answering `buskill --stats`, `buskill --disarm`, etc. on our
+	# control socket (see buskill_control.py). The app works without it, so failing
+	# isn't fatal. Returns True if we're listening
+	#
+	# extra_commands = dict of more commands to serve (see ControlServer)
+	def start_control_server(self, extra_commands=None):
+
+		if self.control_server != None:
+			return True
+
+		path = buskill_control.get_control_socket_path( self.DATA_DIR )
+		if not buskill_control.is_supported() or path == None:
+			msg = "DEBUG: No control socket on this platform; `buskill --stats` won't work"
+			logger.debug( msg )
+			return False
+
+		commands = {
+		 'stats': self.get_stats_reply,
+		 'status': self.get_status_reply,
+		 'arm': self.control_arm,
+		 'disarm': self.control_disarm,
+		 'trigger': self.control_set_trigger,
+		}
+		if extra_commands != None:
+			commands.update( extra_commands )
+
+		server = buskill_control.ControlServer( path, commands )
+
+		try:
+			server.start()
+		except (RuntimeWarning, OSError) as e:
+			msg = "WARNING: Unable to start the control socket (" +str(e)+ ")"
+			logger.warning( msg )
+			return False
+
+		self.control_server = server
+		return True
+
+	def stop_control_server(self):
+
+		if self.control_server == None:
+			return
+
+		self.control_server.stop()
+		self.control_server = None
+
+	# the control socket's reply to 'stats'
+	def get_stats_reply(self):
+
+		import json
+		return json.dumps( self.metrics.snapshot() )
+
+	# returns a dict describing our armed state, which is what other instances
+	# get from the control socket's 'status'
+	def get_status(self):
+
+		return {
+		 'armed': bool( self.is_armed ),
+		 'trigger': self.trigger,
+		 'arm_engine': self.ARM_ENGINE,
+		 'detector': self.DETECTOR,
+		 'daemon': bool( self.is_daemon ),
+		 'pid': os.getpid(),
+		}
+
+	def get_status_reply(self):
+
+		import json
+		return json.dumps( self.get_status() )
+
+	# the control socket's 'arm', 'disarm', and 'trigger <trigger>'. Each
+	# replies with our (new) status
+	def control_arm(self):
+
+		self.arm()
+		self.notify_control_listener()
+		return self.get_status_reply()
+
+	def control_disarm(self):
+
+		self.disarm()
+		self.notify_control_listener()
+		return self.get_status_reply()
+
+	# changes the trigger. If we're armed, then we disarm & re-arm around the
+	# change, so the trigger's helper process and D-Bus method are prepared
+	# for the new trigger
+	def control_set_trigger(self, trigger):
+
+		with self.toggle_lock:
+			was_armed = self.is_armed
+			if was_armed:
+				self.toggle()
+
+			try:
+				self.set_trigger( trigger )
+			except RuntimeWarning:
+				raise
+			except Exception as e:
+				raise RuntimeWarning( str(e) )
+			finally:
+				if was_armed:
+					self.toggle()
+
+		self.notify_control_listener()
+		return self.get_status_reply()
+
+	def notify_control_listener(self):
+
+		if self.control_listener == None:
+			return
+
+		try:
+			self.control_listener()
+		except Exception as e:
+			msg = "WARNING: The control socket's listener failed (" +str(e)+ ")"
+			logger.warning( msg )
+
 	# this function is necessary to be able to execute non-static methods on
 	# the `self` instance of this object in a child process. Without this, we'll
 	# get "TypeError: can't pickle weakref objects" errors in python >= 3.7.0
@@ -419,27 +604,56 @@ class BusKill:
 		state = self.__dict__.copy()
 
 		msg = "DEBUG:__getstate__() pre:" +str( state.keys() )+ "|"
-		print( msg ); logger.debug( msg )
+		logger.debug( msg )
 
 		# remove instances of multiprocessing.Process() because they're not
 		# pickleable
 		unpickleable = [
-		 'upgrade_process', 'usb_handler', 'root_child'
+		 'upgrade_process', 'usb_handler', 'root_child',
+		 'usb_handler_ready', 'usb_handler_stop', 'usb_handler_lock',
+		 'usb_handler_interrupt', 'standby_process', 'standby_conn',
+		 'trigger_latch_lock', 'trigger_helper', 'trigger_dbus_method',
+		 'control_server', 'cache_reaper', 'toggle_lock', 'control_listener'
 		]
 		for instance_field in unpickleable:
 			if instance_field in state:
 				del state[instance_field]
 
 		msg = "DEBUG:__getstate__() post:|" +str( state.keys() )+ "|"
-		print( msg ); logger.debug( msg )
+		logger.debug( msg )
 
 		return state
 
+	# locks can't be pickled, so we give the child process its own
+	def __setstate__(self, state):
+
+		self.__dict__.update( state )
+		self.trigger_latch_lock = threading.Lock()
+		self.toggle_lock = threading.RLock()
+
 	# this is called when the GUI is closed 
 	# TODO: use 'fuckit' python module https://stackoverflow.com/questions/63436916/how-to-ignore-exceptions-and-proceed-with-whole-blocks-multiple-lines-in-pytho/
 	def close(self):
 
 		# do what we can as fast as we can; don't get stuck by errors
+		try:
+			self.stop_control_server()
+		except:
+			pass
+		try:
+			# if we're armed with the 'thread' engine, just tell it to stop
+			if self.is_armed and isinstance( self.usb_handler, threading.Thread ):
+				self.disarm_thread()
+		except:
+			pass
+		try:
+			# ask the warm-standby listener to exit; it gets killed below anyway
+			if self.standby_process != None:
+				self.standby_conn.send( ('exit', None) )
+				self.standby_process.kill()
+				self.standby_process.join()
+		except:
+			pass
 		try:
 
 			# if we don't kill this child process on exit, the UI will freeze
@@ -448,7 +662,7 @@ class BusKill:
 			except ProcessLookupError as e:
 				msg = "DEBUG: Ignoring ProcessLookupError " +str(e)
 				msg += "\n\t" +str(e)+ "\n"
-				print( msg ); logger.debug( msg )
+				logger.debug( msg )
 
 			self.usb_handler.join()
 		except:
@@ -461,7 +675,7 @@ class BusKill:
 			except ProcessLookupError as e:
 				msg = "DEBUG: Ignoring ProcessLookupError " +str(e)
 				msg += "\n\t" +str(e)+ "\n"
-				print( msg ); logger.debug( msg )
+				logger.debug( msg )
 
 			self.upgrade_process.join()
 		except:
@@ -484,11 +698,11 @@ class BusKill:
 	def set_trigger(self, trigger):
 
 		msg = "DEBUG: Attempting to set 'trigger' set to '" +str(trigger)+ "'"
-		print( msg ); logger.debug( msg )
+		logger.debug( msg )
 
 		if trigger not in self.SUPPORTED_TRIGGERS:
 			msg = "WARNING: Attempting to set trigger to invalid value (" +str(trigger)+ ")"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 			raise Exception( msg )
 
 		self.trigger = trigger
@@ -498,30 +712,12 @@ class BusKill:
 
 			if self.OS_NAME_SHORT == 'lin':
 
-				# list of paths where binaries like 'shutdown' could be
-				bin_paths = [
-				 os.sep+'sbin',
-				 os.sep+'usr'+os.sep+'sbin',
-				 os.sep+'bin',
-				 os.sep+'usr'+os.sep+'bin'
-				]
-
-				for path in bin_paths:
-
-					# shutdown
-					shutdown_path = path + os.sep + 'shutdown'
-					if os.path.exists( shutdown_path ):
-						self.trigger_softshutdown_lin_shutdown_path = shutdown_path
-
-					# poweroff
-					poweroff_path = path + os.sep + 'poweroff'
-					if os.path.exists( poweroff_path ):
-						self.trigger_softshutdown_lin_poweroff_path = poweroff_path
-
-					# systemctl
-					systemctl_path = path + os.sep + 'systemctl'
-					if os.path.exists( systemctl_path ):
-						self.trigger_softshutdown_lin_systemctl_path = systemctl_path
+				# where are the binaries like 'shutdown'? This is usually already
+				# known from our last launch
+				binaries = self.capability_cache.get_shutdown_binaries()
+				self.trigger_softshutdown_lin_shutdown_path = binaries['shutdown']
+				self.trigger_softshutdown_lin_poweroff_path = binaries['poweroff']
+				self.trigger_softshutdown_lin_systemctl_path = binaries['systemctl']
 
 				# were we able to find at least one of their paths?
 				if self.trigger_softshutdown_lin_shutdown_path == None and \
@@ -529,24 +725,25 @@ class BusKill:
 				 self.trigger_softshutdown_lin_systemctl_path == None:
 					# we couldn't figure any of the paths; don't continue with this trigger
 					msg = "ERROR: Unable to find paths to soft shutdown binaries"
-					print( msg ); logger.error( msg )
+					logger.error( msg )
 					raise Exception( msg )
 
-				# TODO: check to see if the user has permission to shutdown the system. If not, throw an exception and tell them to re-run BusKill as root.
+				# whether the user has permission to shutdown the system is checked
+				# with logind's CanPowerOff when they arm (see check_trigger())
 				#  * https://unix.stackexchange.com/questions/719465/cross-platform-way-to-determine-if-the-current-user-has-privlige-to-shutdown-the
 				#  * https://stackoverflow.com/questions/73923097/best-practice-way-to-run-a-python-program-that-needs-root-privliges-for-subset-o
 
 				msg = "DEBUG: shutdown binary path:|" \
 				 +str(self.trigger_softshutdown_lin_shutdown_path)+ "|"
-				print( msg ); logger.error( msg )
+				logger.error( msg )
 
 				msg = "DEBUG: poweroff binary path:|" \
 				 +str(self.trigger_softshutdown_lin_poweroff_path)+ "|"
-				print( msg ); logger.error( msg )
+				logger.error( msg )
 
 				msg = "DEBUG: systemctl binary path:|" \
 				 +str(self.trigger_softshutdown_lin_systemctl_path)+ "|"
-				print( msg ); logger.error( msg )
+				logger.error( msg )
 
 			#elif self.OS_NAME_SHORT == 'win':
 				# n/a currently there's no checks needed for the soft-shutdown on windows
@@ -558,16 +755,218 @@ class BusKill:
 
 		self.trigger = trigger
 		msg = "INFO: BusKill 'trigger' set to '" +str(self.trigger)+ "'"
-		print( msg ); logger.info( msg )
+		logger.info( msg )
 
 	def get_trigger(self):
 
 		return str(self.trigger)
 
+	# function to choose how the listener is run when we arm:
+	#  * 'thread'  = in a thread inside this process (fast to arm & disarm)
+	#  * 'standby' = in a child process that's spawned once (now) and then
+	#                armed & disarmed with commands over a pipe
+	#  * 'process' = in a child process that's killed on disarm
+	def set_arm_engine(self, engine):
+
+		msg = "DEBUG: Attempting to set 'arm_engine' to '" +str(engine)+ "'"
+		logger.debug( msg )
+
+		if engine not in self.SUPPORTED_ARM_ENGINES:
+			msg = "WARNING: Attempting to set arm engine to invalid value (" +str(engine)+ ")"
+			logger.debug( msg )
+			raise RuntimeWarning( msg )
+
+		# don't switch engines out from under a running listener
+		if self.is_armed:
+			msg = "WARNING: Cannot change the arm engine while BusKill is armed"
+			logger.warning( msg )
+			raise RuntimeWarning( msg )
+
+		if engine == 'standby':
+			self.start_standby()
+
+		self.ARM_ENGINE = engine
+		msg = "INFO: BusKill 'arm_engine' set to '" +str(self.ARM_ENGINE)+ "'"
+		logger.info( msg )
+
+	def get_arm_engine(self):
+
+		return str(self.ARM_ENGINE)
+
+	# function to choose how we detect usb removal events (and to check sanity)
+	def set_detector(self, detector):
+
+		msg = "DEBUG: Attempting to set 'detector' to '" +str(detector)+ "'"
+		logger.debug( msg )
+
+		if detector not in self.SUPPORTED_DETECTORS:
+			msg = "WARNING: Attempting to set detector to invalid value (" +str(detector)+ ")"
+			logger.debug( msg )
+			raise RuntimeWarning( msg )
+
+		# don't switch detectors out from under a running listener
+		if self.is_armed:
+			msg = "WARNING: Cannot change the detector while BusKill is armed"
+			logger.warning( msg )
+			raise RuntimeWarning( msg )
+
+		if detector == 'uevent':
+			self.ARM_FUNCTION = self.armLinUevent
+		elif detector == 'libusb':
+			self.ARM_FUNCTION = self.armNix
+
+		self.DETECTOR = detector
+		msg = "INFO: BusKill 'detector' set to '" +str(self.DETECTOR)+ "'"
+		logger.info( msg )
+
+	def get_detector(self):
+
+		return str(self.DETECTOR)
+
+	# function to choose what re-opens the trigger latch after it fires (and to
+	# check sanity)
+	def set_rearm_policy(self, policy, cooldown=None):
+
+		msg = "DEBUG: Attempting to set 'rearm_policy' to '" +str(policy)+ "'"
+		logger.debug( msg )
+
+		if policy not in self.SUPPORTED_REARM_POLICIES:
+			msg = "WARNING: Attempting to set re-arm policy to invalid value (" +str(policy)+ ")"
+			logger.debug( msg )
+			raise RuntimeWarning( msg )
+
+		if cooldown != None:
+			if cooldown < 0:
+				msg = "WARNING: Attempting to set re-arm cooldown to invalid value (" +str(cooldown)+ ")"
+				logger.debug( msg )
+				raise RuntimeWarning( msg )
+			self.trigger_rearm_cooldown = cooldown
+
+		self.TRIGGER_REARM_POLICY = policy
+		msg = "INFO: BusKill 'rearm_policy' set to '" +str(self.TRIGGER_REARM_POLICY)+ "'"
+		logger.info( msg )
+
+	def get_rearm_policy(self):
+
+		return str(self.TRIGGER_REARM_POLICY)
+
+	# function to choose if the trigger's mechanisms are tried one-at-a-time or
+	# all at once (and to check sanity)
+	def set_trigger_strategy(self, strategy, deadline=None):
+
+		msg = "DEBUG: Attempting to set 'trigger_strategy' to '" +str(strategy)+ "'"
+		logger.debug( msg )
+
+		if strategy not in self.SUPPORTED_TRIGGER_STRATEGIES:
+			msg = "WARNING: Attempting to set trigger strategy to invalid value (" +str(strategy)+ ")"
+			logger.debug( msg )
+			raise RuntimeWarning( msg )
+
+		if deadline != None:
+			if deadline <= 0:
+				msg = "WARNING: Attempting to set trigger race deadline to invalid value (" +str(deadline)+ ")"
+				logger.debug( msg )
+				raise RuntimeWarning( msg )
+			self.trigger_race_deadline = deadline
+
+		self.TRIGGER_STRATEGY = strategy
+		msg = "INFO: BusKill 'trigger_strategy' set to '" +str(self.TRIGGER_STRATEGY)+ "'"
+		logger.info( msg )
+
+	def get_trigger_strategy(self):
+
+		return str(self.TRIGGER_STRATEGY)
+
+	def set_upgrade_strategy(self, strategy, deadline=None):
+
+		msg = "DEBUG: Attempting to set 'upgrade_strategy' to '" +str(strategy)+ "'"
+		logger.debug( msg )
+
+		if strategy not in self.SUPPORTED_UPGRADE_STRATEGIES:
+			msg = "WARNING: Attempting to set upgrade strategy to invalid value (" +str(strategy)+ ")"
+			logger.debug( msg )
+			raise RuntimeWarning( msg )
+
+		if deadline != None:
+			if deadline <= 0:
+				msg = "WARNING: Attempting to set upgrade metadata deadline to invalid value (" +str(deadline)+ ")"
+				logger.debug( msg )
+				raise RuntimeWarning( msg )
+			self.upgrade_metadata_deadline = deadline
+
+		self.UPGRADE_STRATEGY = strategy
+		msg = "INFO: BusKill 'upgrade_strategy' set to '" +str(self.UPGRADE_STRATEGY)+ "'"
+		logger.info( msg )
+
+	# re-opens the trigger latch; this is called every time we arm
+	def reset_trigger_latch(self):
+
+		with self.trigger_latch_lock:
+			self.trigger_latched = False
+			self.trigger_fired_at = None
+			self.trigger_finished_at = None
+			self.trigger_events_coalesced = 0
+
+	# this is called by the hotplug callbacks for every removal event. The
+	# first one executes the trigger, and the rest are just counted until the
+	# latch is re-opened according to the re-arm policy. 'detected_at' is when
+	# (per time.monotonic()) the callback received the event
+	def fire_trigger(self, detected_at=None):
+
+		if detected_at == None:
+			detected_at = time.monotonic()
+
+		with self.trigger_latch_lock:
+			if self.trigger_latched:
+				now = time.monotonic()
+				if self.TRIGGER_REARM_POLICY == 'cooldown':
+					reopened = now - self.trigger_fired_at >= self.trigger_rearm_cooldown
+				elif self.TRIGGER_REARM_POLICY == 'after-trigger':
+					reopened = self.trigger_finished_at != None and \
+					 now - self.trigger_finished_at >= self.trigger_coalesce_window
+				else:
+					reopened = False
+
+				if not reopened:
+					# under 'after-trigger', every straggler from the same burst
+					# pushes the window out again
+					if self.trigger_finished_at != None:
+						self.trigger_finished_at = now
+
+					self.trigger_events_coalesced += 1
+					self.metrics.inc( 'events_coalesced' )
+					msg = "DEBUG: Trigger already fired; coalesced removal event #" +str(self.trigger_events_coalesced)
+					logger.debug( msg )
+					return False
+
+			self.trigger_latched = True
+			self.trigger_fired_at = time.monotonic()
+			self.trigger_finished_at = None
+
+		msg = "calling " +str(self.TRIGGER_FUNCTION)
+		logger.debug( msg )
+
+		try:
+			with tracing.span( 'TRIGGER_FUNCTION', function = getattr(
+			 self.TRIGGER_FUNCTION, '__name__', str(self.TRIGGER_FUNCTION)
+			) ):
+				self.TRIGGER_FUNCTION()
+		finally:
+			self.metrics.inc( 'triggers_fired' )
+			self.metrics.observe_since( 'trigger_seconds', detected_at )
+
+			# the latch stays closed; fire_trigger() re-opens it once the events
+			# queued during the trigger have stopped arriving
+			if self.TRIGGER_REARM_POLICY == 'after-trigger':
+				with self.trigger_latch_lock:
+					self.trigger_finished_at = time.monotonic()
+
+		return True
+
 	# launches a root child process
 	def spawn_root_child(self):
 		msg = "DEBUG: Called spawn_root_child()"
-		print( msg ); logger.debug( msg )
+		logger.debug( msg )
 
 		# SECURITY NOTE:
 		# 
@@ -586,11 +985,11 @@ class BusKill:
 
 		if self.OS_NAME_SHORT == 'lin':
 			msg = "ERROR: root_child_lin.py not yet implemented"
-			print( msg ); logger.error( msg )
+			logger.error( msg )
 
 		elif self.OS_NAME_SHORT == 'win':
 			msg = "ERROR: root_child_win.py not yet implemented"
-			print( msg ); logger.error( msg )
+			logger.error( msg )
 
 		elif self.OS_NAME_SHORT == 'mac':
 
@@ -598,10 +997,10 @@ class BusKill:
 			if self.root_child == None:
 				# the root child process hasn't been started; start it
 				msg = "DEBUG: No root_child detected. Attempting to spawn one."
-				print( msg ); logger.debug( msg )
+				logger.debug( msg )
 
 				msg = "INFO: You have requested BusKill to do something that requires elevated privliges on your platform. If you'd like to proceed, please authorize BusKill to preform actions as Administrator. Your system may prompt you for your password to proceed."
-				print( msg ); logger.info( msg )
+				logger.info( msg )
 
 				# To spawn a child process as root in MacOS, we use
 				# AuthorizationExecuteWithPrivileges(), which triggers the OS to
@@ -628,8 +1027,13 @@ class BusKill:
 					# interpreter
 					exe = [sys.executable, root_child_path, self.LOG_FILE_PATH]
 
+				# the root child can't inherit $BUSKILL_TRACE, so we tell it where
+				# to write its spans as an optional second argument
+				if tracing.enabled():
+					exe.append( tracing.trace_file_path( 'root_child' ) )
+
 				msg = "DEBUG: root_child_path:|" +str(root_child_path)+ "|"
-				print( msg ); logger.debug( msg )
+				logger.debug( msg )
 
 				# SANITY CHECKS
 
@@ -640,7 +1044,7 @@ class BusKill:
 				# verify the mode of the file is exactly 0500 (octal)
 				if mode != '0500':
 					msg = 'ERROR: Permissions on root_child are not 0500. Refusing to spawn script as root!'
-					print( msg ); logger.error( msg )
+					logger.error( msg )
 					return False
 
 				# unfortunaetly we can't package a .dmg with a file owned by root, so on
@@ -651,19 +1055,19 @@ class BusKill:
 				# verify the file is owned by user = root (or current user)
 				if owner != 0 and owner != os.getuid():
 					msg = 'ERROR: root_child is not owned by root nor your user. Refusing to spawn script as root!'
-					print( msg ); logger.error( msg )
+					logger.error( msg )
 					return False
 
 				# verify the file is owned by group = root (or current group)
 				if group != 0 and group != os.getgid():
 					msg = 'ERROR: root_child is not owned by gid=0 nor your group. Refusing to spawn script as root!'
-					print( msg ); logger.error( msg )
+					logger.error( msg )
 					return False
 
 				# verify the "file" isn't actually a symlink
 				if os.path.islink( root_child_path ):
 					msg = 'ERROR: root_child is a link. Refusing to spawn script as root!'
-					print( msg ); logger.error( msg )
+					logger.error( msg )
 					return False
 
 				# import some C libraries for interacting via ctypes with the MacOS API
@@ -687,7 +1091,7 @@ class BusKill:
 				self.root_child['io'] = ctypes.c_void_p()
 
 				msg = "DEBUG: Attempting to spawn root child (" +str(exe)+ ")"
-				print( msg ); logger.debug( msg )
+				logger.debug( msg )
 
 				err = sec.AuthorizationExecuteWithPrivileges(
 				 auth,
@@ -698,29 +1102,29 @@ class BusKill:
 				)
 
 				msg = "DEBUG: AuthorizationExecuteWithPrivileges.err:|" +str(err)+ "|"
-				print( msg ); logger.debug( msg )
+				logger.debug( msg )
 
 				# did the attempt to spawn the child process return an error?
 				if err == -60007:
 					# https://developer.apple.com/documentation/security/1540004-authorization_services_result_co/errauthorizationinteractionnotallowed
 					msg = 'ERROR: root_child spwan attempt returned errAuthorizationInteractionNotAllowed = -60007. Did you execute BusKill from a headless CLI? The credential challenge requires a GUI when launching a child process as root.'
-					print( msg ); logger.error( msg )
+					logger.error( msg )
 					return False
 
 				elif err == -60031:
 					# https://developer.apple.com/documentation/security/1540004-authorization_services_result_co/errauthorizationtoolexecutefailure
 					msg = 'ERROR: root_child spwan attempt returned errAuthorizationToolExecuteFailure = -60031. Is the root child binary executable? Check permissions.'
-					print( msg ); logger.error( msg )
+					logger.error( msg )
 					return False
 
 				elif err != 0:
 					# catch all other errors
 					msg = 'ERROR: root_child spawn attempt returned ' +str(err)+ '. Please see reference documentation for Apple Authorization Services Result Codes @ https://developer.apple.com/documentation/security/1540004-authorization_services_result_co'
-					print( msg ); logger.error( msg )
+					logger.error( msg )
 					return False
 
 				msg = "DEBUG: Root child spawned successfully!"
-				print( msg ); logger.debug( msg )
+				logger.debug( msg )
 
 				return True
 
@@ -750,6 +1154,7 @@ class BusKill:
 
 		return result
 
+	@buskill_profile.profiled
 	def handle_upgrades(self):
 
 		# check to see if we're currently running a new version that is being
@@ -760,12 +1165,12 @@ class BusKill:
 
 				msg = "DEBUG: Detected first-run of new version. Deleting old version."
 				msg += "\n\t" +str(UPGRADED_FROM)+ "\n"
-				print( msg ); logger.debug( msg )
+				logger.debug( msg )
 
 				# only proceed with this delete if the dir matches what we'd expect
 				if os.path.exists( os.path.join( UPGRADED_FROM['APP_DIR'], '.git' ) ):
 					msg = "DEBUG: Cowardly refusing to recursively delete an app that actually looks like a git sandbox."
-					print( msg ); logger.debug( msg )
+					logger.debug( msg )
 
 				# note that this actually works for both *nix & windows and doesn't
 				# fail with "unterminated character" errors
@@ -796,11 +1201,11 @@ class BusKill:
 
 						msg = "WARNING: Unable to delete old release (" +str(self.UPGRADED_FROM['APP_DIR'])+ ")"
 						msg+= "\n\t" +str(e)
-						print( msg ); logger.warn( msg )
+						logger.warn( msg )
 
 				else:
 					msg = "DEBUG: Cowardly refusing to recursively delete an old version that doesn't match our expected regex"
-					print( msg ); logger.debug( msg )
+					logger.debug( msg )
 
 		# check to see if we're currently running an old version whose
 		# replacement version has already been installed
@@ -810,51 +1215,36 @@ class BusKill:
 				self.UPGRADED_TO = UPGRADED_TO
 				msg = "DEBUG: Detected that this version has already been upgraded. New version is:"
 				msg += "\n\t" +str(self.UPGRADED_TO)+ "\n"
-				print( msg ); logger.debug( msg )
+				logger.debug( msg )
 
+	@buskill_profile.profiled
 	def setupDataDir(self):
 
-		# first we choose where our data dir based on where we have write access
-		data_dirs = list()
-
-		# first try to create our data dir in the same dir that holds the dir
-		# where the buskill app was installed (and where future updates will be
-		# installed). This may be the BusKill USB drive itself.
-		data_dirs.append( self.APPS_DIR )
-
-		# Fall-back to the dir in which the executable is located
-		data_dirs.append( self.APP_DIR )
-
-		# finally, try the users's $HOME dir
-		data_dirs.append( os.path.join( os.path.expanduser('~') ) )
+		# the dirs in which we can create our data dir, in order of preference
+		data_dirs = buskill_platform.get_data_dir_candidates(
+		 self.APPS_DIR, self.APP_DIR
+		)
 
-		# iterate though our list of potential data dirs and pick the first one
-		# that we can actually write to
-		for data_dir in data_dirs:
-			try:
-				testfile = tempfile.TemporaryFile( dir=data_dir )
-				testfile.close()
-			except Exception as e:
-				# we were unable to write to this data_dir; try the next one
-				msg = "DEBUG: Unable to write to '" +data_dir+ "'; skipping."
-				msg += "\n\t" +str(e)+ "\n"
-				print( msg ); logger.debug( msg )
-				continue
+		# we first try the data dir that we chose on our last launch, and we
+		# only probe all of the candidates if it's no longer usable
+		data_dir = self.get_cached_data_dir( data_dirs )
+		if data_dir == None:
+			data_dir, timed_out = self.probe_dirs( data_dirs, self.is_writable_dir )
 
-			# if we made it this far, we've confirmed that we can write to this
-			# data_dir. store it and exit the loop; we'll use this one.
-			self.DATA_DIR = os.path.join( data_dir, '.buskill' )
-			break
+			# if a better candidate only timed-out, it may work next time
+			if data_dir != None and not timed_out:
+				self.set_cached_data_dir( data_dir )
 
-		try:
-			msg = "INFO: using DATA_DIR:|" +str(self.DATA_DIR)+ "|"
-			print( msg ); logger.info( msg )
-		except:
+		if data_dir == None:
 			msg = "WARNING: Unable to write to any DATA_DIR; not using one"
-			print( msg ); logger.warn( msg )
+			logger.warning( msg )
 			self.DATA_DIR = ''
 			return
 
+		self.DATA_DIR = os.path.join( data_dir, buskill_platform.DATA_DIR_NAME )
+		msg = "INFO: using DATA_DIR:|" +str(self.DATA_DIR)+ "|"
+		logger.info( msg )
+
 		# create cache dir (and clean if necessary) and data dir
 		self.CACHE_DIR = os.path.join( self.DATA_DIR, 'cache' )
 		self.wipeCache()
@@ -865,338 +1255,1391 @@ class BusKill:
 
 		self.GNUPGHOME = os.path.join( self.CACHE_DIR, '.gnupg' )
 
-	def toggle(self):
+	# loads what we learned about this machine on previous launches from our
+	# DATA_DIR, and checks that it's still true in the background
+	def load_capability_cache(self):
 
-		if self.is_armed:
-			msg = "DEBUG: attempting to disarm BusKill"
-			print( msg ); logger.debug( msg )
+		if self.OS_NAME_SHORT != 'lin':
+			return
 
-			# disarm just means to terminate the child process in which the arm
-			# function was spawned. this works on all platforms.
-			try:
-				self.usb_handler.kill()
-				self.usb_handler.join()
-			except:
-				pass
+		path = None
+		if self.DATA_DIR:
+			path = os.path.join( self.DATA_DIR, capability_cache.CAPABILITY_CACHE_FILE_NAME )
 
-			self.is_armed = False
-			msg = "INFO: BusKill is disarmed."
-			print( msg ); logger.info( msg )
+		self.capability_cache = capability_cache.CapabilityCache( path )
+		if self.capability_cache.load():
+			msg = "DEBUG: Loaded the capability cache from '" +str(path)+ "'"
+			logger.debug( msg )
 
-		else:
-			msg = "DEBUG: attempting to arm BusKill via " +str(self.ARM_FUNCTION)+ "()"
-			print( msg ); logger.debug( msg )
-
-			# launch an asynchronous child process that'll loop and listen for
-			# usb events
-#			self.usb_handler = self.Process(
-			self.usb_handler = multiprocessing.Process(
-			 target = self.ARM_FUNCTION
-			)
-			self.usb_handler.start()
+		self.capability_cache.revalidate_bg()
 
-			self.is_armed = True
-			msg = "INFO: BusKill is armed. Listening for removal event.\n"
-			msg+= "INFO: To disarm the CLI, exit with ^C or close this terminal"
-			print( msg ); logger.info( msg )
+	# returns true if we can create files in the given dir
+	def is_writable_dir( self, path ):
 
-	# this is a callback function that is registered to be called when a usb
-	# hotplug event occurs using libusb (linux & macos)
-	def hotplugCallbackNix( self, *argv ):
+		try:
+			testfile = tempfile.TemporaryFile( dir=path )
+			testfile.close()
+		except Exception as e:
+			# we were unable to write to this data_dir; try the next one
+			msg = "DEBUG: Unable to write to '" +str(path)+ "'; skipping."
+			msg += "\n\t" +str(e)+ "\n"
+			logger.debug( msg )
+			return False
 
-		(context, device, event) = argv
+		return True
 
-		msg = "DEBUG: called hotplugCallbackNix()"
-		print( msg ); logger.debug( msg )
+	# calls check(path) for all of the given paths at once (each in its own
+	# daemon thread) and returns the first of the paths (in the given order) for
+	# which check() returned True, or None. Paths whose check() doesn't return
+	# within DATA_DIR_PROBE_TIMEOUT seconds are skipped (and their threads are
+	# abandoned, since a thread stuck on a dead mount can't be stopped). Also
+	# returns whether any path before the returned one was skipped that way
+	def probe_dirs( self, paths, check ):
 
-		msg = "context:|" +str(context)+ "|"
-		print( msg ); logger.debug( msg )
+		results = [ None ] * len(paths)
+		finished = [ threading.Event() for path in paths ]
 
-		msg = "device:|" +str(device)+ "|"
-		print( msg ); logger.debug( msg )
+		def probe( index ):
+			try:
+				results[index] = check( paths[index] )
+			except Exception:
+				results[index] = False
+			finished[index].set()
+
+		for index in range( len(paths) ):
+			threading.Thread( target=probe, args=(index,), daemon=True ).start()
+
+		timed_out = False
+		deadline = time.monotonic() + DATA_DIR_PROBE_TIMEOUT
+		for index, path in enumerate( paths ):
+
+			if not finished[index].wait( max( 0, deadline - time.monotonic() ) ):
+				msg = "WARNING: Timed-out probing '" +str(path)+ "'; skipping."
+				logger.warning( msg )
+				timed_out = True
+				continue
 
-		msg = "event:|" +str(event)+ "|"
-		print( msg ); logger.debug( msg )
+			if results[index]:
+				return path, timed_out
 
-		msg = "usb1.HOTPLUG_EVENT_DEVICE_LEFT:|" +str(usb1.HOTPLUG_EVENT_DEVICE_LEFT)+ "|"
-		print( msg ); logger.debug( msg )
+		return None, timed_out
 
-		# is this from a usb device being inserted or removed? 
-		if event == usb1.HOTPLUG_EVENT_DEVICE_LEFT:
-			# this is a usb removal event
+	def get_data_dir_cache_path(self):
+		return os.path.join( tempfile.gettempdir(), DATA_DIR_CACHE_FILE_NAME )
 
-			msg = "INFO: Detected USB removal event"
-			print( msg ); logger.info( msg )
+	# returns the data dir that we chose on our last launch (from this APP_DIR)
+	# if it's still usable. That is, if it's still on the same device (so it's
+	# not a different drive that was mounted at the same path) and we can still
+	# write to it. Otherwise, returns None
+	def get_cached_data_dir( self, data_dirs ):
 
-			msg = "calling " +str(self.TRIGGER_FUNCTION)
-			print( msg ); logger.debug( msg )
+		import json
 
-			self.TRIGGER_FUNCTION()
+		try:
+			with open( self.get_data_dir_cache_path() ) as cache_file:
+				cached = json.load( cache_file )[ self.APP_DIR ]
+			data_dir = cached['data_dir']
+			st_dev = cached['st_dev']
+		except Exception:
+			return None
 
-	# simulates a fake hotplug removal event
-	def simulate_hotplug_removal( self ):
+		# the cache is in the (shared) temp dir, so we only trust it to tell us
+		# which one of our own candidates to use
+		if data_dir not in data_dirs:
+			return None
 
-		if self.OS_NAME_SHORT == 'lin' or self.OS_NAME_SHORT == 'mac':
+		def is_still_usable( path ):
+			return os.stat( path ).st_dev == st_dev and os.access( path, os.W_OK )
 
-			self.simulate_hotplug_removal_nix()
-		
-		elif self.OS_NAME_SHORT == 'win':
+		if self.probe_dirs( [ data_dir ], is_still_usable )[0] == None:
+			msg = "DEBUG: The cached data dir '" +str(data_dir)+ "' is no longer usable"
+			logger.debug( msg )
+			return None
 
-			self.simulate_hotplug_removal_win()
+		return data_dir
 
+	def set_cached_data_dir( self, data_dir ):
 
-	# simulates a fake hotplug removal event on *nix platforms
-	def simulate_hotplug_removal_nix( self ):
+		import json
 
-		# call the callback for hotplug events with 'simulation' for both 'context'
-		# and 'event'. The last argument is the constant signifying that the
-		# hotplug event is specifically a *removal* event
-		self.hotplugCallbackNix( 'simulation', 'simulation', usb1.HOTPLUG_EVENT_DEVICE_LEFT )
+		cache_path = self.get_data_dir_cache_path()
+		try:
+			with open( cache_path ) as cache_file:
+				cache = json.load( cache_file )
+			if not isinstance( cache, dict ):
+				cache = dict()
+		except Exception:
+			cache = dict()
 
-	# TODO: test this. DBT_DEVICEREMOVALCOMPLETE may not be avaialble and so this
-	# may need to move wayy up (next to the actual hotplugCallbackWin() function's definition
-	def simulate_hotplug_removal_win( self ):
+		try:
+			cache[ self.APP_DIR ] = {
+			 'data_dir': data_dir,
+			 'st_dev': os.stat( data_dir ).st_dev,
+			}
 
-		# call the callback for hotplug events with 'simulation' for 'hwnd',
-		# 'message', and 'lparam'. The second-to-last argument is the constant
-		# signifying that the hotplug event is specifically a *removal* event
-		self.hotplugCallbackWin(
-		 'simulation',
-		 'simulation',
-		 DBT_DEVICEREMOVECOMPLETE,
-		 'simulation'
-		)
+			# write it to a temp file that we rename over the cache, so that
+			# another instance never reads a half-written cache
+			fd, tmp_path = tempfile.mkstemp(
+			 dir=os.path.dirname( cache_path ), prefix=DATA_DIR_CACHE_FILE_NAME
+			)
+			with os.fdopen( fd, 'w' ) as tmp_file:
+				json.dump( cache, tmp_file )
+			os.replace( tmp_path, cache_path )
+		except Exception as e:
+			msg = "DEBUG: Unable to cache the data dir in '" +str(cache_path)+ "' (" +str(e)+ ")"
+			logger.debug( msg )
 
-	####################
-	# ARMING FUNCTIONS #
-	####################
+	# arm() and disarm() are like toggle(), except that they don't change
+	# anything if we're already in the state that they ask for, and they're
+	# safe to call from many threads (eg from the GUI and the control socket)
+	def arm(self):
 
-	# this works for both linux and mac
-	def armNix(self):
+		with self.toggle_lock:
+			if not self.is_armed:
+				self.toggle()
 
-		with usb1.USBContext() as context:
+	def disarm(self):
 
-			if not context.hasCapability(usb1.CAP_HAS_HOTPLUG):
-				msg = 'ERROR: Hotplug support is missing'
-				print( msg ); logger.error( msg )
-				return msg
+		with self.toggle_lock:
+			if self.is_armed:
+				self.toggle()
 
-			opaque = context.hotplugRegisterCallback( self.hotplugCallbackNix )
+	def toggle(self):
 
-			try:
-				while True:
-					# this call is blocking (with a default timeout of 60 seconds)
-					# afaik there's no way to tell USBContext.handleEvents() to exit
-					# safely, so instead we just make the whole call to this arming
-					# function in a new child process and kill it on disarm with
-					# kill() this approach isn't very nice and it dumps a
-					# traceback to output, but it *does* immediately disarm without
-					# having wait for the timeout..
-					context.handleEvents()
+		started_at = time.monotonic()
 
-			except (KeyboardInterrupt, SystemExit) as e:
-				msg = "DEBUG: Exiting armNix() loop: " +str(e)
-				print( msg ); logger.info( msg )
+		if self.is_armed:
+			msg = "DEBUG: attempting to disarm BusKill"
+			logger.debug( msg )
 
-		return 0
+			if self.ARM_ENGINE == 'thread':
+				self.disarm_thread()
 
-	def armWin(self):
+			elif self.ARM_ENGINE == 'standby':
+				# the listener may have already exited (eg on ^C in the CLI)
+				if self.standby_process.is_alive():
+					self.standby_command( 'disarm' )
 
-		w = Notification( self )
-		win32gui.PumpMessages()
+			else:
+				# disarm just means to terminate the child process in which the arm
+				# function was spawned. this works on all platforms.
+				try:
+					self.usb_handler.kill()
+					self.usb_handler.join()
+				except:
+					pass
 
-	#####################
-	# TRIGGER FUNCTIONS #
-	#####################
+			self.is_armed = False
+			self.metrics.observe_since( 'disarm_seconds', started_at )
+			msg = "INFO: BusKill is disarmed."
+			logger.info( msg )
 
-	# TODO: add other triggers besides lockscreens
+		else:
+			msg = "DEBUG: attempting to arm BusKill via " +str(self.ARM_FUNCTION)+ "() with the '" +str(self.ARM_ENGINE)+ "' engine"
+			logger.debug( msg )
 
-	# LINUX
+			self.check_trigger()
+			self.reset_trigger_latch()
 
-	def triggerLin(self):
+			# the listener checks this too, but a listener in another process (the
+			# 'process' engine) can't tell us that it failed, so we refuse to arm
+			# here if we already know that it would (see capability_cache.py)
+			if self.DETECTOR == 'libusb' \
+			 and self.capability_cache.has_hotplug( usb1 ) == False:
+				msg = 'ERROR: Unable to arm. Hotplug support is missing'
+				logger.error( msg )
+				raise RuntimeWarning( msg )
 
-		if self.trigger == 'soft-shutdown':
-			self.trigger_softshutdown_lin()
-		else:
-			self.trigger_lockscreen_lin()
+			if self.ARM_ENGINE == 'thread':
+				self.arm_thread()
 
-	# this function will lock the screen on linux machines
-	def trigger_lockscreen_lin(self):
-		msg = "DEBUG: BusKill lock-screen trigger executing now"
-		print( msg ); logger.debug( msg )
+			elif self.ARM_ENGINE == 'standby':
+				self.arm_standby()
 
-		# first we try to lock with xdg-screensaver
-		self.trigger_lockscreen_lin_xdg()
+			else:
+				# launch an asynchronous child process that'll loop and listen for
+				# usb events. The event is set by the child once it's listening
+				self.usb_handler_ready = multiprocessing.Event()
+#				self.usb_handler = self.Process(
+				self.usb_handler = multiprocessing.Process(
+				 target = self.listen,
+				 kwargs = { 'ready': self.usb_handler_ready }
+				)
+				self.usb_handler.start()
 
-	# this function will gently shutdown a Linux machine
-	def trigger_softshutdown_lin(self):
+			self.is_armed = True
+			self.metrics.observe_since( 'arm_seconds', started_at )
+			msg = "INFO: BusKill is armed. Listening for removal event.\n"
+			msg+= "INFO: To disarm the CLI, exit with ^C or close this terminal"
+			logger.info( msg )
+
+	# launches the arm function in a thread inside this process and blocks until
+	# it has actually registered its callbacks (so armed really means armed)
+	def arm_thread(self):
+
+		self.usb_handler_ready = threading.Event()
+		self.usb_handler_stop = threading.Event()
+		self.usb_handler_lock = threading.Lock()
+		self.usb_handler_interrupt = None
+		self.usb_handler_error = None
+
+		# this is a daemon thread so that it can never prevent the app from exiting
+		self.usb_handler = threading.Thread(
+		 target = self.listen,
+		 kwargs = {
+		  'ready': self.usb_handler_ready,
+		  'stop': self.usb_handler_stop
+		 },
+		 daemon = True
+		)
+		self.usb_handler.start()
+
+		if not self.usb_handler_ready.wait( timeout=ARM_THREAD_READY_TIMEOUT ):
+			self.disarm_thread()
+			msg = "ERROR: Timed-out waiting for the listener thread to start"
+			logger.error( msg )
+			raise RuntimeWarning( msg )
+
+		if self.usb_handler_error != None:
+			msg = "ERROR: Unable to arm. " +str(self.usb_handler_error)
+			logger.error( msg )
+			self.usb_handler.join()
+			raise RuntimeWarning( msg )
+
+	# tells the listener thread to exit, wakes it up, and waits for it to finish
+	def disarm_thread(self):
+
+		if self.usb_handler_stop == None:
+			return
+
+		self.usb_handler_stop.set()
+
+		# the lock prevents us from interrupting a libusb context that the
+		# listener thread has already closed
+		with self.usb_handler_lock:
+			if self.usb_handler_interrupt != None:
+				self.usb_handler_interrupt()
+
+		self.usb_handler.join()
+
+	# this is the target of the 'thread' and 'process' arm engines. It runs in
+	# the same thread or process that will execute the trigger, so that's where
+	# we prepare the trigger
+	def listen(self, ready=None, stop=None):
+
+		if self.ARM_ENGINE == 'thread':
+			tracing.set_thread_name( 'listener' )
+		else:
+			tracing.set_process_name( 'listener' )
+
+		# if we fail (eg libusb can't be initialized), then the error is stored
+		# and 'ready' is still set, so arm_thread() reports why immediately
+		# instead of timing-out
+		try:
+			self.prepare_trigger()
+			try:
+				return self.ARM_FUNCTION( ready=ready, stop=stop )
+			finally:
+				self.release_trigger()
+		except Exception as e:
+			msg = 'ERROR: The listener failed (' +str(e)+ ')'
+			logger.exception( msg )
+			self.usb_handler_error = msg
+			return msg
+		finally:
+			if ready != None:
+				ready.set()
+
+	# spawns the warm-standby listener process (if it isn't already running) and
+	# blocks until it has opened its libusb context and registered its callback
+	def start_standby(self):
+
+		if self.standby_process != None and self.standby_process.is_alive():
+			return
+
+		msg = "DEBUG: Spawning warm-standby listener process"
+		logger.debug( msg )
+
+		self.standby_conn, child_conn = multiprocessing.Pipe()
+		self.standby_process = multiprocessing.Process(
+		 target = self.standby_listener,
+		 args = ( child_conn, ),
+		 daemon = True
+		)
+		self.standby_process.start()
+
+		# wait for the child to tell us that it's ready
+		if not self.standby_conn.poll( ARM_THREAD_READY_TIMEOUT ):
+			self.standby_process.kill()
+			self.standby_process.join()
+			self.standby_process = None
+			msg = "ERROR: Timed-out waiting for the warm-standby listener to start"
+			logger.error( msg )
+			raise RuntimeWarning( msg )
+
+		reply, error = self.standby_conn.recv()
+		if reply != 'ready':
+			self.standby_process.join()
+			self.standby_process = None
+			msg = "ERROR: Unable to start the warm-standby listener. " +str(error)
+			logger.error( msg )
+			raise RuntimeWarning( msg )
+
+	# sends a command to the warm-standby listener and waits for it to ack
+	def standby_command(self, command, state=None):
+
+		try:
+			self.standby_conn.send( (command, state) )
+			if not self.standby_conn.poll( ARM_THREAD_READY_TIMEOUT ):
+				raise TimeoutError( "no response" )
+			reply, error = self.standby_conn.recv()
+		except Exception as e:
+			reply, error = 'error', e
+
+		if reply == 'error':
+			msg = "ERROR: warm-standby listener failed to '" +str(command)+ "'. " +str(error)
+			logger.error( msg )
+			raise RuntimeWarning( msg )
+
+	def arm_standby(self):
+
+		# the warm-standby listener only knows how to use libusb
+		if self.DETECTOR != 'libusb':
+			msg = "ERROR: The 'standby' arm engine requires the 'libusb' detector"
+			logger.error( msg )
+			raise RuntimeWarning( msg )
+
+		# respawn the listener if it died (eg after it executed the trigger)
+		self.start_standby()
+
+		# the listener was forked or spawned before the user picked their
+		# trigger, so we send it along with the arm command
+		state = {
+		 'trigger': self.trigger,
+		 'TRIGGER_REARM_POLICY': self.TRIGGER_REARM_POLICY,
+		 'trigger_rearm_cooldown': self.trigger_rearm_cooldown,
+		 'trigger_coalesce_window': self.trigger_coalesce_window,
+		 'TRIGGER_STRATEGY': self.TRIGGER_STRATEGY,
+		 'trigger_race_deadline': self.trigger_race_deadline,
+		 'trigger_softshutdown_lin_shutdown_path': self.trigger_softshutdown_lin_shutdown_path,
+		 'trigger_softshutdown_lin_poweroff_path': self.trigger_softshutdown_lin_poweroff_path,
+		 'trigger_softshutdown_lin_systemctl_path': self.trigger_softshutdown_lin_systemctl_path,
+		}
+		state['device_selector'] = self.device_selector
+		self.standby_command( 'arm', state )
+
+		self.usb_handler = self.standby_process
+		self.usb_handler_ready = threading.Event()
+		self.usb_handler_ready.set()
+
+	# this is executed in the warm-standby listener process. The main thread
+	# handles libusb events while another thread handles commands from the pipe
+	def standby_listener(self, conn):
+
+		tracing.set_process_name( 'standby listener' )
+
+		with usb1.USBContext() as context:
+
+			if not context.hasCapability(usb1.CAP_HAS_HOTPLUG):
+				msg = 'ERROR: Hotplug support is missing'
+				logger.error( msg )
+				conn.send( ('error', msg) )
+				return msg
+
+			self.standby_armed = False
+			self.standby_opaque = self.hotplug_register( context, self.hotplugCallbackStandby )
+
+			commands = threading.Thread(
+			 target = self.standby_commands,
+			 args = ( conn, context ),
+			 daemon = True
+			)
+			commands.start()
+			conn.send( ('ready', None) )
+
+			try:
+				while commands.is_alive():
+					context.handleEventsTimeout( tv=ARM_THREAD_POLL_INTERVAL )
+			except (KeyboardInterrupt, SystemExit) as e:
+				msg = "DEBUG: Exiting standby_listener() loop: " +str(e)
+				logger.info( msg )
+
+			context.hotplugDeregisterCallback( self.standby_opaque )
+
+		return 0
+
+	# loops in the warm-standby listener process, executing commands from the
+	# parent process until it tells us to exit (or it dies)
+	def standby_commands(self, conn, context):
+
+		while True:
+			try:
+				command, state = conn.recv()
+			except EOFError:
+				# the parent process is gone
+				command, state = 'exit', None
+
+			msg = "DEBUG: warm-standby listener received command '" +str(command)+ "'"
+			logger.debug( msg )
+
+			if command == 'arm':
+
+				# our callback was registered with the device filter that we had
+				# when we were spawned; re-register it if the user changed it
+				selector_changed = state['device_selector'] != self.device_selector
+				self.__dict__.update( state )
+				if selector_changed:
+					context.hotplugDeregisterCallback( self.standby_opaque )
+					self.standby_opaque = self.hotplug_register(
+					 context, self.hotplugCallbackStandby
+					)
+
+				self.reset_trigger_latch()
+				self.prepare_trigger()
+				self.standby_armed = True
+				conn.send( ('armed', None) )
+
+			elif command == 'disarm':
+				self.standby_armed = False
+				self.release_trigger()
+				conn.send( ('disarmed', None) )
+
+			elif command == 'exit':
+				self.standby_armed = False
+				self.release_trigger()
+				if hasattr( context, 'interruptEventHandler' ):
+					context.interruptEventHandler()
+				return
+
+			else:
+				conn.send( ('error', 'Unknown command') )
+
+	# the warm-standby listener's callback is registered before we're armed, so
+	# it drops all events until the parent process arms it
+	@tracing.traced
+	def hotplugCallbackStandby( self, *argv ):
+
+		if self.standby_armed:
+			self.hotplugCallbackNix( *argv )
+
+	# this is a callback function that is registered to be called when a usb
+	# hotplug event occurs using libusb (linux & macos)
+	@tracing.traced
+	def hotplugCallbackNix( self, *argv ):
+
+		detected_at = time.monotonic()
+		self.metrics.inc( 'events_seen' )
+
+		(context, device, event) = argv
+
+		# drop events from devices that the user didn't select as early (and
+		# cheaply) as possible
+		if not self.device_matches( device ):
+			self.metrics.inc( 'events_filtered' )
+			return
+
+		msg = "DEBUG: called hotplugCallbackNix()"
+		logger.debug( msg )
+
+		msg = "context:|" +str(context)+ "|"
+		logger.debug( msg )
+
+		msg = "device:|" +str(device)+ "|"
+		logger.debug( msg )
+
+		msg = "event:|" +str(event)+ "|"
+		logger.debug( msg )
+
+		msg = "usb1.HOTPLUG_EVENT_DEVICE_LEFT:|" +str(usb1.HOTPLUG_EVENT_DEVICE_LEFT)+ "|"
+		logger.debug( msg )
+
+		# is this from a usb device being inserted or removed? 
+		if event == usb1.HOTPLUG_EVENT_DEVICE_LEFT:
+			# this is a usb removal event
+
+			msg = "INFO: Detected USB removal event"
+			logger.info( msg )
+
+			self.fire_trigger( detected_at )
+
+		else:
+			self.metrics.inc( 'events_filtered' )
+
+	# registers our hotplug callback with libusb, asking libusb to only deliver
+	# events for the vendor & product id of the selected device (if any). libusb
+	# can't filter by port, so that's done by device_matches() in the callback
+	def hotplug_register( self, context, callback ):
+
+		kwargs = dict()
+		if self.device_selector != None:
+			if 'vendor_id' in self.device_selector:
+				kwargs['vendor_id'] = self.device_selector['vendor_id']
+			if 'product_id' in self.device_selector:
+				kwargs['product_id'] = self.device_selector['product_id']
+
+		msg = "DEBUG: Registering hotplug callback with filters:|" +str(kwargs)+ "|"
+		logger.debug( msg )
+
+		return context.hotplugRegisterCallback( callback, **kwargs )
+
+	# returns True if the given usb1 device matches the user's device selector
+	def device_matches( self, device ):
+
+		if self.device_selector == None or device == 'simulation':
+			return True
+
+		try:
+			if 'vendor_id' in self.device_selector and \
+			 device.getVendorID() != self.device_selector['vendor_id']:
+				return False
+
+			if 'product_id' in self.device_selector and \
+			 device.getProductID() != self.device_selector['product_id']:
+				return False
+
+			if 'bus' in self.device_selector and \
+			 device.getBusNumber() != self.device_selector['bus']:
+				return False
+
+			if 'port_numbers' in self.device_selector and \
+			 device.getPortNumberList() != self.device_selector['port_numbers']:
+				return False
+
+		except Exception as e:
+			# if we can't tell, then err on the side of caution & let it through
+			msg = "WARNING: Unable to check device against selector (" +str(e)+ ")"
+			logger.warning( msg )
+
+		return True
+
+	# returns a list of the usb devices currently connected, with the selector
+	# string that can be passed to set_device_selector() to pick each one
+	def list_usb_devices( self ):
+
+		if self.OS_NAME_SHORT not in ['lin','mac']:
+			msg = "Selecting a usb device is not supported on this platform"
+			logger.debug( "DEBUG: " + msg )
+			raise RuntimeWarning( msg )
+
+		devices = list()
+		with usb1.USBContext() as context:
+			for device in context.getDeviceIterator( skip_on_error=True ):
+				vendor_id = device.getVendorID()
+				product_id = device.getProductID()
+				bus = device.getBusNumber()
+				port_numbers = device.getPortNumberList()
+
+				selector = '{:04x}:{:04x}@{}'.format( vendor_id, product_id, bus )
+				if port_numbers:
+					selector += '-' + '.'.join( [str(port) for port in port_numbers] )
+
+				devices.append( {
+				 'selector': selector,
+				 'vendor_id': vendor_id,
+				 'product_id': product_id,
+				 'bus': bus,
+				 'port_numbers': port_numbers,
+				} )
+				device.close()
+
+		return devices
+
+	# function to set the device filter from a string (and to check sanity). The
+	# string is any of the following (or None to listen for all devices)
+	#  * 'VVVV:PPPP'           = hex vendor & product id
+	#  * 'VVVV:'               = hex vendor id only
+	#  * 'B-P.P.P'             = bus number and port path
+	#  * 'VVVV:PPPP@B-P.P.P'   = both
+	def set_device_selector( self, selector ):
+
+		msg = "DEBUG: Attempting to set 'device_selector' to '" +str(selector)+ "'"
+		logger.debug( msg )
+
+		if selector == None:
+			self.device_selector = None
+			return
+
+		if self.OS_NAME_SHORT not in ['lin','mac']:
+			msg = "Selecting a usb device is not supported on this platform"
+			logger.debug( "DEBUG: " + msg )
+			raise RuntimeWarning( msg )
+
+		# don't switch filters out from under a running listener
+		if self.is_armed:
+			msg = "WARNING: Cannot change the device selector while BusKill is armed"
+			logger.warning( msg )
+			raise RuntimeWarning( msg )
+
+		match = re.match(
+		 "^(?:(?P<vendor_id>[0-9a-fA-F]{1,4}):(?P<product_id>[0-9a-fA-F]{1,4})?)?" \
+		 "@?(?:(?P<bus>[0-9]+)(?:-(?P<port_numbers>[0-9]+(?:\.[0-9]+)*))?)?$",
+		 selector
+		)
+		if not match:
+			msg = "WARNING: Attempting to set device selector to invalid value (" +str(selector)+ ")"
+			logger.debug( msg )
+			raise RuntimeWarning( msg )
+
+		device_selector = dict()
+		if match.group('vendor_id'):
+			device_selector['vendor_id'] = int( match.group('vendor_id'), 16 )
+		if match.group('product_id'):
+			device_selector['product_id'] = int( match.group('product_id'), 16 )
+		if match.group('bus'):
+			device_selector['bus'] = int( match.group('bus') )
+		if match.group('port_numbers'):
+			device_selector['port_numbers'] = [
+			 int(port) for port in match.group('port_numbers').split('.')
+			]
+
+		# a selector like '@' matches the regex but doesn't select anything
+		if device_selector == dict():
+			msg = "WARNING: Attempting to set device selector to invalid value (" +str(selector)+ ")"
+			logger.debug( msg )
+			raise RuntimeWarning( msg )
+
+		self.device_selector = device_selector
+		msg = "INFO: BusKill 'device_selector' set to '" +str(self.device_selector)+ "'"
+		logger.info( msg )
+
+	# this is a callback function that is called by the uevent detector when
+	# the kernel tells us that a (matching) usb device was removed (linux only)
+	@tracing.traced
+	def hotplugCallbackUevent( self, uevent ):
+
+		detected_at = time.monotonic()
+		self.metrics.inc( 'events_seen' )
+
+		msg = "DEBUG: called hotplugCallbackUevent()"
+		logger.debug( msg )
+
+		msg = "uevent:|" +str(uevent)+ "|"
+		logger.debug( msg )
+
+		msg = "INFO: Detected USB removal event"
+		logger.info( msg )
+
+		self.fire_trigger( detected_at )
+
+	# called by the uevent listener for each kernel uevent that it dropped
+	# because it wasn't a removal of the selected device
+	def hotplugFilteredUevent( self, uevent ):
+
+		self.metrics.inc( 'events_seen' )
+		self.metrics.inc( 'events_filtered' )
+
+	# simulates a fake hotplug removal event
+	def simulate_hotplug_removal( self ):
+
+		if self.OS_NAME_SHORT == 'lin' or self.OS_NAME_SHORT == 'mac':
+
+			self.simulate_hotplug_removal_nix()
+		
+		elif self.OS_NAME_SHORT == 'win':
+
+			self.simulate_hotplug_removal_win()
+
+
+	# simulates a fake hotplug removal event on *nix platforms
+	def simulate_hotplug_removal_nix( self ):
+
+		# call the callback for hotplug events with 'simulation' for both 'context'
+		# and 'event'. The last argument is the constant signifying that the
+		# hotplug event is specifically a *removal* event
+		self.hotplugCallbackNix( 'simulation', 'simulation', usb1.HOTPLUG_EVENT_DEVICE_LEFT )
+
+	# TODO: test this. DBT_DEVICEREMOVALCOMPLETE may not be avaialble and so this
+	# may need to move wayy up (next to the actual hotplugCallbackWin() function's definition
+	def simulate_hotplug_removal_win( self ):
+
+		# call the callback for hotplug events with 'simulation' for 'hwnd',
+		# 'message', and 'lparam'. The second-to-last argument is the constant
+		# signifying that the hotplug event is specifically a *removal* event
+		self.hotplugCallbackWin(
+		 'simulation',
+		 'simulation',
+		 DBT_DEVICEREMOVECOMPLETE,
+		 'simulation'
+		)
+
+	####################
+	# ARMING FUNCTIONS #
+	####################
+
+	# this works for both linux and mac
+	#
+	# If 'stop' is given, then this is being executed in a thread by
+	# arm_thread(), and we loop until it's set. Otherwise we loop forever and
+	# expect to be killed by toggle(). Either way, 'ready' is set once the
+	# callback is registered
+	def armNix(self, ready=None, stop=None):
+
+		with usb1.USBContext() as context:
+
+			if not context.hasCapability(usb1.CAP_HAS_HOTPLUG):
+				msg = 'ERROR: Hotplug support is missing'
+				logger.error( msg )
+				self.usb_handler_error = msg
+				if ready != None:
+					ready.set()
+				return msg
+
+			opaque = self.hotplug_register( context, self.hotplugCallbackNix )
+
+			if stop != None:
+				# libusb >= 1.0.21 can wake-up a blocking handleEvents() call, which
+				# lets disarm_thread() stop us immediately. If it's not available,
+				# then we fallback to waking-up periodically to check for 'stop'
+				if hasattr( context, 'interruptEventHandler' ):
+					self.usb_handler_interrupt = context.interruptEventHandler
+
+			if ready != None:
+				ready.set()
+
+			try:
+				if stop == None:
+					while True:
+						# this call is blocking (with a default timeout of 60 seconds)
+						# afaik there's no way to tell USBContext.handleEvents() to exit
+						# safely, so instead we just make the whole call to this arming
+						# function in a new child process and kill it on disarm with
+						# kill() this approach isn't very nice and it dumps a
+						# traceback to output, but it *does* immediately disarm without
+						# having wait for the timeout..
+						context.handleEvents()
+
+				else:
+					while not stop.is_set():
+						if self.usb_handler_interrupt != None:
+							context.handleEvents()
+						else:
+							context.handleEventsTimeout( tv=ARM_THREAD_POLL_INTERVAL )
+
+			except (KeyboardInterrupt, SystemExit) as e:
+				msg = "DEBUG: Exiting armNix() loop: " +str(e)
+				logger.info( msg )
+
+			finally:
+				if stop != None:
+					# make sure nobody tries to interrupt this context after it's closed
+					with self.usb_handler_lock:
+						self.usb_handler_interrupt = None
+					context.hotplugDeregisterCallback( opaque )
+
+		return 0
+
+	# this is an alternative to armNix() on linux that reads removal events
+	# straight from the kernel instead of going through libusb
+	def armLinUevent(self, ready=None, stop=None):
+
+		# translate our device selector into the uevent's DEVPATH & PRODUCT
+		devpath = None
+		bus = None
+		product = None
+		if self.device_selector != None:
+			if 'port_numbers' in self.device_selector:
+				devpath = str( self.device_selector.get('bus') ) + '-' \
+				 + '.'.join( [str(port) for port in self.device_selector['port_numbers']] )
+			elif 'bus' in self.device_selector:
+				bus = self.device_selector['bus']
+			if 'vendor_id' in self.device_selector:
+				product = '{:x}'.format( self.device_selector['vendor_id'] )
+				if 'product_id' in self.device_selector:
+					product += '/{:x}'.format( self.device_selector['product_id'] )
+
+		try:
+			listener = uevent_lin.UeventListener(
+			 self.hotplugCallbackUevent,
+			 devpath = devpath,
+			 bus = bus,
+			 product = product,
+			 filtered_callback = self.hotplugFilteredUevent
+			)
+		except OSError as e:
+			msg = 'ERROR: Unable to open uevent netlink socket (' +str(e)+ ')'
+			logger.error( msg )
+			self.usb_handler_error = msg
+			if ready != None:
+				ready.set()
+			return msg
+
+		if stop != None:
+			self.usb_handler_interrupt = listener.interrupt
+
+		if ready != None:
+			ready.set()
+
+		try:
+			listener.run( stop=stop )
+
+		except (KeyboardInterrupt, SystemExit) as e:
+			msg = "DEBUG: Exiting armLinUevent() loop: " +str(e)
+			logger.info( msg )
+
+		except OSError as e:
+			# the listener couldn't re-open its socket, so it already called the
+			# trigger (see UeventListener.reopen())
+			msg = 'ERROR: Unable to read from the uevent netlink socket (' +str(e)+ ')'
+			logger.error( msg )
+			self.usb_handler_error = msg
+			return msg
+
+		finally:
+			if stop != None:
+				with self.usb_handler_lock:
+					self.usb_handler_interrupt = None
+
+		return 0
+
+	def armWin(self, ready=None, stop=None):
+
+		w = Notification( self )
+		if ready != None:
+			ready.set()
+		win32gui.PumpMessages()
+
+	#####################
+	# TRIGGER FUNCTIONS #
+	#####################
+
+	# TODO: add other triggers besides lockscreens
+
+	# does everything that we can do ahead of time to make the trigger fast.
+	# This is called when we're armed, in the thread or process that will
+	# execute the trigger
+	def prepare_trigger(self):
+
+		self.spawn_trigger_helper()
+		self.prepare_dbus_trigger()
+
+	def release_trigger(self):
+
+		self.kill_trigger_helper()
+		self.close_dbus_trigger()
+
+	# checks (in the thread that's arming us) that the trigger will be able to
+	# do its job, so that the user learns about problems when they arm rather
+	# than when the cord is pulled
+	def check_trigger(self):
+
+		if self.OS_NAME_SHORT != 'lin' or self.trigger != 'soft-shutdown':
+			return
+
+		try:
+			power_off = dbus_lin.find_power_off()
+		except dbus_lin.DBusError as e:
+			msg = "ERROR: This user isn't authorized to shutdown the machine (" +str(e.text)+ "). Try running BusKill as root or allowing 'org.freedesktop.login1.power-off' in polkit"
+			logger.error( msg )
+			raise RuntimeWarning( msg )
+
+		# logind isn't reachable, so we'll fallback to the shutdown binaries
+		if power_off == None:
+			return
+
+		power_off.close()
+
+	# opens a D-Bus connection to whatever can lock our session's screen or
+	# power off the machine, so that the trigger is just a single message
+	def prepare_dbus_trigger(self):
+
+		self.close_dbus_trigger()
+
+		if self.OS_NAME_SHORT != 'lin':
+			return
+
+		try:
+			if self.trigger == 'soft-shutdown':
+				self.trigger_dbus_method = dbus_lin.find_power_off()
+			else:
+				# try the screen locker that worked last time first
+				self.trigger_dbus_method = dbus_lin.find_screen_locker(
+				 prefer = self.capability_cache.get_screen_locker()
+				)
+				if self.trigger_dbus_method != None:
+					self.capability_cache.set_screen_locker(
+					 self.trigger_dbus_method.destination
+					)
+		except Exception as e:
+			msg = "WARNING: Unable to prepare the trigger's D-Bus method (" +str(e)+ ")"
+			logger.warning( msg )
+			self.trigger_dbus_method = None
+
+		msg = "DEBUG: trigger's D-Bus method:|" +str(self.trigger_dbus_method)+ "|"
+		logger.debug( msg )
+
+	def close_dbus_trigger(self):
+
+		if self.trigger_dbus_method == None:
+			return
+
+		try:
+			self.trigger_dbus_method.close()
+		except Exception:
+			pass
+
+		self.trigger_dbus_method = None
+
+	# returns the command that the trigger helper should be pre-spawned with
+	# for the current trigger (the first command that the trigger would try)
+	def get_trigger_helper_argv(self):
+
+		# when racing, every mechanism is launched at once by
+		# race_trigger_commands(), so there's no single command to pre-spawn
+		if self.OS_NAME_SHORT != 'lin' or self.TRIGGER_STRATEGY == 'race':
+			return None
+
+		candidates = self.get_trigger_candidates_lin()
+		if len(candidates) == 0:
+			return None
+
+		return candidates[0][1]
+
+	# returns a list of (name, argv) tuples for each of the mechanisms that the
+	# current Linux trigger can use, in the order that they're tried serially
+	def get_trigger_candidates_lin(self):
+
+		if self.trigger == 'soft-shutdown':
+			candidates = list()
+			if self.trigger_softshutdown_lin_shutdown_path != None:
+				candidates.append(
+				 ( 'shutdown', [self.trigger_softshutdown_lin_shutdown_path, '-h', 'now'] )
+				)
+			if self.trigger_softshutdown_lin_poweroff_path != None:
+				candidates.append(
+				 ( 'poweroff', [self.trigger_softshutdown_lin_poweroff_path, '-h'] )
+				)
+			if self.trigger_softshutdown_lin_systemctl_path != None:
+				candidates.append(
+				 ( 'systemctl', [self.trigger_softshutdown_lin_systemctl_path, 'poweroff'] )
+				)
+			return candidates
+
+		return [
+		 ( 'xdg-screensaver', ['xdg-screensaver', 'lock'] ),
+		 ( 'xscreensaver', ['xscreensaver', '-lock'] ),
+		]
+
+	# launches all of the given (name, argv) candidates at once and returns the
+	# name of the first one to exit successfully, or None if none of them
+	# succeeded within 'deadline' seconds. Candidates that are still running
+	# when we return are left alone; a slow lock that also succeeds is harmless.
+	# The per-mechanism timings are logged and kept in 'trigger_race_results'
+	@tracing.traced
+	def race_trigger_commands(self, candidates, deadline=None):
+
+		if deadline == None:
+			deadline = self.trigger_race_deadline
+
+		start = time.monotonic()
+		finished = queue.Queue()
+
+		# one thread per candidate blocks on its process, so we learn about
+		# each exit immediately rather than by polling
+		def wait_for( result, process ):
+			try:
+				stdout, stderr = process.communicate()
+				result['stderr'] = stderr
+			except Exception as e:
+				result['error'] = str(e)
+			result['returncode'] = process.returncode
+			result['seconds'] = time.monotonic() - start
+			finished.put( result )
+
+		results = list()
+		running = 0
+		for name, argv in candidates:
+			result = {
+			 'name': name, 'argv': argv, 'returncode': None,
+			 'seconds': None, 'stderr': None, 'error': None
+			}
+			results.append( result )
+
+			try:
+				process = subprocess.Popen(
+				 argv,
+				 stdin = subprocess.DEVNULL,
+				 stdout = subprocess.DEVNULL,
+				 stderr = subprocess.PIPE,
+				 text = True
+				)
+			except Exception as e:
+				result['error'] = str(e)
+				result['seconds'] = time.monotonic() - start
+				continue
+
+			threading.Thread(
+			 target = wait_for, args = ( result, process ), daemon = True
+			).start()
+			running += 1
+
+		winner = None
+		while winner == None and running > 0:
+			remaining = start + deadline - time.monotonic()
+			if remaining <= 0:
+				break
+
+			try:
+				result = finished.get( timeout = remaining )
+			except queue.Empty:
+				break
+
+			running -= 1
+			if result['returncode'] == 0:
+				winner = result['name']
+
+		self.trigger_race_results = [ dict(result) for result in results ]
+
+		for result in self.trigger_race_results:
+			if result['seconds'] != None:
+				tracing.complete(
+				 'race ' +str(result['name']), start, result['seconds'],
+				 argv = result['argv'], returncode = result['returncode']
+				)
+
+		for result in self.trigger_race_results:
+			if result['seconds'] == None and winner == None:
+				outcome = "still running at deadline (" +str(deadline)+ "s)"
+			elif result['seconds'] == None:
+				outcome = "still running when `" +str(winner)+ "` won"
+			elif result['error'] != None:
+				outcome = "failed after " +str(round(result['seconds']*1000, 3))+ "ms (" +str(result['error'])+ ")"
+			else:
+				outcome = "returncode " +str(result['returncode'])+ " after " \
+				 +str(round(result['seconds']*1000, 3))+ "ms"
+				if result['returncode'] != 0:
+					outcome += " stderr|" +str(result['stderr'])+ "|"
+
+			msg = "DEBUG: Trigger race: `" +str(result['name'])+ "` " +outcome
+			logger.debug( msg )
+
+		if winner == None:
+			msg = "ERROR: None of the trigger's mechanisms succeeded within " +str(deadline)+ "s!"
+			logger.error( msg )
+		else:
+			msg = "INFO: Trigger race won by `" +str(winner)+ "`"
+			logger.info( msg )
+
+		return winner
+
+	# pre-spawns a helper process that already has the trigger's command
+	# resolved and just blocks until we tell it to exec() that command. This
+	# way the trigger doesn't have to wait on fork(), exec(), PATH lookups, and
+	# setting-up pipes at the moment that the cable is pulled (when the system
+	# may also be under heavy memory pressure)
+	def spawn_trigger_helper(self, argv=None):
+
+		self.kill_trigger_helper()
+
+		if argv == None:
+			argv = self.get_trigger_helper_argv()
+		if argv == None:
+			return
+
+		# resolve the path to the executable now, rather than when triggered
+		exe_path = self.capability_cache.which( argv[0] )
+		if exe_path == None:
+			msg = "DEBUG: Not spawning trigger helper; '" +str(argv[0])+ "' not found"
+			logger.debug( msg )
+			return
+
+		try:
+			self.trigger_helper = subprocess.Popen(
+			 ['/bin/sh', '-c', TRIGGER_HELPER_SCRIPT, 'buskill-trigger-helper', exe_path] + argv[1:],
+			 stdin = subprocess.PIPE,
+			 stdout = subprocess.PIPE,
+			 stderr = subprocess.PIPE,
+			 text = True
+			)
+			self.trigger_helper_argv = argv
+
+		except Exception as e:
+			msg = "WARNING: Unable to spawn trigger helper (" +str(e)+ ")"
+			logger.warning( msg )
+			self.trigger_helper = None
+			self.trigger_helper_argv = None
+			return
+
+		msg = "DEBUG: Spawned trigger helper (pid " +str(self.trigger_helper.pid)+ ") for " +str(argv)
+		logger.debug( msg )
+
+	def kill_trigger_helper(self):
+
+		if self.trigger_helper == None:
+			return
+
+		try:
+			self.trigger_helper.kill()
+			self.trigger_helper.communicate()
+		except Exception:
+			pass
+
+		self.trigger_helper = None
+		self.trigger_helper_argv = None
+
+	# executes the given command for a trigger, just like subprocess.run(). If
+	# the trigger helper was pre-spawned for this command, then we just tell it
+	# to exec() instead of spawning a new process
+	def run_trigger_command(self, argv):
+
+		helper = self.trigger_helper
+		if helper != None and self.trigger_helper_argv == argv and helper.poll() == None:
+
+			self.trigger_helper = None
+			self.trigger_helper_argv = None
+
+			try:
+				with tracing.span( 'subprocess.run', argv = argv, helper = True ):
+					stdout, stderr = helper.communicate( input='\n' )
+				result = subprocess.CompletedProcess( argv, helper.returncode, stdout, stderr )
+
+			except Exception as e:
+				msg = "WARNING: Trigger helper failed (" +str(e)+ "); falling back to subprocess"
+				logger.warning( msg )
+				result = None
+
+			# spawn a new helper in case the latch lets the trigger fire again
+			if self.TRIGGER_REARM_POLICY != 'disarm':
+				self.spawn_trigger_helper()
+
+			if result != None:
+				return result
+
+		return tracing.traced_run( argv, capture_output=True, text=True )
+
+	# LINUX
+
+	@tracing.traced
+	def triggerLin(self):
+
+		if self.trigger == 'soft-shutdown':
+			self.trigger_softshutdown_lin()
+		else:
+			self.trigger_lockscreen_lin()
+
+	# this function will lock the screen on linux machines
+	@tracing.traced
+	def trigger_lockscreen_lin(self):
+		msg = "DEBUG: BusKill lock-screen trigger executing now"
+		logger.debug( msg )
+
+		# first we try to lock with D-Bus, if we found a locker when we armed
+		if self.trigger_lin_dbus():
+			return
+
+		if self.TRIGGER_STRATEGY == 'race':
+			self.race_trigger_commands( self.get_trigger_candidates_lin() )
+			return
+
+		# then we try to lock with xdg-screensaver
+		self.trigger_lockscreen_lin_xdg()
+
+	# this function will gently shutdown a Linux machine
+	@tracing.traced
+	def trigger_softshutdown_lin(self):
 		msg = "DEBUG: BusKill soft-shutdown trigger executing now"
-		print( msg ); logger.debug( msg )
+		logger.debug( msg )
 
-		# first we try to shutdown with `shutdown`
+		# first we try to ask logind to power off, if it said we could when we
+		# armed
+		if self.trigger_lin_dbus():
+			return
+
+		if self.TRIGGER_STRATEGY == 'race':
+			self.race_trigger_commands( self.get_trigger_candidates_lin() )
+			return
+
+		# then we try to shutdown with `shutdown`
 		self.trigger_softshutdown_lin_shutdown()
 
+	# returns True if the trigger's D-Bus method was called successfully and
+	# that's enough to be sure it worked. Otherwise (eg logind's Session.Lock,
+	# which just signals a screen locker that may not exist) the caller must
+	# still try its fallbacks
+	@tracing.traced
+	def trigger_lin_dbus(self):
+
+		if self.trigger_dbus_method == None:
+			return False
+
+		try:
+			msg = "INFO: Attempting to call `" +str(self.trigger_dbus_method)+ "`"
+			logger.debug( msg )
+			self.trigger_dbus_method()
+
+			if not self.trigger_dbus_method.conclusive:
+				msg = "DEBUG: `" +str(self.trigger_dbus_method)+ "` may have done nothing; trying the fallbacks too"
+				logger.debug( msg )
+				return False
+
+			return True
+
+		except Exception as e:
+			# that didn't work; log it and try fallback
+			msg = "WARNING: Failed to call `" +str(self.trigger_dbus_method)+ "`! " +str(e)
+			logger.warning( msg )
+			return False
+
+	@tracing.traced
 	def trigger_lockscreen_lin_xdg(self):
 
 		try:
 			# first try to lock the screen with xdg-screensaver command
 			msg = "INFO: Attempting to execute `xdg-screensaver lock`"
-			print( msg ); logger.debug( msg )
-			result = subprocess.run( ['xdg-screensaver', 'lock'], capture_output=True, text=True )
+			logger.debug( msg )
+			result = self.run_trigger_command( ['xdg-screensaver', 'lock'] )
 
 			msg = "DEBUG: subprocess returncode|" +str(result.returncode)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			msg = "DEBUG: subprocess stdout|" +str(result.stdout)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			msg = "DEBUG: subprocess stderr|" +str(result.stderr)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			if result.returncode != 0:
 				# that didn't work; log it and try fallback
 				msg = "WARNING: Failed to execute `xdg-scrensaver lock`!"
-				print( msg ); logger.warning( msg )
+				logger.warning( msg )
 
 				self.trigger_lockscreen_lin_xscreensaver()
 
 		except Exception as e:
 			# that didn't work; log it and try fallback
 			msg = "WARNING: Failed to execute `xdg-scrensaver lock`!" +str(e)
-			print( msg ); logger.warning( msg )
+			logger.warning( msg )
 
 			self.trigger_lockscreen_lin_xscreensaver()
 
+	@tracing.traced
 	def trigger_lockscreen_lin_xscreensaver(self):
 
 		try:
 			# try to lock the screen with xscreensaver command
 			msg = "INFO: Attempting to execute `xscreensaver -lock`"
-			print( msg ); logger.debug( msg )
-			result = subprocess.run( ['xscreensaver', '-lock'], capture_output=True, text=True )
+			logger.debug( msg )
+			result = self.run_trigger_command( ['xscreensaver', '-lock'] )
 
 			msg = "DEBUG: subprocess returncode|" +str(result.returncode)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			msg = "DEBUG: subprocess stdout|" +str(result.stdout)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			msg = "DEBUG: subprocess stderr|" +str(result.stderr)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			if result.returncode != 0:
 				# that didn't work; log it and give up :(
 				msg = "ERROR: Failed to execute `xscreensaver -lock`! "
-				print( msg ); logger.error(msg)
+				logger.error( msg )
 
 		except Exception as e:
 			# that didn't work; log it and give up :(
 			msg = "ERROR: Failed to execute `xscreensaver -lock`! " +str(e)
-			print( msg ); logger.error(msg)
+			logger.error( msg )
 
+	@tracing.traced
 	def trigger_softshutdown_lin_shutdown(self):
 
 		try:
 			# try to shutdown with the `shutdown` command
 			msg = "INFO: Attempting to execute `shutdown -h now`"
-			print( msg ); logger.debug( msg )
-			result = subprocess.run(
-			 [self.trigger_softshutdown_lin_shutdown_path, '-h', 'now'],
-			 capture_output=True,
-			 text=True
+			logger.debug( msg )
+			result = self.run_trigger_command(
+			 [self.trigger_softshutdown_lin_shutdown_path, '-h', 'now']
 			)
 
 			msg = "DEBUG: subprocess returncode|" +str(result.returncode)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			msg = "DEBUG: subprocess stdout|" +str(result.stdout)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			msg = "DEBUG: subprocess stderr|" +str(result.stderr)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			if result.returncode != 0:
 				# that didn't work; log it and try fallback
 				msg = "WARNING: Failed to execute `shutdown -h now`!"
-				print( msg ); logger.warning( msg )
+				logger.warning( msg )
 
 				self.trigger_softshutdown_lin_poweroff()
 
 		except Exception as e:
 			# that didn't work; log it and try fallback
 			msg = "WARNING: Failed to execute `shutdown -h now`!"
-			print( msg ); logger.warning( msg )
+			logger.warning( msg )
 
 			self.trigger_softshutdown_lin_poweroff()
 
-	def trigger_softshutdown_lin_shutdown(self):
+	@tracing.traced
+	def trigger_softshutdown_lin_poweroff(self):
 
 		try:
 			# try to shutdown with the `poweroff` command
 			msg = "INFO: Attempting to execute `poweroff -h`"
-			print( msg ); logger.debug( msg )
-			result = subprocess.run(
-			 [self.trigger_softshutdown_lin_poweroff_path, '-h'],
-			 capture_output=True,
-			 text=True
+			logger.debug( msg )
+			result = self.run_trigger_command(
+			 [self.trigger_softshutdown_lin_poweroff_path, '-h']
 			)
 
 			msg = "DEBUG: subprocess returncode|" +str(result.returncode)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			msg = "DEBUG: subprocess stdout|" +str(result.stdout)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			msg = "DEBUG: subprocess stderr|" +str(result.stderr)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			if result.returncode != 0:
 				# that didn't work; log it and try fallback
 				msg = "WARNING: Failed to execute `poweroff -h`!"
-				print( msg ); logger.warning( msg )
+				logger.warning( msg )
 
 				self.trigger_softshutdown_lin_systemctl()
 
 		except Exception as e:
 			# that didn't work; log it and try fallback
 			msg = "WARNING: Failed to execute `poweroff -h`!"
-			print( msg ); logger.warning( msg )
+			logger.warning( msg )
 
 			self.trigger_softshutdown_lin_systemctl()
 
+	@tracing.traced
 	def trigger_softshutdown_lin_systemctl(self):
 
 		try:
 			# try to shutdown with the `systemctl` command
 			msg = "INFO: Attempting to execute `systemctl poweroff`"
-			print( msg ); logger.debug( msg )
-			result = subprocess.run(
-			 [self.trigger_softshutdown_lin_systemctl_path, 'poweroff'],
-			 capture_output=True,
-			 text=True
+			logger.debug( msg )
+			result = self.run_trigger_command(
+			 [self.trigger_softshutdown_lin_systemctl_path, 'poweroff']
 			)
 
 			msg = "DEBUG: subprocess returncode|" +str(result.returncode)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			msg = "DEBUG: subprocess stdout|" +str(result.stdout)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			msg = "DEBUG: subprocess stderr|" +str(result.stderr)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			if result.returncode != 0:
 				# that didn't work; log it and give up :(
 				msg = "ERROR: Failed to execute `systemctl poweroff`! "
-				print( msg ); logger.error(msg)
+				logger.error( msg )
 
 		except Exception as e:
 			# that didn't work; log it and give up :(
 			msg = "ERROR: Failed to execute `systemctl poweroff`! " +str(e)
-			print( msg ); logger.error(msg)
+			logger.error( msg )
 
 	# WINDOWS
 
+	@tracing.traced
 	def triggerWin(self):
 
 		if self.trigger == 'soft-shutdown':
@@ -1204,52 +2647,55 @@ class BusKill:
 		else:
 			self.trigger_lockscreen_win()
 
+	@tracing.traced
 	def trigger_lockscreen_win(self):
 
 		msg = "DEBUG: BusKill lock-screen trigger executing now"
-		print( msg ); logger.debug( msg )
+		logger.debug( msg )
 
 		try:
 			windll.user32.LockWorkStation()
 		except Exception as e:
 			msg = "ERROR: Failed to execute trigger!" +str(e)
-			print( msg ); logger.error( msg )
+			logger.error( msg )
 
+	@tracing.traced
 	def trigger_softshutdown_win(self):
 
 		msg = "DEBUG: BusKill soft-shutdown trigger executing now"
-		print( msg ); logger.debug( msg )
+		logger.debug( msg )
 
 		try:
 			# try to shutdown with the `shutdown` command
 			msg = "INFO: Attempting to execute `shutdown /s /f /t 1`"
-			print( msg ); logger.debug( msg )
-			result = subprocess.run(
+			logger.debug( msg )
+			result = tracing.traced_run(
 			 ['shutdown', '/s', '/f', '/t', '1'],
 			 capture_output=True,
 			 text=True
 			)
 
 			msg = "DEBUG: subprocess returncode|" +str(result.returncode)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			msg = "DEBUG: subprocess stdout|" +str(result.stdout)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			msg = "DEBUG: subprocess stderr|" +str(result.stderr)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			if result.returncode != 0:
 				# that didn't work; log it and give up :(
 				msg = "ERROR: Failed to execute `shutdown /s /f /t 1`! "
-				print( msg ); logger.error(msg)
+				logger.error( msg )
 
 		except Exception as e:
 			# that didn't work; log it and give up :(
 			msg = "ERROR: Failed to execute `shutdown /s /f /t /1`! " +str(e)
-			print( msg ); logger.error(msg)
+			logger.error( msg )
 
 	# MAC
+	@tracing.traced
 	def triggerMac(self):
 
 		if self.trigger == 'soft-shutdown':
@@ -1258,73 +2704,77 @@ class BusKill:
 			self.trigger_lockscreen_mac()
 
 	# this function will lock the screen on MacOS machines
+	@tracing.traced
 	def trigger_lockscreen_mac(self):
 		msg = "DEBUG: BusKill lockscreen trigger executing now"
-		print( msg ); logger.info( msg )
+		logger.info( msg )
 
 		# first we try to lock with CGSession
 		self.trigger_lockscreen_mac_cgsession()
 
 	# this function will gently shutdown a MacOS machine
+	@tracing.traced
 	def trigger_softshutdown_mac(self):
 		msg = "DEBUG: BusKill soft-shutdown trigger executing now"
-		print( msg ); logger.debug( msg )
+		logger.debug( msg )
 
 		# first we try to shutdown with `shutdown`
 		self.trigger_softshutdown_mac_shutdown()
 
+	@tracing.traced
 	def trigger_lockscreen_mac_cgsession(self):
 
 		try:
 			# this should work for most MacOS versions
 			msg = "INFO: Attempting to execute `CGSession -suspend`"
-			print( msg ); logger.debug( msg )
-			result = subprocess.run(
+			logger.debug( msg )
+			result = tracing.traced_run(
 			 ['/System/Library/CoreServices/Menu Extras/user.menu/Contents/Resources/CGSession', '-suspend'],
 			 capture_output=True, text=True
 			) 
 
 			msg = "DEBUG: subprocess returncode|" +str(result.returncode)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			msg = "DEBUG: subprocess stdout|" +str(result.stdout)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			msg = "DEBUG: subprocess stderr|" +str(result.stderr)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			if result.returncode != 0:
 				# that didn't work; log it and try fallback
 				msg = "WARNING: Failed to execute `CGSession -suspend`! "
-				print( msg ); logger.warning( msg )
+				logger.warning( msg )
 
 				self.trigger_lockscreen_mac_saclockscreen()
 
 		except Exception as e:
 			# that didn't work; log it and try fallback
 			msg = "WARNING: Failed to execute `CGSession -suspend`! " +str(e)
-			print( msg ); logger.warning(msg)
+			logger.warning( msg )
 
 			self.trigger_lockscreen_mac_saclockscreen()
 
+	@tracing.traced
 	def trigger_lockscreen_mac_saclockscreen(self):
 
 		try:
 			# try to lock the screen by calling `SACLockScreenImmediate()`
 			msg = "INFO: Attempting to call `SACLockScreenImmediate()`"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			login = ctypes.CDLL( '/System/Library/PrivateFrameworks/login.framework/login' )
 			result = login.SACLockScreenImmediate();
 
 			msg = "DEBUG: login.SACLockScreenImmediate() returncode|" +str(result)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			if result != 0:
 				# that didn't work; log it and try to turn on the screensaver and put
 				# the screen to sleep
 				msg = "ERROR: Failed to call `SACLockScreenImmediate()`!"
-				print( msg ); logger.error(msg)
+				logger.error( msg )
 
 				self.trigger_lockscreen_mac_screensaver()
 				self.trigger_lockscreen_mac_pmset()
@@ -1333,77 +2783,80 @@ class BusKill:
 			# that didn't work; log it and try to turn on the screensaver and put
 			# the screen to sleep
 			msg = "ERROR: Failed to call `SACLockScreenImmediate()`! " +str(e)
-			print( msg ); logger.error(msg)
+			logger.error( msg )
 
 			self.trigger_lockscreen_mac_screensaver()
 			self.trigger_lockscreen_mac_pmset()
 
+	@tracing.traced
 	def trigger_lockscreen_mac_screensaver(self):
 
 		try:
 			# try to lock the screen by enabling the screensaver
 			msg = "INFO: Attempting to execute `ScreenSaverEngine.app`"
-			print( msg ); logger.debug( msg )
-			result = subprocess.run(
+			logger.debug( msg )
+			result = tracing.traced_run(
 			 ['open', '-a', '/System/Library/CoreServices/ScreenSaverEngine.app'],
 			 capture_output=True, text=True
 			)
 
 			msg = "DEBUG: subprocess returncode|" +str(result.returncode)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			msg = "DEBUG: subprocess stdout|" +str(result.stdout)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			msg = "DEBUG: subprocess stderr|" +str(result.stderr)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			if result.returncode != 0:
 				# that didn't work; log it
 				msg = "ERROR: Failed to execute `ScrenSaverEngine.app`! "
-				print( msg ); logger.error(msg)
+				logger.error( msg )
 
 		except Exception as e:
 			# that didn't work; log it
 			msg = "ERROR: Failed to execute `ScrenSaverEngine.app`! " +str(e)
-			print( msg ); logger.error(msg)
+			logger.error( msg )
 
+	@tracing.traced
 	def trigger_lockscreen_mac_pmset(self):
 
 		try:
 			# try to lock the screen by putting the screen to sleep
 			msg = "INFO: Attempting to execute `pmset displaysleepnow`"
-			print( msg ); logger.debug( msg )
-			result = subprocess.run(
+			logger.debug( msg )
+			result = tracing.traced_run(
 			 ['pmset', 'displaysleepnow'],
 			 capture_output=True, text=True
 			)
 
 			msg = "DEBUG: subprocess returncode|" +str(result.returncode)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			msg = "DEBUG: subprocess stdout|" +str(result.stdout)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			msg = "DEBUG: subprocess stderr|" +str(result.stderr)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			if result.returncode != 0:
 				# that didn't work; log it
 				msg = "ERROR: Failed to execute `pmset displaysleepnow`!"
-				print( msg ); logger.error(msg)
+				logger.error( msg )
 
 		except Exception as e:
 			# that didn't work; log it
 			msg = "ERROR: Failed to execute `pmset displaysleepnow`! " +str(e)
-			print( msg ); logger.error(msg)
+			logger.error( msg )
 
+	@tracing.traced
 	def trigger_softshutdown_mac_shutdown(self):
 
 		try:
 			# try to send the 'soft-shutdown' command to the root child process
 			msg = "DEBUG: Attempting to send 'soft-shutdown' command to root child"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 			libc = ctypes.cdll.LoadLibrary(ctypes.util.find_library("c"))
 
@@ -1414,12 +2867,12 @@ class BusKill:
 			result = str( self.read_from_root_child_mac() )
 
 			msg = "DEBUG: Response from root-child:|" +str(result)+ "|"
-			print( msg ); logger.debug( msg )
+			logger.debug( msg )
 
 		except Exception as e:
 			# that didn't work; log it and give up :(
 			msg = "ERROR: Failed to send 'soft-shutdown' command to root child \n\t" +str(e)
-			print( msg ); logger.error(msg)
+			logger.error( msg )
 
 	#####################
 	# UPGRADE FUNCTIONS #
@@ -1450,12 +2903,12 @@ class BusKill:
 
 			except Exception as e:
 				msg = "DEBUG: Exception thrown in child process: " +str(e)+ "\n"
-				print( msg ); logger.debug( msg )
+				logger.debug( msg )
 
 				tb = traceback.format_exc()
 
 				msg = "DEBUG: Traceback: " +str(tb)
-				print( msg ); logger.debug( msg )
+				logger.debug( msg )
 
 				self._cconn.send((e, tb))
 
@@ -1465,6 +2918,7 @@ class BusKill:
 				self._exception = self._pconn.recv()
 			return self._exception
 
+	@buskill_profile.profiled
 	def wipeCache(self):
 
 		# first umount anything in the cache dir
@@ -1475,8 +2929,21 @@ class BusKill:
 		except:
 			pass
 
+		# the cache may hold a 200 MB archive and its extracted files (often on
+		# a usb drive), so rather than deleting it now, we atomically move it
+		# out of the way and delete it in a background thread. If we exit (or
+		# crash) before that finishes, the tombstone is deleted on our next run
 		if os.path.exists( self.CACHE_DIR ):
-			shutil.rmtree( self.CACHE_DIR )
+			try:
+				tombstone = tempfile.mkdtemp(
+				 prefix=CACHE_TOMBSTONE_PREFIX, dir=self.DATA_DIR
+				)
+				os.rename( self.CACHE_DIR, os.path.join( tombstone, 'cache' ) )
+			except OSError as e:
+				# eg on Windows, where a dir with open files can't be renamed
+				msg = "DEBUG: Unable to move the cache dir aside; deleting it now (" +str(e)+ ")"
+				logger.debug( msg )
+				shutil.rmtree( self.CACHE_DIR )
 
 		try:
 			os.makedirs( self.CACHE_DIR, mode=0o700 )
@@ -1484,49 +2951,34 @@ class BusKill:
 		except:
 			pass
 
-	# Takes the path (as a string) to a SHA256SUMS file and a list of paths to
-	# local files. Returns true only if all files' checksums are present in the
-	# SHA256SUMS file and their checksums match
-	def integrity_is_ok( self, sha256sums_filepath, local_filepaths ):
-
-		# first we parse the SHA256SUMS file and convert it into a dictionary
-		sha256sums = dict()
-		with open( sha256sums_filepath ) as fd:
-			for line in fd:
-				# sha256 hashes are exactly 64 characters long
-				checksum = line[0:64]
-
-				# there is one space followed by one metadata character between the
-				# checksum and the filename in the `sha256sum` command output
-				filename = os.path.split( line[66:] )[1].strip()
-				sha256sums[filename] = checksum
-
-		msg = 'DEBUG: sha256sums:|' +str(sha256sums)+ '|'
-		print( str(msg) ); logger.debug( msg )
-
-		# now loop through each file that we were asked to check and confirm its
-		# checksum matches what was listed in the SHA256SUMS file
-		for local_file in local_filepaths:
+		self.cache_reaper = threading.Thread(
+		 target=self.delete_cache_tombstones, daemon=True
+		)
+		self.cache_reaper.start()
 
-			local_filename = os.path.split( local_file )[1]
+	# deletes all the old cache dirs that wipeCache() moved aside, including
+	# any that were left by a previous run
+	def delete_cache_tombstones(self):
 
-			sha256sum = sha256()
-			with open( local_file, 'rb' ) as fd:
-	  			data_chunk = fd.read(1024)
-	  			while data_chunk:
-	  				sha256sum.update(data_chunk)
-	  				data_chunk = fd.read(1024)
+		try:
+			names = os.listdir( self.DATA_DIR )
+		except OSError:
+			return
 
-			checksum = sha256sum.hexdigest()
+		for name in names:
+			if not name.startswith( CACHE_TOMBSTONE_PREFIX ):
+				continue
 
-			msg = 'DEBUG: checksum:|' +str(checksum)+ "|\n"
-			msg+= 'DEBUG: sha256sums[local_filename]:|' +str(sha256sums[local_filename])+ '|'
-			print( str(msg) ); logger.debug( msg )
+			# another thread (or instance) may be deleting it too
+			shutil.rmtree( os.path.join( self.DATA_DIR, name ), ignore_errors=True )
 
-			if checksum != sha256sums[local_filename]:
-				return False
+	# Takes the path (as a string) to a SHA256SUMS file and a list of paths to
+	# local files. Returns true only if all files' checksums are present in the
+	# SHA256SUMS file and their checksums match
+	def integrity_is_ok( self, sha256sums_filepath, local_filepaths ):
 
-		return True
+		from . import upgrade
+		return upgrade.integrity_is_ok( sha256sums_filepath, local_filepaths )
 
 	def get_upgrade_status(self):
 
@@ -1629,7 +3081,7 @@ class BusKill:
 #		if self.upgrade_pool.is_alive():
 		if not self.upgrade_is_finished():
 			msg = 'upgrade() is still running'
-			print( "DEBUG: " + msg ); logger.debug( msg )
+			logger.debug( "DEBUG: " + msg )
 			raise RuntimeWarning( msg )
 
 		# TODO; confirm that merely dereferencing this pointer to the ctypes array
@@ -1666,421 +3118,24 @@ class BusKill:
 		self.UPGRADED_TO = { 'EXE_PATH': upgrade_result }
 		return upgrade_result
 
-	def upgrade(self):
-
-		self.set_upgrade_status( "Starting Upgrade.." )
-		msg = "DEBUG: Called upgrade()"
-		print( msg ); logger.debug( msg )
-
-		# Note: While this upgrade solution does cryptographically verify the
-		# authenticity and integrity of new versions, it is still vulnerable to
-		# at least the following attacks:
-		# 
-		#  1. Freeze attacks
-		#  2. Slow retrieval attacks
-		#
-		# The fix to this is to upgrade to TUF, once it's safe to do so. In the
-		# meantime, these attacks are not worth mitigating because [a] this app
-		# never auto-updates; it's always requires user input, [b] our app  in
-		# general is low-risk; it doesn't even access the internet outside of the
-		# update process, and [c] these attacks aren't especially severe
-
-		# TODO: switch to using TUF once TUF no longer requires us to install
-		#       untrusted software onto our cold-storage machine holding our
-		#       release private keys. For more info, see:
-		# 
-		#  * https://github.com/BusKill/buskill-app/issues/6
-		#  * https://github.com/theupdateframework/tuf/issues/1109
-
-		#########################
-		# UPGRADE SANITY CHECKS #
-		#########################
-
-		# only upgrade on linux, windows, and mac
-		if self.OS_NAME_SHORT == '':
-			msg = 'Upgrades not supported on this platform (' +CURRENT_PLATFORM+ ')'
-			print( "DEBUG: " + msg ); logger.debug( msg )
-			raise RuntimeWarning( msg )
-
-		# skip upgrade if we can't write to disk
-		if self.DATA_DIR == '':
-			msg = 'Unable to upgrade. No DATA_DIR.'
-			print( "DEBUG: " + msg ); logger.debug( msg )
-			raise RuntimeWarning( msg )
-
-		# make sure we can write to the dir where the new versions will be
-		# extracted
-		if not os.access(self.APPS_DIR, os.W_OK):
-			msg = 'Unable to upgrade. APPS_DIR not writeable (' +str(self.APPS_DIR)+ ')'
-			print( "DEBUG: " + msg ); logger.debug( msg )
-			raise RuntimeWarning( msg )
-
-		# make sure we can delete the executable itself
-		if not os.access( os.path.join(self.EXE_DIR, self.EXE_FILE), os.W_OK):
-			msg = 'Unable to upgrade. EXE_FILE not writeable (' +str( os.path.join(self.EXE_DIR, self.EXE_FILE) )+ ')'
-			print( "DEBUG: " + msg ); logger.debug( msg )
-			raise RuntimeWarning( msg )
-
-		#############
-		# SETUP GPG #
-		#############
-
-		# first, start with a clean cache
-		self.wipeCache()
+	# records how long the previous phase of upgrade() took (in our metrics)
+	# and starts timing the given phase. Pass None to just end the last phase
+	def upgrade_phase(self, phase):
 
-		# prepare our ephemeral gnupg home dir so we can verify the signature of our
-		# checksum file after download and before "install"
-		if os.path.exists( self.GNUPGHOME ):
-			shutil.rmtree( self.GNUPGHOME )
-		os.makedirs( self.GNUPGHOME, mode=0o700 )
-		os.chmod( self.GNUPGHOME, mode=0o0700 )
-
-		# get the contents of the KEYS file shipped with our software
-		try:
-			with open( os.path.join(APP_DIR, 'KEYS'), 'r' ) as fd:
-				KEYS = fd.read()
-		except:
-			# fall-back to one dir up if we're executing from 'src/'
-			with open( os.path.join( os.path.split(APP_DIR)[0], 'KEYS'), 'r' ) as fd:
-				KEYS = fd.read()
-
-		gpg = gnupg.GPG( gnupghome=self.GNUPGHOME )
-		gpg.import_keys( KEYS )
-
-		############################
-		# DETERMINE LATEST VERSION #
-		############################
-
-		metadata_filepath = os.path.join( self.CACHE_DIR, 'meta.json' )
-		signature_filepath = os.path.join( self.CACHE_DIR, 'meta.json.asc' )
-
-		# loop through each of our mirrors until we get one that's online
-		metadata = ''
-		random.shuffle(UPGRADE_MIRRORS)
-		for mirror in UPGRADE_MIRRORS:
-
-			# break out of loop if we've already downloaded the metadata from
-			# some mirror in our list
-			if os.path.exists( metadata_filepath ) \
-			 and os.path.exists( signature_filepath ):
-				break
-
-			self.set_upgrade_status( "Polling for latest update" )
-			msg = "DEBUG: Checking for updates at '" +str(mirror)+ "'"
-			print( msg ); logger.debug( msg )
-
-			# try to download the metadata json file and its detached signature
-			files = [ mirror, mirror + '.asc' ]
-			for f in files:
-
-				filename = f.split('/')[-1]
-				filepath = os.path.join( self.CACHE_DIR, filename )
-
-				try:
-					with urllib.request.urlopen( f, cafile=certifi.where() ) as url, \
-					 open( filepath, 'wb' ) as out_file:
-		
-						# the metadata definitely shouldn't be more than 1 MB
-						size_bytes = int(url.info().get('content-length'))
-						if size_bytes > 1048576:
-							msg = "\tMetadata too big; skipping (" +str(size_bytes)+ " bytes)"
-							print( msg ); logger.debug( msg )
-							break
-		
-						shutil.copyfileobj(url, out_file)
-						continue
-
-				except Exception as e:
-					msg = "\tFailed to fetch data from mirror; skipping (" +str(e)+ ")"
-					print( msg ); logger.debug( msg )
-					break
-
-		# CHECK SIGNATURE OF METADATA
-
-		self.set_upgrade_status( "Verifying metadata signature" )
-		msg = "\tDEBUG: Finished downloading update metadata. Checking signature."
-		print( msg ); logger.debug( msg )
-			
-		# open the detached signature and check it with gpg
-		with open( signature_filepath, 'rb' ) as fd:
-			verified = gpg.verify_file( fd, metadata_filepath )
-
-		# check that this main signature fingerprint meets our expectations
-		# bail if it a key was used other than the one we require
-		if verified.fingerprint != RELEASE_KEY_SUB_FINGERPRINT:
-			self.wipeCache()
-			msg = 'ERROR: Invalid signature fingerprint (expected '+str(RELEASE_KEY_SUB_FINGERPRINT)+' but got '+str(verified.fingerprint)+')! Please report this as a bug.'
-			print( msg ); logger.debug( msg )
-			raise RuntimeError( msg )
-
-		# extract from our list of signatures any signatures made with exactly the
-		# keys we'd expect (check the master key and the subkey fingerprints)
-		sig_info = [ verified.sig_info[key] for key in verified.sig_info if verified.sig_info[key]['fingerprint'] == RELEASE_KEY_SUB_FINGERPRINT and verified.sig_info[key]['pubkey_fingerprint'] == RELEASE_KEY_FINGERPRINT ]
-
-		# if we couldn't find a signature that matched our requirements, bail
-		if sig_info == list():
-			self.wipeCache()
-			msg = 'ERROR: No valid signature found! Please report this as a bug.'
-			print( msg ); logger.debug( msg )
-			raise RuntimeError( msg )
-
-		else:
-			sig_info = sig_info.pop()
-
-		# check both the list of signatures and this other one. why not?
-		# bail if either is an invalid signature
-		if verified.status != 'signature valid':
-			self.wipeCache()
-			msg = 'ERROR: No valid signature found! Please report this as a bug (' +str(sig_info)+ ').'
-			print( msg ); logger.debug( msg )
-			raise RuntimeError( msg )
-
-		if sig_info['status'] != 'signature valid':
-			self.wipeCache()
-			msg = 'ERROR: No valid sig_info signature found! Please report this as a bug (' +str(sig_info)+ ').'
-			print( msg ); logger.debug( msg )
-			raise RuntimeError( msg )
-
-		msg = "\tDEBUG: Signature is valid (" +str(sig_info)+ ")."
-		print( msg ); logger.debug( msg )
-
-		# try to load the metadata (this is done after signature so we don't load
-		# something malicious that may attack the json.loads() parser)
-		try:
-			with open( metadata_filepath, 'r' ) as fd:
-				metadata = json.loads( fd.read() ) 
-		except Exception as e:
-			msg = 'Unable to upgrade. Could not fetch metadata file (' +str(e)+ '.'
-			print( "DEBUG: " + msg ); logger.debug( msg )
-			raise RuntimeWarning( msg )
-			
-		# abort if it's empty
-		if metadata == '':
-			msg = 'Unable to upgrade. Could not fetch metadata contents.'
-			print( "DEBUG: " + msg ); logger.debug( msg )
-			raise RuntimeWarning( msg )
-
-		###########################
-		# DOWNLOAD LATEST VERSION #
-		###########################
-
-		# the only reason the SOURCE_DATE_EPOCH would be missing is if we're executing
-		# the python files directly (eg we're testing) and we can just get it from git
-		if BUSKILL_VERSION['SOURCE_DATE_EPOCH'] == '':
-			result = subprocess.run( [
-			 'git',
-			 '--git-dir=/home/user/sandbox/buskill-app/.git',
-			 'log',
-			 '-1',
-			 '--pretty=%ct'
-			], capture_output = True )
-			BUSKILL_VERSION['SOURCE_DATE_EPOCH'] = int( result.stdout )
-
-		# check metadata to see if there's a newer version than what we're running
-		latestRelease = metadata['latest']['buskill-app']['stable']
-		currentRelease = BUSKILL_VERSION['VERSION']
-
-		msg = "DEBUG: Current version: " +str(currentRelease)+ ".\n"
-		msg += "DEBUG: Latest version: " +str(latestRelease)+ "."
-		print( msg ); logger.debug( msg )
-
-		if LooseVersion(latestRelease) <= LooseVersion(currentRelease):
-			msg = "INFO: Current version is latest version. No new updates available."
-			print( msg ); logger.info( msg )
-			return self.set_upgrade_result( 1 )
-
-		# currently we only support x86_64 builds..
-		arch = 'x86_64'
-
-		sha256sums_urls = metadata['updates']['buskill-app'][str(latestRelease)]['SHA256SUMS']
-		sha256sums_filepath = os.path.join( self.CACHE_DIR, 'SHA256SUMS' )
-
-		signature_urls = metadata['updates']['buskill-app'][str(latestRelease)]['SHA256SUMS.asc']
-		signature_filepath = os.path.join( self.CACHE_DIR, 'SHA256SUMS.asc' )
-
-		archive_urls = metadata['updates']['buskill-app'][str(latestRelease)][self.OS_NAME_SHORT][arch]['archive']['url']
-		archive_filename = archive_urls[0].split('/')[-1]
-		archive_filepath = os.path.join( self.CACHE_DIR, archive_filename )
-
-		# shuffle all three URLs but shuffle them the same
-		start_state = random.getstate()
-		random.shuffle( archive_urls )
-		random.setstate( start_state)
-		random.shuffle( sha256sums_urls )
-		random.setstate( start_state)
-		random.shuffle( signature_urls )
-		random.setstate( start_state)
-
-		# loop through each of our downloads
-		files = [ signature_urls, sha256sums_urls, archive_urls ]
-		for f in files:
-
-			# break out of loop if we've already all necessary files from
-			# some mirror in our list
-			if os.path.exists( archive_filepath ) \
-			 and os.path.exists( sha256sums_filepath ) \
-			 and os.path.exists( signature_filepath ): \
-				break
-
-			# try to download the metadata json file and its detached signature
-			for download in f:
-
-				msg = "DEBUG: Attempting to download '" +str(download)+ "'"
-				print( msg ); logger.debug( msg )
-
-				filename = download.split('/')[-1]
-				filepath = os.path.join( self.CACHE_DIR, filename )
-
-				try:
-					with urllib.request.urlopen( download, cafile=certifi.where() ) as url, \
-					 open( filepath, 'wb' ) as out_file:
-		
-						# don't download any files >200 MB
-						size_bytes = int(url.info().get('content-length'))
-						self.set_upgrade_status( "Downloading " +str(filename)+ " (" +str(math.ceil(size_bytes/1024/1024))+ "MB)" )
-						if size_bytes > 209715200:
-							msg = "\tFile too big; skipping (" +str(size_bytes)+ " bytes)"
-							print( msg ); logger.debug( msg )
-							continue
-		
-						shutil.copyfileobj(url, out_file)
-						msg = "\tDone"
-						print( msg ); logger.debug( msg )
-						break
-
-				except Exception as e:
-					msg = "\tFailed to download update; skipping (" +str(e)+ ")"
-					print( msg ); logger.debug( msg )
-					continue
-
-		####################
-		# VERIFY SIGNATURE #
-		####################
-
-		self.set_upgrade_status( "Verifying signature" )
-		msg = "DEBUG: Finished downloading update files. Checking signature."
-		print( msg ); logger.debug( msg )
-
-		# open the detached signature and check it with gpg
-		with open( signature_filepath, 'rb' ) as fd:
-			verified = gpg.verify_file( fd, sha256sums_filepath )
-
-		# check that this main signature fingerprint meets our expectations
-		# bail if it a key was used other than the one we require
-		if verified.fingerprint != RELEASE_KEY_SUB_FINGERPRINT:
-			self.wipeCache()
-			msg = 'ERROR: Invalid signature fingerprint (expected '+str(RELEASE_KEY_SUB_FINGERPRINT)+' but got '+str(verified.fingerprint)+')! Please report this as a bug.'
-			print( msg ); logger.debug( msg )
-			raise RuntimeError( msg )
-
-		# extract from our list of signatures any signatures made with exactly the
-		# keys we'd expect (check the master key and the subkey fingerprints)
-		sig_info = [ verified.sig_info[key] for key in verified.sig_info if verified.sig_info[key]['fingerprint'] == RELEASE_KEY_SUB_FINGERPRINT and verified.sig_info[key]['pubkey_fingerprint'] == RELEASE_KEY_FINGERPRINT ]
-
-		# if we couldn't find a signature that matched our requirements, bail
-		if sig_info == list():
-			self.wipeCache()
-			msg = 'ERROR: No valid signature found! Please report this as a bug.'
-			print( msg ); logger.debug( msg )
-			raise RuntimeError( msg )
-
-		else:
-			sig_info = sig_info.pop()
-
-		# check both the list of signatures and this other one. why not?
-		# bail if either is an invalid signature
-		if verified.status != 'signature valid':
-			self.wipeCache()
-			msg = 'ERROR: No valid signature found! Please report this as a bug (' +str(sig_info)+ ').'
-			print( msg ); logger.debug( msg )
-			raise RuntimeError( msg )
-
-		if sig_info['status'] != 'signature valid':
-			self.wipeCache()
-			msg = 'ERROR: No valid sig_info signature found! Please report this as a bug (' +str(sig_info)+ ').'
-			print( msg ); logger.debug( msg )
-			raise RuntimeError( msg )
-
-		msg = "DEBUG: Signature is valid (" +str(sig_info)+ ")."
-		print( msg ); logger.debug( msg )
-
-		####################
-		# VERIFY INTEGRITY #
-		####################
-
-		if not self.integrity_is_ok( sha256sums_filepath, [ archive_filepath ] ):
-			self.wipeCache()
-			msg = 'ERROR: Integrity check failed. '
-			print( msg ); logger.debug( msg )
-			raise RuntimeError( msg )
-
-		self.set_upgrade_status( "Verifying integrity" )
-		msg = "DEBUG: New version's integrity is valid."
-		print( msg ); logger.debug( msg )
-
-		###########
-		# INSTALL #
-		###########
-		
-		self.set_upgrade_status( "Extracting archive" )
-		msg = "DEBUG: Extracting '" +str(archive_filepath)+ "' to '" +str(self.APPS_DIR)+ "'"
-		print( msg ); logger.debug( msg )
-
-		if self.OS_NAME_SHORT == 'lin':
-		
-			import tarfile
-			with tarfile.open( archive_filepath ) as archive_tarfile:
-
-				# get the path to the new executable
-				new_version_exe = [ file for file in archive_tarfile.getnames() if re.match( ".*buskill-[^/]+\.AppImage$", file ) ][0]
-				new_version_exe = self.APPS_DIR + '/' + new_version_exe
-				archive_tarfile.extractall( path=self.APPS_DIR )
-
-		elif self.OS_NAME_SHORT == 'win':
-
-			import zipfile
-			with zipfile.ZipFile( archive_filepath ) as archive_zipfile:
-
-				# get the path to the new executable
-				new_version_exe = [ file for file in archive_zipfile.namelist() if re.match( ".*buskill\.exe$", file ) ][0]
-				new_version_exe = self.APPS_DIR + '\\' + new_version_exe
-
-				archive_zipfile.extractall( path=self.APPS_DIR )
+		now = time.monotonic()
+		if self.upgrade_phase_name != None:
+			self.metrics.observe(
+			 'upgrade_phase_seconds',
+			 now - self.upgrade_phase_started,
+			 self.upgrade_phase_name
+			)
 
-		elif self.OS_NAME_SHORT == 'mac':
+		self.upgrade_phase_name = phase
+		self.upgrade_phase_started = now
 
-			# create a new dir where we'll mount the dmg temporarily (since we can't
-			# extract DMGs and the python modules for extracting 7zip archives
-			# has many dependencies [so we don't use it])
-			dmg_mnt_path = os.path.join( self.CACHE_DIR, 'dmg_mnt' )
-			os.makedirs( dmg_mnt_path, mode=0o700 )
-			os.chmod( dmg_mnt_path, mode=0o0700 )
-
-			# mount the dmg, copy the .app out, and unmount
-			subprocess.run( ['hdiutil', 'attach', '-mountpoint', dmg_mnt_path, archive_filepath] )
-			app_path = os.listdir( dmg_mnt_path ).pop()
-			shutil.copytree( dmg_mnt_path +'/'+ app_path, self.APPS_DIR + '/' + app_path )
-			subprocess.run( ['hdiutil', 'detach', dmg_mnt_path] )
-
-			new_version_exe = self.APPS_DIR+ '/' +app_path+ '/Contents/MacOS/buskill'
-
-		# create a file in new version's EXE_DIR so that it will know where the
-		# old version lives and be able to delete it on its first execution
-		contents = { 'APP_DIR': self.APP_DIR }
-		new_version_exe_dir = os.path.abspath(
-		 os.path.join( new_version_exe, os.pardir)
-		)
-		with open( os.path.join( new_version_exe_dir, 'upgraded_from.py' ), 'w' ) as fd:
-			fd.write( 'UPGRADED_FROM = ' +str(contents) )
-		
-		# create a file in this current (now outdated) version's EXE_DIR so that
-		# it will be able to prompt the user to execute the newer version if they
-		# open this older version by mistake in the future
-		self.UPGRADED_TO = { 'EXE_PATH': new_version_exe }
-		with open( os.path.join( self.EXE_DIR, 'upgraded_to.py' ), 'w' ) as fd:
-			fd.write( 'UPGRADED_TO = ' +str(self.UPGRADED_TO) )
-
-		msg = "INFO: Installed new version executable to  '" +str(new_version_exe)
-		print( msg ); logger.info( msg )
+	# downloads, verifies, and installs the latest version. This imports
+	# upgrade.py (see above)
+	def upgrade(self):
 
-		return self.set_upgrade_result( new_version_exe )
+		from . import upgrade
+		return upgrade.upgrade( self )
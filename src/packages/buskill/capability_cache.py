@@ -0,0 +1,304 @@
+#!/usr/bin/env python3.7
+"""
+::
+
+  File:    packages/buskill/capability_cache.py
+
+This is what BusKill learned about the machine that it's running on: where the soft-shutdown binaries are, where the trigger's commands are in $PATH, which D-Bus screen locker worked, and whether libusb supports hotplug events. Finding these out costs filesystem lookups and D-Bus round-trips every time the user sets a trigger or arms, so they're stored in the DATA_DIR and loaded on the next launch.
+
+The profile is only loaded if it was made on the same OS release and kernel version. After it's loaded, everything (including the mtimes of the binaries that it found) is probed again in a background thread, and the profile is updated (in memory and on disk) if anything changed. libusb's hotplug support is instead keyed on libusb's version and the library that it was loaded from (and its mtime), and it's probed again when they change.
+
+For more info, see: https://buskill.in/
+"""
+
+################################################################################
+#                                   IMPORTS                                    #
+################################################################################
+
+import json, multiprocessing.util, os, platform, shutil, tempfile, threading
+
+import logging
+logger = logging.getLogger( __name__ )
+
+################################################################################
+#                                  SETTINGS                                    #
+################################################################################
+
+CAPABILITY_CACHE_FILE_NAME = 'capabilities.json'
+
+# increment this when the format of the profile changes
+CAPABILITY_CACHE_VERSION = 1
+
+# list of paths where binaries like 'shutdown' could be
+SHUTDOWN_BIN_PATHS = [
+ os.sep+'sbin',
+ os.sep+'usr'+os.sep+'sbin',
+ os.sep+'bin',
+ os.sep+'usr'+os.sep+'bin'
+]
+SHUTDOWN_BINARIES = [ 'shutdown', 'poweroff', 'systemctl' ]
+
+# the commands that the triggers run from $PATH
+TRIGGER_COMMANDS = [ 'xdg-screensaver', 'xscreensaver' ]
+
+################################################################################
+#                                 FUNCTIONS                                    #
+################################################################################
+
+# returns what the profile is keyed on (besides the binaries' mtimes)
+def get_system_key():
+
+	try:
+		with open( '/etc/os-release' ) as f:
+			os_release = f.read()
+	except OSError:
+		os_release = platform.version()
+
+	return {
+	 'version': CAPABILITY_CACHE_VERSION,
+	 'os_release': os_release,
+	 'kernel': platform.release(),
+	}
+
+# returns a dict of the paths to each of the SHUTDOWN_BINARIES (or None if we
+# can't find it). If a binary is in many of the SHUTDOWN_BIN_PATHS, the last
+# one wins
+def probe_shutdown_binaries():
+
+	binaries = dict.fromkeys( SHUTDOWN_BINARIES )
+	for path in SHUTDOWN_BIN_PATHS:
+		for binary in SHUTDOWN_BINARIES:
+			binary_path = path + os.sep + binary
+			if os.path.exists( binary_path ):
+				binaries[binary] = binary_path
+
+	return binaries
+
+# returns a dict of the paths to each of the TRIGGER_COMMANDS in $PATH (or
+# None if it's not installed)
+def probe_trigger_commands():
+	return { command: shutil.which( command ) for command in TRIGGER_COMMANDS }
+
+# returns a dict of the mtime of each of the given paths that exists
+def get_mtimes( paths ):
+
+	mtimes = dict()
+	for path in paths:
+		if path == None:
+			continue
+		try:
+			mtimes[path] = os.stat( path ).st_mtime
+		except OSError:
+			pass
+
+	return mtimes
+
+# returns what libusb's hotplug support is keyed on (its version and the
+# library that it was loaded from), or None if the given usb1 module can't
+# tell us
+def get_libusb_key( usb1 ):
+
+	try:
+		version = usb1.getVersion()
+		path = usb1.libusb1.libusb._name
+	except Exception:
+		return None
+
+	return {
+	 'version': '.'.join( str(part) for part in version[:4] ),
+	 'path': path,
+	 'mtimes': get_mtimes( [ path ] ),
+	}
+
+# a forked child gets a copy of the lock in whatever state it was in. If the
+# revalidate thread (which doesn't exist in the child) held it, then nobody
+# would ever release it, so the child gets a fresh one
+def after_fork_in_child( cache ):
+
+	cache.lock = threading.Lock()
+	cache.revalidate_thread = None
+
+################################################################################
+#                                   OBJECTS                                    #
+################################################################################
+
+class CapabilityCache:
+
+	# path = the file in which the profile is stored, or None to only keep it
+	#        in memory
+	def __init__( self, path=None ):
+
+		self.path = path
+		self.lock = threading.Lock()
+		self.revalidate_thread = None
+		multiprocessing.util.register_after_fork( self, after_fork_in_child )
+
+		# the profile has the keys:
+		#  * 'shutdown_binaries' = see probe_shutdown_binaries()
+		#  * 'trigger_commands'  = see probe_trigger_commands()
+		#  * 'mtimes'            = see get_mtimes()
+		#  * 'screen_locker'     = the destination of the D-Bus screen locker that
+		#                          worked last time
+		#  * 'libusb_hotplug'    = whether libusb has CAP_HAS_HOTPLUG, and the
+		#                          get_libusb_key() that it was probed with
+		self.profile = dict()
+
+	# threads & locks can't be pickled, so a child process gets a copy of the
+	# profile (and its own lock)
+	def __getstate__( self ):
+
+		state = self.__dict__.copy()
+		del state['lock']
+		del state['revalidate_thread']
+		state['profile'] = dict( self.profile )
+		return state
+
+	def __setstate__( self, state ):
+
+		self.__dict__.update( state )
+		self.lock = threading.Lock()
+		self.revalidate_thread = None
+
+	# loads the profile from disk. Returns True if there was one and it was made
+	# on this OS release and kernel version
+	def load( self ):
+
+		if self.path == None:
+			return False
+
+		try:
+			with open( self.path ) as cache_file:
+				cached = json.load( cache_file )
+			key = cached['key']
+			profile = cached['profile']
+		except (OSError, ValueError, KeyError, TypeError):
+			return False
+
+		if key != get_system_key() or not isinstance( profile, dict ):
+			msg = "DEBUG: Ignoring the capability cache; the system changed"
+			logger.debug( msg )
+			return False
+
+		with self.lock:
+			self.profile = profile
+
+		return True
+
+	def save( self ):
+
+		if self.path == None:
+			return
+
+		with self.lock:
+			contents = json.dumps( { 'key': get_system_key(), 'profile': self.profile } )
+
+		# write it to a temp file that we rename over the cache, so that it's
+		# never half-written
+		try:
+			fd, tmp_path = tempfile.mkstemp(
+			 dir=os.path.dirname( self.path ), prefix=CAPABILITY_CACHE_FILE_NAME
+			)
+			with os.fdopen( fd, 'w' ) as tmp_file:
+				tmp_file.write( contents )
+			os.replace( tmp_path, self.path )
+		except OSError as e:
+			msg = "DEBUG: Unable to write the capability cache to '" +str(self.path)+ "' (" +str(e)+ ")"
+			logger.debug( msg )
+
+	# probes everything again (except the screen locker, which is re-learned
+	# when we arm) and updates the profile if anything changed
+	def revalidate( self ):
+
+		fresh = {
+		 'shutdown_binaries': probe_shutdown_binaries(),
+		 'trigger_commands': probe_trigger_commands(),
+		}
+		fresh['mtimes'] = get_mtimes(
+		 list( fresh['shutdown_binaries'].values() ) + \
+		 list( fresh['trigger_commands'].values() )
+		)
+
+		with self.lock:
+			changed = [ key for key in fresh if self.profile.get( key ) != fresh[key] ]
+			self.profile.update( fresh )
+
+			# if the binaries changed, then so may have the desktop
+			if 'mtimes' in changed:
+				self.profile.pop( 'screen_locker', None )
+
+		if changed:
+			msg = "DEBUG: Updating the capability cache (" +', '.join( changed )+ " changed)"
+			logger.debug( msg )
+			self.save()
+
+	def revalidate_bg( self ):
+
+		self.revalidate_thread = threading.Thread(
+		 target=self.revalidate, daemon=True
+		)
+		self.revalidate_thread.start()
+
+	# returns the value of 'key' in the profile. If it's not there, then it's
+	# set to what probe() returns
+	def get( self, key, probe ):
+
+		with self.lock:
+			if key in self.profile:
+				return self.profile[key]
+
+		value = probe()
+		with self.lock:
+			self.profile[key] = value
+		self.save()
+
+		return value
+
+	def get_shutdown_binaries( self ):
+		return self.get( 'shutdown_binaries', probe_shutdown_binaries )
+
+	# like shutil.which(), but the TRIGGER_COMMANDS are looked-up in the profile
+	def which( self, command ):
+
+		if command not in TRIGGER_COMMANDS:
+			return shutil.which( command )
+
+		return self.get( 'trigger_commands', probe_trigger_commands ).get( command )
+
+	# returns whether libusb supports hotplug events (or None if we can't tell).
+	# Unlike get(), the cached answer is only used if it was probed with the
+	# same libusb
+	def has_hotplug( self, usb1 ):
+
+		key = get_libusb_key( usb1 )
+		if key == None:
+			return None
+
+		with self.lock:
+			cached = self.profile.get( 'libusb_hotplug' )
+		if isinstance( cached, dict ) and cached.get( 'key' ) == key:
+			return cached.get( 'has_hotplug' )
+
+		try:
+			has_hotplug = bool( usb1.hasCapability( usb1.CAP_HAS_HOTPLUG ) )
+		except Exception:
+			return None
+
+		with self.lock:
+			self.profile['libusb_hotplug'] = { 'key': key, 'has_hotplug': has_hotplug }
+		self.save()
+
+		return has_hotplug
+
+	def get_screen_locker( self ):
+
+		with self.lock:
+			return self.profile.get( 'screen_locker' )
+
+	def set_screen_locker( self, destination ):
+
+		with self.lock:
+			if self.profile.get( 'screen_locker' ) == destination:
+				return
+			self.profile['screen_locker'] = destination
+
+		self.save()
@@ -0,0 +1,614 @@
+#!/usr/bin/env python3.7
+"""
+::
+
+  File:    packages/buskill/dbus_lin.py
+
+This is a minimal Linux-only D-Bus client, written with just the python standard library so that it doesn't add another dependency to the AppImage. It only knows how to authenticate, marshal method calls whose arguments are basic types, and read their replies -- which is all that we need to ask a desktop's screen locker (or logind) to lock the screen, or logind to power off the machine, with a single message over a connection that was opened when BusKill was armed.
+
+For more info, see: https://buskill.in/
+"""
+
+################################################################################
+#                                   IMPORTS                                    #
+################################################################################
+
+import os, socket, struct, threading, time, urllib.parse
+
+import logging
+logger = logging.getLogger( __name__ )
+
+################################################################################
+#                                  SETTINGS                                    #
+################################################################################
+
+# the system bus' address if $DBUS_SYSTEM_BUS_ADDRESS isn't set
+DEFAULT_SYSTEM_BUS_ADDRESS = 'unix:path=/var/run/dbus/system_bus_socket'
+
+# how long (in seconds) we wait for the bus or a service to answer
+DEFAULT_TIMEOUT = 2
+
+# message types
+METHOD_CALL = 1
+METHOD_RETURN = 2
+ERROR = 3
+SIGNAL = 4
+
+# message flags
+FLAG_NO_REPLY_EXPECTED = 0x1
+
+# header fields, and the signature of their values
+HEADER_FIELDS = {
+ 1: ( 'path', 'o' ),
+ 2: ( 'interface', 's' ),
+ 3: ( 'member', 's' ),
+ 4: ( 'error_name', 's' ),
+ 5: ( 'reply_serial', 'u' ),
+ 6: ( 'destination', 's' ),
+ 7: ( 'sender', 's' ),
+ 8: ( 'signature', 'g' ),
+}
+
+# the fixed-size basic types: ( struct format, size )
+FIXED_TYPES = {
+ 'y': ( 'B', 1 ),
+ 'b': ( 'I', 4 ),
+ 'n': ( 'h', 2 ),
+ 'q': ( 'H', 2 ),
+ 'i': ( 'i', 4 ),
+ 'u': ( 'I', 4 ),
+ 'x': ( 'q', 8 ),
+ 't': ( 'Q', 8 ),
+ 'd': ( 'd', 8 ),
+ 'h': ( 'I', 4 ),
+}
+
+################################################################################
+#                                 FUNCTIONS                                    #
+################################################################################
+
+def session_bus_address():
+	return os.environ.get( 'DBUS_SESSION_BUS_ADDRESS' )
+
+def system_bus_address():
+	return os.environ.get( 'DBUS_SYSTEM_BUS_ADDRESS', DEFAULT_SYSTEM_BUS_ADDRESS )
+
+# takes a D-Bus server address (eg 'unix:path=/run/user/1000/bus') and returns
+# a list of the paths that we can connect() an AF_UNIX socket to. Abstract
+# sockets are prefixed with a null byte
+def parse_address( address ):
+
+	paths = list()
+	for entry in address.split( ';' ):
+		transport, sep, options = entry.partition( ':' )
+		if transport != 'unix':
+			continue
+
+		for option in options.split( ',' ):
+			key, sep, value = option.partition( '=' )
+			value = urllib.parse.unquote( value )
+			if key == 'path':
+				paths.append( value )
+			elif key == 'abstract':
+				paths.append( '\0' + value )
+
+	return paths
+
+# returns the alignment of the given (single complete) type signature
+def alignment( signature ):
+
+	if signature[0] in FIXED_TYPES:
+		return FIXED_TYPES[ signature[0] ][1]
+	if signature[0] in 'sao':
+		return 4
+	if signature[0] in '({':
+		return 8
+	return 1
+
+# splits a signature into a list of single complete types. We only need to
+# handle basic types, variants, and arrays of those
+def split_signature( signature ):
+
+	types = list()
+	i = 0
+	while i < len(signature):
+		start = i
+		while signature[i] == 'a':
+			i += 1
+		if signature[i] in '({':
+			raise ValueError( "Unsupported D-Bus signature '" +str(signature)+ "'" )
+		i += 1
+		types.append( signature[start:i] )
+
+	return types
+
+################################################################################
+#                                   OBJECTS                                    #
+################################################################################
+
+class DBusError(Exception):
+
+	def __init__( self, name, text='' ):
+		super().__init__( str(name) + ': ' + str(text) )
+		self.name = name
+		self.text = text
+
+class Message:
+
+	def __init__( self, message_type, serial=0, flags=0, body=None, **fields ):
+
+		self.type = message_type
+		self.serial = serial
+		self.flags = flags
+		self.body = body or list()
+
+		for name, signature in HEADER_FIELDS.values():
+			setattr( self, name, fields.get( name ) )
+
+# builds the bytes of a (little-endian) message
+class Writer:
+
+	def __init__( self ):
+		self.buffer = bytearray()
+
+	def align( self, size ):
+		self.buffer += b'\0' * ( -len(self.buffer) % size )
+
+	def write( self, signature, value ):
+
+		code = signature[0]
+		self.align( alignment( signature ) )
+
+		if code in FIXED_TYPES:
+			fmt, size = FIXED_TYPES[code]
+			self.buffer += struct.pack( '<' + fmt, int(value) if code == 'b' else value )
+
+		elif code in 'so':
+			encoded = value.encode( 'utf-8' )
+			self.buffer += struct.pack( '<I', len(encoded) ) + encoded + b'\0'
+
+		elif code == 'g':
+			encoded = value.encode( 'ascii' )
+			self.buffer += struct.pack( '<B', len(encoded) ) + encoded + b'\0'
+
+		elif code == 'v':
+			value_signature, value = value
+			self.write( 'g', value_signature )
+			self.write( value_signature, value )
+
+		elif code == 'a':
+			length_at = len(self.buffer)
+			self.buffer += b'\0\0\0\0'
+			self.align( alignment( signature[1:] ) )
+			start = len(self.buffer)
+			for item in value:
+				self.write( signature[1:], item )
+			struct.pack_into( '<I', self.buffer, length_at, len(self.buffer) - start )
+
+		else:
+			raise ValueError( "Unsupported D-Bus type '" +str(signature)+ "'" )
+
+	def write_header_fields( self, fields ):
+
+		length_at = len(self.buffer)
+		self.buffer += b'\0\0\0\0'
+		self.align( 8 )
+		start = len(self.buffer)
+		for code, signature, value in fields:
+			self.align( 8 )
+			self.buffer += struct.pack( '<B', code )
+			self.write( 'v', ( signature, value ) )
+		struct.pack_into( '<I', self.buffer, length_at, len(self.buffer) - start )
+
+# parses the bytes of a message in either byte order
+class Reader:
+
+	def __init__( self, data, endian ):
+		self.data = data
+		self.endian = endian
+		self.offset = 0
+
+	def align( self, size ):
+		self.offset += -self.offset % size
+
+	def read( self, signature ):
+
+		code = signature[0]
+		self.align( alignment( signature ) )
+
+		if code in FIXED_TYPES:
+			fmt, size = FIXED_TYPES[code]
+			value, = struct.unpack_from( self.endian + fmt, self.data, self.offset )
+			self.offset += size
+			return bool(value) if code == 'b' else value
+
+		elif code in 'so':
+			length, = struct.unpack_from( self.endian + 'I', self.data, self.offset )
+			self.offset += 4
+			value = self.data[ self.offset : self.offset + length ].decode( 'utf-8', 'replace' )
+			self.offset += length + 1
+			return value
+
+		elif code == 'g':
+			length = self.data[ self.offset ]
+			value = self.data[ self.offset + 1 : self.offset + 1 + length ].decode( 'ascii' )
+			self.offset += length + 2
+			return value
+
+		elif code == 'v':
+			value_signature = self.read( 'g' )
+			return self.read( value_signature )
+
+		elif code == 'a':
+			length, = struct.unpack_from( self.endian + 'I', self.data, self.offset )
+			self.offset += 4
+			self.align( alignment( signature[1:] ) )
+			end = self.offset + length
+			items = list()
+			while self.offset < end:
+				items.append( self.read( signature[1:] ) )
+			return items
+
+		raise ValueError( "Unsupported D-Bus type '" +str(signature)+ "'" )
+
+class DBusConnection:
+
+	# address = the bus' address (eg 'unix:path=/run/user/1000/bus')
+	def __init__( self, address, timeout=DEFAULT_TIMEOUT ):
+
+		if address == None:
+			raise DBusError( 'org.freedesktop.DBus.Error.BadAddress', 'No bus address' )
+
+		self.serial = 0
+		self.buffer = b''
+		self.lock = threading.Lock()
+		self.sock = None
+
+		for path in parse_address( address ):
+			try:
+				self.sock = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM | socket.SOCK_CLOEXEC )
+				self.sock.settimeout( timeout )
+				self.sock.connect( path )
+				break
+			except OSError:
+				self.sock.close()
+				self.sock = None
+
+		if self.sock == None:
+			raise DBusError( 'org.freedesktop.DBus.Error.NoServer', 'Unable to connect to ' +str(address) )
+
+		try:
+			self.authenticate()
+			self.unique_name = self.call(
+			 'org.freedesktop.DBus', '/org/freedesktop/DBus', 'org.freedesktop.DBus',
+			 'Hello', timeout=timeout
+			)[0]
+		except:
+			self.close()
+			raise
+
+	# the only auth mechanism that we support is EXTERNAL; the bus checks our
+	# uid with SO_PEERCRED
+	def authenticate( self ):
+
+		uid = str( os.getuid() ).encode( 'ascii' ).hex().encode( 'ascii' )
+		self.sock.sendall( b'\0AUTH EXTERNAL ' + uid + b'\r\n' )
+
+		while b'\r\n' not in self.buffer:
+			self.buffer += self.recv()
+		line, sep, self.buffer = self.buffer.partition( b'\r\n' )
+
+		if not line.startswith( b'OK ' ):
+			raise DBusError( 'org.freedesktop.DBus.Error.AuthFailed', line.decode( 'ascii', 'replace' ) )
+
+		self.sock.sendall( b'BEGIN\r\n' )
+
+	def recv( self ):
+
+		data = self.sock.recv( 65536 )
+		if data == b'':
+			raise DBusError( 'org.freedesktop.DBus.Error.Disconnected', 'Connection closed' )
+		return data
+
+	# blocks until at least 'length' bytes are buffered. If this times-out,
+	# whatever was already received stays in the buffer for the next try
+	def fill( self, length ):
+
+		while len(self.buffer) < length:
+			self.buffer += self.recv()
+
+	def send( self, message, signature='', args=() ):
+
+		self.serial += 1
+		message.serial = self.serial
+
+		body = Writer()
+		for arg_signature, arg in zip( split_signature( signature ), args ):
+			body.write( arg_signature, arg )
+
+		fields = list()
+		for code, ( name, field_signature ) in HEADER_FIELDS.items():
+			value = getattr( message, name )
+			if name == 'signature':
+				value = signature or None
+			if value != None:
+				fields.append( ( code, field_signature, value ) )
+
+		header = Writer()
+		header.buffer += struct.pack(
+		 '<cBBBII', b'l', message.type, message.flags, 1, len(body.buffer), message.serial
+		)
+		header.write_header_fields( fields )
+		header.align( 8 )
+
+		self.sock.sendall( bytes(header.buffer + body.buffer) )
+		return message.serial
+
+	# blocks until the next message arrives (or 'timeout' seconds pass) and
+	# returns it as a Message
+	def recv_message( self, timeout=None ):
+
+		self.sock.settimeout( timeout )
+
+		self.fill( 16 )
+		endian = '<' if self.buffer[0:1] == b'l' else '>'
+		message_type, flags, version, body_length, serial, fields_length = \
+		 struct.unpack_from( endian + 'xBBBIII', self.buffer )
+
+		header_length = 16 + fields_length
+		header_length += -header_length % 8
+		self.fill( header_length + body_length )
+		data = self.buffer[ : header_length + body_length ]
+		self.buffer = self.buffer[ header_length + body_length : ]
+
+		reader = Reader( data, endian )
+		reader.offset = 16
+		fields = dict()
+		while reader.offset < 16 + fields_length:
+			reader.align( 8 )
+			code = reader.read( 'y' )
+			value = reader.read( 'v' )
+			if code in HEADER_FIELDS:
+				fields[ HEADER_FIELDS[code][0] ] = value
+
+		message = Message( message_type, serial, flags, **fields )
+
+		reader = Reader( data[header_length:], endian )
+		try:
+			for arg_signature in split_signature( message.signature or '' ):
+				message.body.append( reader.read( arg_signature ) )
+		except ValueError:
+			# we can't parse this body, but we may still be able to use the header
+			message.body = None
+
+		return message
+
+	# calls a method and returns the list of values in its reply. Raises a
+	# DBusError if the method returns an error or doesn't reply in time
+	def call( self, destination, path, interface, member, signature='', args=(), timeout=DEFAULT_TIMEOUT ):
+
+		with self.lock:
+			serial = self.send( Message(
+			 METHOD_CALL, destination=destination, path=path,
+			 interface=interface, member=member
+			), signature, args )
+
+			deadline = time.monotonic() + timeout
+			while True:
+				remaining = deadline - time.monotonic()
+				if remaining <= 0:
+					raise DBusError( 'org.freedesktop.DBus.Error.NoReply', str(member) + ' timed out' )
+
+				try:
+					reply = self.recv_message( remaining )
+				except socket.timeout:
+					continue
+
+				# drop signals (eg NameAcquired) and anything else not for us
+				if reply.reply_serial != serial:
+					continue
+
+				if reply.type == ERROR:
+					text = reply.body[0] if reply.body else ''
+					raise DBusError( reply.error_name, text )
+
+				return reply.body
+
+	def reply( self, call, signature='', args=() ):
+
+		return self.send( Message(
+		 METHOD_RETURN, reply_serial=call.serial, destination=call.sender
+		), signature, args )
+
+	def reply_error( self, call, name, text='' ):
+
+		return self.send( Message(
+		 ERROR, reply_serial=call.serial, destination=call.sender, error_name=name
+		), 's', [text] )
+
+	def name_has_owner( self, name ):
+
+		return self.call(
+		 'org.freedesktop.DBus', '/org/freedesktop/DBus', 'org.freedesktop.DBus',
+		 'NameHasOwner', 's', [name]
+		)[0]
+
+	# asks the bus to give us a well-known name (eg when acting as a stub
+	# service); returns True if we're now its primary owner
+	def request_name( self, name ):
+
+		return self.call(
+		 'org.freedesktop.DBus', '/org/freedesktop/DBus', 'org.freedesktop.DBus',
+		 'RequestName', 'su', [name, 0x4]
+		)[0] == 1
+
+	def fileno( self ):
+		return self.sock.fileno()
+
+	def close( self ):
+
+		if self.sock != None:
+			try:
+				self.sock.close()
+			except OSError:
+				pass
+			self.sock = None
+
+# a method call that was looked-up ahead of time (eg when BusKill was armed) so
+# that calling it is just a single message on an already-open connection.
+# 'conclusive' is False if a successful reply doesn't mean that the action was
+# actually done (so the caller should still try its fallbacks)
+class DBusMethod:
+
+	def __init__( self, connection, destination, path, interface, member, signature='', args=(), conclusive=True ):
+
+		self.connection = connection
+		self.destination = destination
+		self.path = path
+		self.interface = interface
+		self.member = member
+		self.signature = signature
+		self.args = args
+		self.conclusive = conclusive
+
+	def __call__( self, timeout=DEFAULT_TIMEOUT ):
+
+		return self.connection.call(
+		 self.destination, self.path, self.interface, self.member,
+		 self.signature, self.args, timeout
+		)
+
+	def __str__( self ):
+		return str(self.interface) + '.' + str(self.member) + ' on ' + str(self.path)
+
+	def close( self ):
+		self.connection.close()
+
+# returns a DBusMethod that locks the current session's screen, or None if
+# we can't find anything to lock it. We prefer messaging the desktop's screen
+# locker directly on the session bus, and fall back to asking logind to tell
+# the session's locker to lock. If 'prefer' is the destination of the locker
+# that worked last time (eg 'org.freedesktop.login1'), it's tried first
+def find_screen_locker( timeout=DEFAULT_TIMEOUT, prefer=None ):
+
+	finders = [ find_session_screen_locker, find_logind_screen_locker ]
+	if prefer == 'org.freedesktop.login1':
+		finders.reverse()
+
+	for finder in finders:
+		method = finder( timeout )
+		if method != None:
+			return method
+
+	return None
+
+# returns a DBusMethod for the desktop's screen locker on the session bus, or
+# None if there isn't one
+def find_session_screen_locker( timeout=DEFAULT_TIMEOUT ):
+
+	try:
+		connection = DBusConnection( session_bus_address(), timeout )
+		try:
+			if connection.name_has_owner( 'org.freedesktop.ScreenSaver' ):
+				return DBusMethod(
+				 connection, 'org.freedesktop.ScreenSaver', '/org/freedesktop/ScreenSaver',
+				 'org.freedesktop.ScreenSaver', 'Lock'
+				)
+		except DBusError as e:
+			msg = "DEBUG: Unable to query the session bus (" +str(e)+ ")"
+			logger.debug( msg )
+		connection.close()
+
+	except (DBusError, OSError) as e:
+		msg = "DEBUG: Unable to connect to the session bus (" +str(e)+ ")"
+		logger.debug( msg )
+
+	return None
+
+# returns a DBusMethod that asks logind to lock our session, or None. logind's
+# Session.Lock only broadcasts a signal to the session's screen locker, and it
+# replies successfully even if no locker is listening; so it's not conclusive
+def find_logind_screen_locker( timeout=DEFAULT_TIMEOUT ):
+
+	try:
+		connection = DBusConnection( system_bus_address(), timeout )
+	except (DBusError, OSError) as e:
+		msg = "DEBUG: Unable to connect to the system bus (" +str(e)+ ")"
+		logger.debug( msg )
+		return None
+
+	session_path = find_logind_session( connection )
+	if session_path == None:
+		connection.close()
+		return None
+
+	return DBusMethod(
+	 connection, 'org.freedesktop.login1', session_path,
+	 'org.freedesktop.login1.Session', 'Lock', conclusive=False
+	)
+
+# returns the object path of our logind session, or None
+def find_logind_session( connection ):
+
+	try:
+		return connection.call(
+		 'org.freedesktop.login1', '/org/freedesktop/login1',
+		 'org.freedesktop.login1.Manager', 'GetSessionByPID', 'u', [os.getpid()]
+		)[0]
+	except (DBusError, OSError) as e:
+		msg = "DEBUG: logind GetSessionByPID failed (" +str(e)+ ")"
+		logger.debug( msg )
+
+	# we may not be in a session (eg started by a user service), but the
+	# environment may still tell us which one the user is in
+	session_id = os.environ.get( 'XDG_SESSION_ID' )
+	if session_id == None:
+		return None
+
+	try:
+		return connection.call(
+		 'org.freedesktop.login1', '/org/freedesktop/login1',
+		 'org.freedesktop.login1.Manager', 'GetSession', 's', [session_id]
+		)[0]
+	except (DBusError, OSError) as e:
+		msg = "DEBUG: logind GetSession failed (" +str(e)+ ")"
+		logger.debug( msg )
+
+	return None
+
+# returns a DBusMethod that asks logind to power off the machine, or None if
+# logind isn't reachable (eg on systems without systemd). Raises a DBusError
+# if logind is there, but it won't let us power off without asking the user
+# to authenticate (which nobody will be around to do when the trigger fires)
+def find_power_off( timeout=DEFAULT_TIMEOUT ):
+
+	try:
+		connection = DBusConnection( system_bus_address(), timeout )
+	except (DBusError, OSError) as e:
+		msg = "DEBUG: Unable to connect to the system bus (" +str(e)+ ")"
+		logger.debug( msg )
+		return None
+
+	try:
+		answer = connection.call(
+		 'org.freedesktop.login1', '/org/freedesktop/login1',
+		 'org.freedesktop.login1.Manager', 'CanPowerOff', timeout=timeout
+		)[0]
+	except (DBusError, OSError) as e:
+		msg = "DEBUG: logind CanPowerOff failed (" +str(e)+ ")"
+		logger.debug( msg )
+		connection.close()
+		return None
+
+	if answer != 'yes':
+		connection.close()
+		raise DBusError(
+		 'org.freedesktop.DBus.Error.AccessDenied',
+		 "logind's CanPowerOff returned '" +str(answer)+ "'"
+		)
+
+	# interactive=False so polkit never blocks waiting on an auth prompt
+	return DBusMethod(
+	 connection, 'org.freedesktop.login1', '/org/freedesktop/login1',
+	 'org.freedesktop.login1.Manager', 'PowerOff', 'b', [False]
+	)
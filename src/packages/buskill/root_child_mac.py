@@ -17,7 +17,7 @@ For more info, see: https://buskill.in/
 #                                   IMPORTS                                    #
 ################################################################################
 
-import logging, re, sys, subprocess
+import logging, re, sys, subprocess, json, os, threading, time
 
 ################################################################################
 #                                  SETTINGS                                    #
@@ -27,6 +27,24 @@ import logging, re, sys, subprocess
 #                                  FUNCTIONS                                   #
 ################################################################################
 
+# if BusKill is being traced, this appends a span (in the same format as
+# packages/buskill/tracing.py) to our trace file
+def trace( name, start, **args ):
+
+	if trace_file_path == None:
+		return
+
+	event = {
+	 'name': name, 'cat': 'buskill', 'ph': 'X',
+	 'ts': start * 1000000, 'dur': ( time.monotonic() - start ) * 1000000,
+	 'pid': os.getpid(), 'tid': threading.get_ident(), 'args': args
+	}
+	try:
+		with open( trace_file_path, 'a' ) as trace_file:
+			trace_file.write( json.dumps( event ) + "\n" )
+	except Exception as e:
+		logging.warning( "Unable to write trace event " +str(e) )
+
 # this function will gently shutdown a MacOS machine
 def trigger_softshutdown_mac():
 	msg = "BusKill soft-shutdown trigger executing now"
@@ -44,12 +62,14 @@ def trigger_softshutdown_mac_shutdown():
 		logging.info(msg)
 
 		# TODO: swap 'reboot' for actual 'shutdown' command
+		start = time.monotonic()
 		result = subprocess.run(
 		 #[ 'reboot' ],
 		 [ 'shutdown', '-h', 'now' ],
 		 capture_output=True,
 		 text=True
 		)
+		trace( 'subprocess.run', start, argv=['shutdown', '-h', 'now'], returncode=result.returncode )
 
 		msg = "subprocess returncode|" +str(result.returncode)+ "|"
 		logging.debug(msg)
@@ -82,12 +102,14 @@ def trigger_softshutdown_mac_halt():
 		msg = "Attempting to execute `poweroff"
 		logging.info(msg)
 
+		start = time.monotonic()
 		result = subprocess.run(
 		 #[ 'reboot' ],
 		 [ 'halt' ],
 		 capture_output=True,
 		 text=True
 		)
+		trace( 'subprocess.run', start, argv=['halt'], returncode=result.returncode )
 
 		msg = "subprocess returncode|" +str(result.returncode)+ "|"
 		logging.debug(msg)
@@ -124,6 +146,16 @@ if not re.match( "^[A-Za-z0-9\-\_\./\ ]+$", log_file_path ):
 	print( "First positional argument (log file path) is invalid. Exiting" )
 	sys.exit(1)
 
+# the optional second argument is the file path to where we write trace spans
+trace_file_path = None
+if len(sys.argv) > 2:
+	trace_file_path = sys.argv[2]
+
+	# check sanity of input. Be very suspicious
+	if not re.match( "^[A-Za-z0-9\-\_\./\ ]+\.jsonl$", trace_file_path ):
+		print( "Second positional argument (trace file path) is invalid. Exiting" )
+		sys.exit(1)
+
 #################
 # SETUP LOGGING #
 #################
@@ -176,7 +208,9 @@ while True:
 			msg = "Attempting to call trigger_softshutdown_mac()"
 			logging.debug(msg)
 
+			start = time.monotonic()
 			trigger_softshutdown_mac()
+			trace( 'trigger_softshutdown_mac', start )
 			msg = "Finished executing 'soft-shutdown'\n"
 			logging.info(msg)
 
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3.7
+"""
+::
+
+  File:    packages/buskill/tracing.py
+
+This is an opt-in tracing facility for developers who want to see where the time goes between a usb removal and the trigger finishing. It's enabled by setting $BUSKILL_TRACE to a directory (or with the CLI's --trace option). Each process (the app, its listener, and the root child) then appends spans timed with time.monotonic() to its own JSON Lines file in that directory, and export_chrome() merges them into a Chrome trace-event JSON file that can be loaded in chrome://tracing or https://ui.perfetto.dev
+
+When tracing isn't enabled, span() returns a shared no-op object, so the spans can be left in the trigger path.
+
+For more info, see: https://buskill.in/
+"""
+
+################################################################################
+#                                   IMPORTS                                    #
+################################################################################
+
+import functools, glob, json, os, subprocess, threading, time
+
+import logging
+logger = logging.getLogger( __name__ )
+
+################################################################################
+#                                  SETTINGS                                    #
+################################################################################
+
+TRACE_DIR = os.environ.get( 'BUSKILL_TRACE' ) or None
+
+TRACE_FILE_PREFIX = 'buskill-trace-'
+TRACE_FILE_SUFFIX = '.jsonl'
+
+# the file that this process writes its events to, and the pid that opened it
+# (so a fork()ed child opens its own file)
+trace_fd = None
+trace_fd_pid = None
+trace_lock = threading.Lock()
+
+################################################################################
+#                                 FUNCTIONS                                    #
+################################################################################
+
+def enabled():
+	return TRACE_DIR != None
+
+# turns on tracing (for this process and the children that it spawns) at
+# runtime, writing to the given directory
+def enable( trace_dir ):
+
+	global TRACE_DIR
+
+	os.makedirs( trace_dir, exist_ok=True )
+	TRACE_DIR = os.path.abspath( trace_dir )
+	os.environ['BUSKILL_TRACE'] = TRACE_DIR
+
+# returns the path to the file that the given process should write to. The
+# 'name' is used instead of the pid for processes that can't tell us their pid
+# before they're spawned (eg the root child)
+def trace_file_path( name=None ):
+
+	if name == None:
+		name = os.getpid()
+
+	return os.path.join( TRACE_DIR, TRACE_FILE_PREFIX +str(name)+ TRACE_FILE_SUFFIX )
+
+def write_event( event ):
+
+	global trace_fd, trace_fd_pid
+
+	line = ( json.dumps( event ) + "\n" ).encode( 'utf-8' )
+
+	with trace_lock:
+		try:
+			if trace_fd_pid != os.getpid():
+				os.makedirs( TRACE_DIR, exist_ok=True )
+				trace_fd = os.open(
+				 trace_file_path(), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600
+				)
+				trace_fd_pid = os.getpid()
+
+			# one write() to an O_APPEND file, so events are never interleaved
+			os.write( trace_fd, line )
+
+		except OSError as e:
+			msg = "WARNING: Unable to write trace event (" +str(e)+ ")"
+			logger.warning( msg )
+
+# records a span that has already finished. 'start' and 'duration' are in
+# seconds, as returned by time.monotonic()
+def complete( name, start, duration, **args ):
+
+	if TRACE_DIR == None:
+		return
+
+	write_event( {
+	 'name': name,
+	 'cat': 'buskill',
+	 'ph': 'X',
+	 'ts': start * 1000000,
+	 'dur': duration * 1000000,
+	 'pid': os.getpid(),
+	 'tid': threading.get_ident(),
+	 'args': args,
+	} )
+
+# returns a context manager that records the time spent inside it as a span
+def span( name, **args ):
+
+	if TRACE_DIR == None:
+		return NULL_SPAN
+
+	return Span( name, args )
+
+# decorator that records each call of the decorated function as a span
+def traced( function ):
+
+	@functools.wraps( function )
+	def wrapper( *args, **kwargs ):
+
+		if TRACE_DIR == None:
+			return function( *args, **kwargs )
+
+		with Span( function.__name__, {} ):
+			return function( *args, **kwargs )
+
+	return wrapper
+
+# subprocess.run(), recorded as a span
+def traced_run( argv, **kwargs ):
+
+	if TRACE_DIR == None:
+		return subprocess.run( argv, **kwargs )
+
+	with Span( 'subprocess.run', { 'argv': [str(arg) for arg in argv] } ) as run_span:
+		result = subprocess.run( argv, **kwargs )
+		run_span.args['returncode'] = result.returncode
+		return result
+
+# names this process (or the current thread) in the trace viewer
+def set_process_name( name ):
+
+	if TRACE_DIR == None:
+		return
+
+	write_event( {
+	 'name': 'process_name', 'ph': 'M', 'pid': os.getpid(),
+	 'args': { 'name': name },
+	} )
+
+def set_thread_name( name ):
+
+	if TRACE_DIR == None:
+		return
+
+	write_event( {
+	 'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(),
+	 'tid': threading.get_ident(), 'args': { 'name': name },
+	} )
+
+# merges the events of every process in 'trace_dir' into one Chrome
+# trace-event JSON file. Returns the number of events written
+def export_chrome( trace_dir, output_path ):
+
+	events = list()
+	pattern = os.path.join( trace_dir, TRACE_FILE_PREFIX + '*' + TRACE_FILE_SUFFIX )
+	for path in sorted( glob.glob( pattern ) ):
+		with open( path ) as trace_file:
+			for line in trace_file:
+				try:
+					events.append( json.loads( line ) )
+				except ValueError:
+					# eg the last line of a process that was killed mid-write
+					continue
+
+	# metadata first, then the spans in the order that they started
+	events.sort( key = lambda event: ( event['ph'] != 'M', event.get( 'ts', 0 ) ) )
+
+	with open( output_path, 'w' ) as output_file:
+		json.dump( { 'traceEvents': events, 'displayTimeUnit': 'ms' }, output_file )
+
+	return len(events)
+
+################################################################################
+#                                   OBJECTS                                    #
+################################################################################
+
+class Span:
+
+	def __init__( self, name, args ):
+		self.name = name
+		self.args = args
+
+	def __enter__( self ):
+		self.start = time.monotonic()
+		return self
+
+	def __exit__( self, exc_type, exc_value, traceback ):
+
+		duration = time.monotonic() - self.start
+		if exc_type != None:
+			self.args['exception'] = repr( exc_value )
+
+		complete( self.name, self.start, duration, **self.args )
+
+class NullSpan:
+
+	def __init__( self ):
+		self.args = dict()
+
+	def __enter__( self ):
+		return self
+
+	def __exit__( self, exc_type, exc_value, traceback ):
+		pass
+
+NULL_SPAN = NullSpan()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3.7
+"""
+::
+
+  File:    packages/buskill/uevent_lin.py
+
+This is a Linux-only detector that listens for usb removal events by reading the kernel's uevents directly from a NETLINK_KOBJECT_UEVENT socket (the same events that udev receives), rather than going through libusb's hotplug API and its event handling threads.
+
+For more info, see: https://buskill.in/
+"""
+
+################################################################################
+#                                   IMPORTS                                    #
+################################################################################
+
+import errno, os, selectors, socket
+
+import logging
+logger = logging.getLogger( __name__ )
+
+################################################################################
+#                                  SETTINGS                                    #
+################################################################################
+
+# from linux/netlink.h
+NETLINK_KOBJECT_UEVENT = 15
+
+# the multicast group to which the kernel sends its uevents (udev re-broadcasts
+# them to group 2 after processing them, but we don't want to wait for that)
+UEVENT_GROUP_KERNEL = 1
+
+# uevents are small, but the kernel allows them to be up to 8 KiB
+UEVENT_BUFFER_SIZE = 16384
+
+# a big receive buffer so we don't drop events when a whole hub is removed
+UEVENT_SOCKET_RCVBUF = 1048576
+
+# where sysfs lists the connected usb devices, which we check if the kernel
+# dropped uevents anyway (see UeventListener.overflowed())
+SYSFS_USB_DEVICES = '/sys/bus/usb/devices'
+
+# how many times in a row we re-open the netlink socket after reading from it
+# failed, before we give up (see UeventListener.reopen())
+UEVENT_MAX_REOPENS = 3
+
+################################################################################
+#                                 FUNCTIONS                                    #
+################################################################################
+
+# opens a netlink socket subscribed to the kernel's uevents. This is replaced
+# with one end of a socketpair() when replaying captured uevents
+def open_socket():
+
+	sock = socket.socket(
+	 socket.AF_NETLINK,
+	 socket.SOCK_DGRAM | socket.SOCK_CLOEXEC,
+	 NETLINK_KOBJECT_UEVENT
+	)
+	sock.setsockopt( socket.SOL_SOCKET, socket.SO_RCVBUF, UEVENT_SOCKET_RCVBUF )
+	sock.bind( (0, UEVENT_GROUP_KERNEL) )
+
+	return sock
+
+# takes the raw payload of a kernel uevent and returns a dict of its
+# properties (eg ACTION, DEVPATH, SUBSYSTEM, DEVTYPE, PRODUCT), or None if the
+# payload isn't a kernel uevent. Kernel uevents look like this:
+#
+#   remove@/devices/.../usb3/3-1\0ACTION=remove\0DEVPATH=/devices/...\0...
+def parse_uevent( payload ):
+
+	# messages re-broadcast by udev start with 'libudev' and use a binary
+	# header; we only want the ones straight from the kernel
+	if payload.startswith( b'libudev\0' ):
+		return None
+
+	fields = payload.split( b'\0' )
+	if b'@' not in fields[0]:
+		return None
+
+	uevent = dict()
+	for field in fields[1:]:
+		key, sep, value = field.partition( b'=' )
+		if sep:
+			uevent[ key.decode( 'utf-8', 'replace' ) ] = value.decode( 'utf-8', 'replace' )
+
+	return uevent
+
+# returns the PRODUCT (eg '1209/2aba/100') that the kernel puts in the
+# uevents of the usb device with the given sysfs name (eg '3-1.4'), or '' if
+# we can't read it
+def read_product( name ):
+
+	ids = list()
+	for attribute in [ 'idVendor', 'idProduct', 'bcdDevice' ]:
+		try:
+			with open( os.path.join( SYSFS_USB_DEVICES, name, attribute ) ) as f:
+				ids.append( '{:x}'.format( int( f.read().strip(), 16 ) ) )
+		except (OSError, ValueError):
+			return ''
+
+	return '/'.join( ids )
+
+# sends the given (captured) uevent payloads into one end of a socketpair()
+# so that a UeventListener reading from the other end can be exercised
+# without any usb hardware
+def replay_uevents( sock, payloads ):
+
+	for payload in payloads:
+		sock.send( payload )
+
+################################################################################
+#                                   OBJECTS                                    #
+################################################################################
+
+class UeventListener:
+
+	# callback   = function called with the uevent dict of each matching removal
+	# subsystem  = only removals from this subsystem match
+	# devtype    = only removals of this devtype match ('usb_device' rather than
+	#              'usb_interface' so we get only one event per device)
+	# devpath    = optional port path (eg '3-1.4'), matched against the last
+	#              component of DEVPATH
+	# bus        = optional bus number (eg 3), matched against the start of the
+	#              last component of DEVPATH (eg '3-1.4')
+	# product    = optional '<vendor>/<product>' hex ids (eg '1209/2aba'),
+	#              matched against the start of PRODUCT
+	# filtered_callback = optional function called with the uevent dict of each
+	#              kernel uevent that didn't match
+	#
+	# The usb devices that match are listed from sysfs now, so that if the
+	# kernel drops uevents later we can tell whether one of them was removed
+	def __init__( self, callback, subsystem='usb', devtype='usb_device', devpath=None, bus=None, product=None, filtered_callback=None ):
+
+		self.callback = callback
+		self.filtered_callback = filtered_callback
+		self.subsystem = subsystem
+		self.devtype = devtype
+		self.devpath = devpath
+		self.bus = bus
+		self.product = product
+		self.devices = self.list_devices()
+		self.reopens = 0
+
+		self.sock = open_socket()
+
+		# writing to this wakes-up the selector so run() can exit immediately
+		self.wakeup_r, self.wakeup_w = socket.socketpair()
+
+		self.selector = selectors.DefaultSelector()
+		self.selector.register( self.sock, selectors.EVENT_READ )
+		self.selector.register( self.wakeup_r, selectors.EVENT_READ )
+
+	def matches( self, uevent ):
+
+		if uevent.get( 'ACTION' ) != 'remove':
+			return False
+
+		if self.subsystem != None and uevent.get( 'SUBSYSTEM' ) != self.subsystem:
+			return False
+
+		if self.devtype != None and uevent.get( 'DEVTYPE' ) != self.devtype:
+			return False
+
+		if self.devpath != None and \
+		 uevent.get( 'DEVPATH', '' ).split( '/' )[-1] != self.devpath:
+			return False
+
+		if self.bus != None and \
+		 not uevent.get( 'DEVPATH', '' ).split( '/' )[-1].startswith( str(self.bus) + '-' ):
+			return False
+
+		if self.product != None and \
+		 not uevent.get( 'PRODUCT', '' ).startswith( self.product + '/' ):
+			return False
+
+		return True
+
+	# keeps self.devices up-to-date with the add & remove uevents that we see,
+	# so that overflowed() only reports the devices that disappeared since the
+	# last uevent (rather than since we started listening)
+	def track( self, uevent ):
+
+		if self.devices == None:
+			return
+
+		if uevent.get( 'SUBSYSTEM' ) != self.subsystem or uevent.get( 'DEVTYPE' ) != self.devtype:
+			return
+
+		name = uevent.get( 'DEVPATH', '' ).split( '/' )[-1]
+		if uevent.get( 'ACTION' ) == 'remove':
+			self.devices.discard( name )
+
+		elif uevent.get( 'ACTION' ) == 'add':
+
+			# would its removal match?
+			removal = dict( uevent )
+			removal['ACTION'] = 'remove'
+			if self.matches( removal ):
+				self.devices.add( name )
+
+	# returns the set of sysfs names (eg '3-1.4') of the connected usb devices
+	# whose removal would match, or None if sysfs can't be read
+	def list_devices( self ):
+
+		try:
+			names = os.listdir( SYSFS_USB_DEVICES )
+		except OSError:
+			return None
+
+		devices = set()
+		for name in names:
+
+			# skip the interfaces (eg '3-1.4:1.0'); we only want the devices
+			if ':' in name:
+				continue
+
+			uevent = {
+			 'ACTION': 'remove',
+			 'SUBSYSTEM': self.subsystem,
+			 'DEVTYPE': self.devtype,
+			 'DEVPATH': '/' + name,
+			 'PRODUCT': read_product( name ),
+			}
+			if self.matches( uevent ):
+				devices.add( name )
+
+		return devices
+
+	# called when the kernel dropped uevents because our receive buffer
+	# overflowed (eg when a whole hub is removed). Any of them may have been the
+	# removal that we're waiting for, so we check for missing devices
+	def overflowed( self ):
+
+		msg = "WARNING: The kernel dropped uevents (our receive buffer overflowed); checking which usb devices are still connected"
+		logger.warning( msg )
+
+		self.check_devices()
+
+	# called when reading from the netlink socket failed for another reason.
+	# We'd be deaf to removals from now on, so we open a new socket and check
+	# for devices that went missing in the meantime. If we can't open one (or
+	# the new ones keep failing too), then we call the callback (as if our
+	# device was removed) and re-raise 'error'
+	def reopen( self, error ):
+
+		msg = "ERROR: Unable to read from the uevent netlink socket (" +str(error)+ "); re-opening it"
+		logger.error( msg )
+
+		self.selector.unregister( self.sock )
+		self.sock.close()
+
+		self.reopens += 1
+		try:
+			if self.reopens > UEVENT_MAX_REOPENS:
+				raise OSError( "reading failed after re-opening it " +str(UEVENT_MAX_REOPENS)+ " times" )
+			self.sock = open_socket()
+		except OSError as e:
+			msg = "ERROR: Unable to re-open the uevent netlink socket (" +str(e)+ "); treating it as a removal"
+			logger.error( msg )
+			self.callback( {
+			 'ACTION': 'remove',
+			 'SUBSYSTEM': self.subsystem,
+			 'DEVTYPE': self.devtype,
+			 'BUSKILL_SOCKET_ERROR': str(e),
+			} )
+			raise error
+
+		self.selector.register( self.sock, selectors.EVENT_READ )
+		self.check_devices()
+
+	# checks sysfs for matching devices that disappeared since we last saw them
+	# and calls the callback if one did. If we can't check, then we call it
+	# anyway; a false alarm is better than missing the removal
+	def check_devices( self ):
+
+		devices = self.list_devices()
+		if devices == None or self.devices == None:
+			missing = [ 'unknown' ]
+		else:
+			missing = sorted( self.devices - devices )
+		self.devices = devices
+
+		if missing:
+			self.callback( {
+			 'ACTION': 'remove',
+			 'SUBSYSTEM': self.subsystem,
+			 'DEVTYPE': self.devtype,
+			 'DEVPATH': '/' + missing[0],
+			 'BUSKILL_OVERFLOW': '1',
+			} )
+
+	# loops until 'stop' is set (or forever if it's None), calling the callback
+	# for each matching removal
+	def run( self, stop=None ):
+
+		try:
+			while stop == None or not stop.is_set():
+				for key, mask in self.selector.select():
+
+					if key.fileobj == self.wakeup_r:
+						self.wakeup_r.recv( 1 )
+						continue
+
+					try:
+						payload, address = self.sock.recvfrom( UEVENT_BUFFER_SIZE )
+					except OSError as e:
+						if e.errno == errno.ENOBUFS:
+							self.overflowed()
+						else:
+							self.reopen( e )
+						continue
+					self.reopens = 0
+
+					# only trust uevents that were sent by the kernel (pid 0)
+					if self.sock.family == socket.AF_NETLINK and address[0] != 0:
+						continue
+
+					uevent = parse_uevent( payload )
+					if uevent == None:
+						continue
+
+					self.track( uevent )
+					if self.matches( uevent ):
+						self.callback( uevent )
+					elif self.filtered_callback != None:
+						self.filtered_callback( uevent )
+
+		finally:
+			self.close()
+
+	# wakes-up run() from another thread so that it can check 'stop'
+	def interrupt( self ):
+
+		try:
+			self.wakeup_w.send( b'\0' )
+		except OSError:
+			pass
+
+	def close( self ):
+
+		self.selector.close()
+		self.sock.close()
+		self.wakeup_r.close()
+		self.wakeup_w.close()
@@ -0,0 +1,753 @@
+#!/usr/bin/env python3.7
+"""
+::
+
+  File:    packages/buskill/upgrade.py
+  Authors: Michael Altfield <michael@buskill.in>
+
+This is the code that downloads, verifies, and installs new versions of the BusKill app (for BusKill.upgrade()). It's the only part of the app that needs the network (urllib, ssl & certifi) and crypto (gnupg & hashlib) stacks, so it lives in its own module that's only imported when the user actually upgrades. Arming, the CLI's --version, and launching the GUI never import it.
+
+For more info, see: https://buskill.in/
+"""
+
+################################################################################
+#                                   IMPORTS                                    #
+################################################################################
+
+import urllib.request, urllib.parse, re, json, certifi, os, math, shutil, random, gnupg, subprocess
+import collections, io, queue, threading, time
+from buskill_version import BUSKILL_VERSION
+from distutils.version import LooseVersion
+from hashlib import sha256
+from . import APP_DIR, CURRENT_PLATFORM
+
+import logging
+logger = logging.getLogger( __name__ )
+
+################################################################################
+#                                  SETTINGS                                    #
+################################################################################
+
+UPGRADE_MIRRORS = [
+ 'https://raw.githubusercontent.com/BusKill/buskill-app/master/updates/v1/meta.json',
+ 'https://gitlab.com/buskill/buskill-app/-/raw/master/updates/v1/meta.json',
+ 'https://repo.buskill.in/buskill-app/v1/meta.json',
+ 'https://repo.michaelaltfield.net/buskill-app/v1/meta.json',
+]
+random.shuffle(UPGRADE_MIRRORS)
+
+RELEASE_KEY_FINGERPRINT = 'E0AFFF57DC00FBE0563587614AE21E1936CE786A'
+RELEASE_KEY_SUB_FINGERPRINT = '798DC1101F3DEC428ADE124D68B8BCB0C5023905'
+
+# the metadata definitely shouldn't be more than 1 MB, and we don't download
+# any files >200 MB
+UPGRADE_METADATA_MAX_BYTES = 1048576
+UPGRADE_DOWNLOAD_MAX_BYTES = 209715200
+
+# how much is read from the network at a time. Cancelled requests stop after
+# their current read
+UPGRADE_READ_CHUNK_BYTES = 65536
+
+# how long (in seconds) we wait to connect to a mirror, and then for each read
+UPGRADE_CONNECT_TIMEOUT = 10
+UPGRADE_READ_TIMEOUT = 20
+
+# a mirror that trickles data (eg a slow retrieval attack) can keep each read
+# within its timeout forever, so we also give up on a download if it averages
+# less than UPGRADE_MIN_BYTES_PER_SECOND over the last
+# UPGRADE_THROUGHPUT_WINDOW seconds
+UPGRADE_MIN_BYTES_PER_SECOND = 10240
+UPGRADE_THROUGHPUT_WINDOW = 15
+
+################################################################################
+#                                 FUNCTIONS                                    #
+################################################################################
+
+# Takes the path (as a string) to a SHA256SUMS file and a list of paths to
+# local files. Returns true only if all files' checksums are present in the
+# SHA256SUMS file and their checksums match
+def integrity_is_ok( sha256sums_filepath, local_filepaths ):
+
+	# first we parse the SHA256SUMS file and convert it into a dictionary
+	sha256sums = dict()
+	with open( sha256sums_filepath ) as fd:
+		for line in fd:
+			# sha256 hashes are exactly 64 characters long
+			checksum = line[0:64]
+
+			# there is one space followed by one metadata character between the
+			# checksum and the filename in the `sha256sum` command output
+			filename = os.path.split( line[66:] )[1].strip()
+			sha256sums[filename] = checksum
+
+	msg = 'DEBUG: sha256sums:|' +str(sha256sums)+ '|'
+	logger.debug( msg )
+
+	# now loop through each file that we were asked to check and confirm its
+	# checksum matches what was listed in the SHA256SUMS file
+	for local_file in local_filepaths:
+
+		local_filename = os.path.split( local_file )[1]
+
+		sha256sum = sha256()
+		with open( local_file, 'rb' ) as fd:
+			data_chunk = fd.read(1024)
+			while data_chunk:
+				sha256sum.update(data_chunk)
+				data_chunk = fd.read(1024)
+
+		checksum = sha256sum.hexdigest()
+
+		msg = 'DEBUG: checksum:|' +str(checksum)+ "|\n"
+		msg+= 'DEBUG: sha256sums[local_filename]:|' +str(sha256sums[local_filename])+ '|'
+		logger.debug( msg )
+
+		if checksum != sha256sums[local_filename]:
+			return False
+
+	return True
+
+# checks the detached signature (at signature_filepath) of the file at
+# data_filepath. Returns the info of the signature made with our release key,
+# or raises RuntimeError if there isn't one (or it's invalid)
+def check_signature( gpg, signature_filepath, data_filepath ):
+
+	# open the detached signature and check it with gpg
+	with open( signature_filepath, 'rb' ) as fd:
+		verified = gpg.verify_file( fd, data_filepath )
+
+	# check that this main signature fingerprint meets our expectations
+	# bail if it a key was used other than the one we require
+	if verified.fingerprint != RELEASE_KEY_SUB_FINGERPRINT:
+		msg = 'ERROR: Invalid signature fingerprint (expected '+str(RELEASE_KEY_SUB_FINGERPRINT)+' but got '+str(verified.fingerprint)+')! Please report this as a bug.'
+		logger.debug( msg )
+		raise RuntimeError( msg )
+
+	# extract from our list of signatures any signatures made with exactly the
+	# keys we'd expect (check the master key and the subkey fingerprints)
+	sig_info = [ verified.sig_info[key] for key in verified.sig_info if verified.sig_info[key]['fingerprint'] == RELEASE_KEY_SUB_FINGERPRINT and verified.sig_info[key]['pubkey_fingerprint'] == RELEASE_KEY_FINGERPRINT ]
+
+	# if we couldn't find a signature that matched our requirements, bail
+	if sig_info == list():
+		msg = 'ERROR: No valid signature found! Please report this as a bug.'
+		logger.debug( msg )
+		raise RuntimeError( msg )
+
+	else:
+		sig_info = sig_info.pop()
+
+	# check both the list of signatures and this other one. why not?
+	# bail if either is an invalid signature
+	if verified.status != 'signature valid':
+		msg = 'ERROR: No valid signature found! Please report this as a bug (' +str(sig_info)+ ').'
+		logger.debug( msg )
+		raise RuntimeError( msg )
+
+	if sig_info['status'] != 'signature valid':
+		msg = 'ERROR: No valid sig_info signature found! Please report this as a bug (' +str(sig_info)+ ').'
+		logger.debug( msg )
+		raise RuntimeError( msg )
+
+	msg = "DEBUG: Signature is valid (" +str(sig_info)+ ")."
+	logger.debug( msg )
+
+	return sig_info
+
+# downloads the file at url to out_file (opened for writing in binary mode)
+# and returns its size. Raises RuntimeWarning if it's bigger than max_bytes or
+# 'cancelled' is set, and SlowMirror if the mirror is too slow (see
+# ThroughputMonitor)
+#
+# on_size = function that's called with the file's size (in bytes, or None if
+#           the mirror didn't say) before it's downloaded
+def download( url, out_file, max_bytes, cancelled=None, on_size=None, connect_timeout=UPGRADE_CONNECT_TIMEOUT ):
+
+	with urllib.request.urlopen( url, cafile=certifi.where(), timeout=connect_timeout ) as response:
+
+		# urlopen()'s timeout is for connecting; each read gets its own
+		set_read_timeout( response, UPGRADE_READ_TIMEOUT )
+
+		size_bytes = response.info().get('content-length')
+		if size_bytes != None:
+			size_bytes = int(size_bytes)
+		if on_size != None:
+			on_size( size_bytes )
+		if size_bytes != None and size_bytes > max_bytes:
+			msg = "Too big (" +str(size_bytes)+ " bytes)"
+			raise RuntimeWarning( msg )
+
+		monitor = ThroughputMonitor( url )
+		total_bytes = 0
+		while True:
+			if cancelled != None and cancelled.is_set():
+				msg = "Cancelled"
+				raise RuntimeWarning( msg )
+
+			# unlike read(), read1() returns as soon as *some* data arrives, so
+			# we check the throughput even if the mirror is trickling
+			chunk = response.read1( UPGRADE_READ_CHUNK_BYTES )
+			if not chunk:
+				break
+
+			total_bytes += len(chunk)
+			if total_bytes > max_bytes:
+				msg = "Too big (more than " +str(max_bytes)+ " bytes)"
+				raise RuntimeWarning( msg )
+
+			out_file.write( chunk )
+			monitor.update( len(chunk) )
+
+	return total_bytes
+
+# sets the timeout of each read from the socket under an http.client response.
+# If we can't find it (it's not a public API), reads keep the connect timeout
+def set_read_timeout( response, timeout ):
+
+	try:
+		response.fp.raw._sock.settimeout( timeout )
+	except AttributeError:
+		pass
+
+# downloads the file at url into memory and returns its contents (see
+# download())
+def fetch_bytes( url, max_bytes, cancelled=None, connect_timeout=UPGRADE_CONNECT_TIMEOUT ):
+
+	with io.BytesIO() as out_file:
+		download( url, out_file, max_bytes, cancelled=cancelled, connect_timeout=connect_timeout )
+		return out_file.getvalue()
+
+# downloads the metadata and its detached signature from one mirror and puts
+# ( mirror, metadata, signature, error ) into 'results'. This is executed in
+# a thread for each mirror by race_metadata()
+def fetch_metadata( mirror, connect_timeout, cancelled, results ):
+
+	try:
+		metadata = fetch_bytes( mirror, UPGRADE_METADATA_MAX_BYTES, cancelled, connect_timeout )
+		signature = fetch_bytes( mirror + '.asc', UPGRADE_METADATA_MAX_BYTES, cancelled, connect_timeout )
+	except Exception as e:
+		results.put( ( mirror, None, None, e ) )
+		return
+
+	results.put( ( mirror, metadata, signature, None ) )
+
+# polls all of the UPGRADE_MIRRORS for the metadata at once. The first mirror
+# whose metadata has a valid signature wins, and the requests to the other
+# mirrors are cancelled. Writes the winner's metadata & signature to the
+# given paths and returns the winning mirror. Raises RuntimeWarning if no
+# mirror had valid metadata within 'deadline' seconds
+def race_metadata( gpg, metadata_filepath, signature_filepath, deadline ):
+
+	results = queue.Queue()
+	cancelled = threading.Event()
+
+	for mirror in UPGRADE_MIRRORS:
+		msg = "DEBUG: Checking for updates at '" +str(mirror)+ "'"
+		logger.debug( msg )
+
+		threading.Thread(
+		 target = fetch_metadata,
+		 args = ( mirror, min( deadline, UPGRADE_CONNECT_TIMEOUT ), cancelled, results ),
+		 daemon = True
+		).start()
+
+	ends_at = time.monotonic() + deadline
+	pending = len(UPGRADE_MIRRORS)
+	try:
+		while pending > 0:
+
+			try:
+				mirror, metadata, signature, error = results.get(
+				 timeout = max( 0, ends_at - time.monotonic() )
+				)
+			except queue.Empty:
+				break
+			pending -= 1
+
+			if error != None:
+				msg = "\tFailed to fetch metadata from '" +str(mirror)+ "'; skipping (" +str(error)+ ")"
+				logger.debug( msg )
+				continue
+
+			# the signatures are only checked in this thread, one-at-a-time, in
+			# the order that the mirrors answered
+			with open( metadata_filepath, 'wb' ) as fd:
+				fd.write( metadata )
+			with open( signature_filepath, 'wb' ) as fd:
+				fd.write( signature )
+
+			try:
+				check_signature( gpg, signature_filepath, metadata_filepath )
+			except RuntimeError as e:
+				msg = "\tInvalid metadata signature from '" +str(mirror)+ "'; skipping (" +str(e)+ ")"
+				logger.warning( msg )
+				continue
+
+			msg = "DEBUG: Using the metadata from '" +str(mirror)+ "'"
+			logger.debug( msg )
+			return mirror
+
+	finally:
+		# cancel the requests that are still in-flight; they stop after their
+		# current read (or their timeout)
+		cancelled.set()
+
+	# don't leave the last mirror's invalid metadata behind
+	for filepath in [ metadata_filepath, signature_filepath ]:
+		try:
+			os.remove( filepath )
+		except OSError:
+			pass
+
+	msg = 'Unable to upgrade. Could not fetch valid metadata from any mirror within ' +str(deadline)+ ' seconds.'
+	logger.debug( "DEBUG: " + msg )
+	raise RuntimeWarning( msg )
+
+def upgrade( bk ):
+
+	bk.set_upgrade_status( "Starting Upgrade.." )
+	msg = "DEBUG: Called upgrade()"
+	logger.debug( msg )
+
+	# a phase that raised an exception in a previous upgrade isn't recorded
+	bk.upgrade_phase_name = None
+
+	# Note: While this upgrade solution does cryptographically verify the
+	# authenticity and integrity of new versions, it is still vulnerable to
+	# at least the following attacks:
+	# 
+	#  1. Freeze attacks
+	#
+	# (slow retrieval attacks are mitigated by our timeouts and the minimum
+	# throughput that we require from each mirror; see ThroughputMonitor)
+	#
+	# The fix to this is to upgrade to TUF, once it's safe to do so. In the
+	# meantime, these attacks are not worth mitigating because [a] this app
+	# never auto-updates; it's always requires user input, [b] our app  in
+	# general is low-risk; it doesn't even access the internet outside of the
+	# update process, and [c] these attacks aren't especially severe
+
+	# TODO: switch to using TUF once TUF no longer requires us to install
+	#       untrusted software onto our cold-storage machine holding our
+	#       release private keys. For more info, see:
+	# 
+	#  * https://github.com/BusKill/buskill-app/issues/6
+	#  * https://github.com/theupdateframework/tuf/issues/1109
+
+	#########################
+	# UPGRADE SANITY CHECKS #
+	#########################
+
+	# only upgrade on linux, windows, and mac
+	if bk.OS_NAME_SHORT == '':
+		msg = 'Upgrades not supported on this platform (' +CURRENT_PLATFORM+ ')'
+		logger.debug( "DEBUG: " + msg )
+		raise RuntimeWarning( msg )
+
+	# skip upgrade if we can't write to disk
+	if bk.DATA_DIR == '':
+		msg = 'Unable to upgrade. No DATA_DIR.'
+		logger.debug( "DEBUG: " + msg )
+		raise RuntimeWarning( msg )
+
+	# make sure we can write to the dir where the new versions will be
+	# extracted
+	if not os.access(bk.APPS_DIR, os.W_OK):
+		msg = 'Unable to upgrade. APPS_DIR not writeable (' +str(bk.APPS_DIR)+ ')'
+		logger.debug( "DEBUG: " + msg )
+		raise RuntimeWarning( msg )
+
+	# make sure we can delete the executable itself
+	if not os.access( os.path.join(bk.EXE_DIR, bk.EXE_FILE), os.W_OK):
+		msg = 'Unable to upgrade. EXE_FILE not writeable (' +str( os.path.join(bk.EXE_DIR, bk.EXE_FILE) )+ ')'
+		logger.debug( "DEBUG: " + msg )
+		raise RuntimeWarning( msg )
+
+	#############
+	# SETUP GPG #
+	#############
+
+	bk.upgrade_phase( 'setup_gpg' )
+
+	# first, start with a clean cache
+	bk.wipeCache()
+
+	# prepare our ephemeral gnupg home dir so we can verify the signature of our
+	# checksum file after download and before "install"
+	if os.path.exists( bk.GNUPGHOME ):
+		shutil.rmtree( bk.GNUPGHOME )
+	os.makedirs( bk.GNUPGHOME, mode=0o700 )
+	os.chmod( bk.GNUPGHOME, mode=0o0700 )
+
+	# get the contents of the KEYS file shipped with our software
+	try:
+		with open( os.path.join(APP_DIR, 'KEYS'), 'r' ) as fd:
+			KEYS = fd.read()
+	except:
+		# fall-back to one dir up if we're executing from 'src/'
+		with open( os.path.join( os.path.split(APP_DIR)[0], 'KEYS'), 'r' ) as fd:
+			KEYS = fd.read()
+
+	gpg = gnupg.GPG( gnupghome=bk.GNUPGHOME )
+	gpg.import_keys( KEYS )
+
+	############################
+	# DETERMINE LATEST VERSION #
+	############################
+
+	bk.upgrade_phase( 'poll_metadata' )
+
+	metadata_filepath = os.path.join( bk.CACHE_DIR, 'meta.json' )
+	signature_filepath = os.path.join( bk.CACHE_DIR, 'meta.json.asc' )
+
+	metadata = ''
+	random.shuffle(UPGRADE_MIRRORS)
+
+	# by default, we poll all of our mirrors at once and verify the metadata's
+	# signature as they answer, so one slow (or black-holed) mirror can't stall
+	# the update check
+	if bk.UPGRADE_STRATEGY == 'race':
+		bk.set_upgrade_status( "Polling for latest update" )
+		race_metadata(
+		 gpg, metadata_filepath, signature_filepath,
+		 bk.upgrade_metadata_deadline
+		)
+
+	# otherwise loop through each of our mirrors until we get one that's online
+	else:
+		for mirror in UPGRADE_MIRRORS:
+
+			# break out of loop if we've already downloaded the metadata from
+			# some mirror in our list
+			if os.path.exists( metadata_filepath ) \
+			 and os.path.exists( signature_filepath ):
+				break
+
+			bk.set_upgrade_status( "Polling for latest update" )
+			msg = "DEBUG: Checking for updates at '" +str(mirror)+ "'"
+			logger.debug( msg )
+
+			# try to download the metadata json file and its detached signature
+			files = [ mirror, mirror + '.asc' ]
+			for f in files:
+
+				filename = f.split('/')[-1]
+				filepath = os.path.join( bk.CACHE_DIR, filename )
+
+				try:
+					with open( filepath, 'wb' ) as out_file:
+						download( f, out_file, UPGRADE_METADATA_MAX_BYTES )
+					continue
+
+				except SlowMirror as e:
+					bk.set_upgrade_status( e.status )
+					msg = "\tMirror too slow; skipping (" +str(e)+ ")"
+					logger.debug( msg )
+
+				except Exception as e:
+					msg = "\tFailed to fetch data from mirror; skipping (" +str(e)+ ")"
+					logger.debug( msg )
+
+				# don't leave a partial download behind for the next mirror
+				for partial_filepath in [ metadata_filepath, signature_filepath ]:
+					try:
+						os.remove( partial_filepath )
+					except OSError:
+						pass
+				break
+
+	# CHECK SIGNATURE OF METADATA
+
+	# (race_metadata() already checked the signature of the metadata it chose)
+	if bk.UPGRADE_STRATEGY != 'race':
+
+		bk.upgrade_phase( 'verify_metadata' )
+
+		bk.set_upgrade_status( "Verifying metadata signature" )
+		msg = "\tDEBUG: Finished downloading update metadata. Checking signature."
+		logger.debug( msg )
+
+		try:
+			check_signature( gpg, signature_filepath, metadata_filepath )
+		except RuntimeError:
+			bk.wipeCache()
+			raise
+
+	# try to load the metadata (this is done after signature so we don't load
+	# something malicious that may attack the json.loads() parser)
+	try:
+		with open( metadata_filepath, 'r' ) as fd:
+			metadata = json.loads( fd.read() ) 
+	except Exception as e:
+		msg = 'Unable to upgrade. Could not fetch metadata file (' +str(e)+ '.'
+		logger.debug( "DEBUG: " + msg )
+		raise RuntimeWarning( msg )
+		
+	# abort if it's empty
+	if metadata == '':
+		msg = 'Unable to upgrade. Could not fetch metadata contents.'
+		logger.debug( "DEBUG: " + msg )
+		raise RuntimeWarning( msg )
+
+	###########################
+	# DOWNLOAD LATEST VERSION #
+	###########################
+
+	# the only reason the SOURCE_DATE_EPOCH would be missing is if we're executing
+	# the python files directly (eg we're testing) and we can just get it from git
+	if BUSKILL_VERSION['SOURCE_DATE_EPOCH'] == '':
+		result = subprocess.run( [
+		 'git',
+		 '--git-dir=/home/user/sandbox/buskill-app/.git',
+		 'log',
+		 '-1',
+		 '--pretty=%ct'
+		], capture_output = True )
+		BUSKILL_VERSION['SOURCE_DATE_EPOCH'] = int( result.stdout )
+
+	# check metadata to see if there's a newer version than what we're running
+	latestRelease = metadata['latest']['buskill-app']['stable']
+	currentRelease = BUSKILL_VERSION['VERSION']
+
+	msg = "DEBUG: Current version: " +str(currentRelease)+ ".\n"
+	msg += "DEBUG: Latest version: " +str(latestRelease)+ "."
+	logger.debug( msg )
+
+	if LooseVersion(latestRelease) <= LooseVersion(currentRelease):
+		msg = "INFO: Current version is latest version. No new updates available."
+		logger.info( msg )
+		bk.upgrade_phase( None )
+		return bk.set_upgrade_result( 1 )
+
+	# currently we only support x86_64 builds..
+	arch = 'x86_64'
+
+	sha256sums_urls = metadata['updates']['buskill-app'][str(latestRelease)]['SHA256SUMS']
+	sha256sums_filepath = os.path.join( bk.CACHE_DIR, 'SHA256SUMS' )
+
+	signature_urls = metadata['updates']['buskill-app'][str(latestRelease)]['SHA256SUMS.asc']
+	signature_filepath = os.path.join( bk.CACHE_DIR, 'SHA256SUMS.asc' )
+
+	archive_urls = metadata['updates']['buskill-app'][str(latestRelease)][bk.OS_NAME_SHORT][arch]['archive']['url']
+	archive_filename = archive_urls[0].split('/')[-1]
+	archive_filepath = os.path.join( bk.CACHE_DIR, archive_filename )
+
+	# shuffle all three URLs but shuffle them the same
+	start_state = random.getstate()
+	random.shuffle( archive_urls )
+	random.setstate( start_state)
+	random.shuffle( sha256sums_urls )
+	random.setstate( start_state)
+	random.shuffle( signature_urls )
+	random.setstate( start_state)
+
+	bk.upgrade_phase( 'download' )
+
+	# loop through each of our downloads
+	files = [ signature_urls, sha256sums_urls, archive_urls ]
+	for f in files:
+
+		# break out of loop if we've already all necessary files from
+		# some mirror in our list
+		if os.path.exists( archive_filepath ) \
+		 and os.path.exists( sha256sums_filepath ) \
+		 and os.path.exists( signature_filepath ): \
+			break
+
+		# try to download the file from each of its mirrors, moving on to the
+		# next mirror if one fails or is too slow
+		for url in f:
+
+			msg = "DEBUG: Attempting to download '" +str(url)+ "'"
+			logger.debug( msg )
+
+			filename = url.split('/')[-1]
+			filepath = os.path.join( bk.CACHE_DIR, filename )
+
+			def on_size( size_bytes ):
+				if size_bytes == None:
+					bk.set_upgrade_status( "Downloading " +str(filename) )
+				else:
+					bk.set_upgrade_status( "Downloading " +str(filename)+ " (" +str(math.ceil(size_bytes/1024/1024))+ "MB)" )
+
+			try:
+				with open( filepath, 'wb' ) as out_file:
+					download( url, out_file, UPGRADE_DOWNLOAD_MAX_BYTES, on_size=on_size )
+				msg = "\tDone"
+				logger.debug( msg )
+				break
+
+			except SlowMirror as e:
+				bk.set_upgrade_status( e.status )
+				msg = "\tMirror too slow; skipping (" +str(e)+ ")"
+				logger.debug( msg )
+
+			except Exception as e:
+				msg = "\tFailed to download update; skipping (" +str(e)+ ")"
+				logger.debug( msg )
+
+			# don't leave a partial download behind
+			try:
+				os.remove( filepath )
+			except OSError:
+				pass
+
+		else:
+			msg = 'Unable to upgrade. Could not download ' +str( f[0].split('/')[-1] )+ ' from any mirror.'
+			logger.debug( "DEBUG: " + msg )
+			raise RuntimeWarning( msg )
+
+	####################
+	# VERIFY SIGNATURE #
+	####################
+
+	bk.upgrade_phase( 'verify_signature' )
+
+	bk.set_upgrade_status( "Verifying signature" )
+	msg = "DEBUG: Finished downloading update files. Checking signature."
+	logger.debug( msg )
+
+	try:
+		check_signature( gpg, signature_filepath, sha256sums_filepath )
+	except RuntimeError:
+		bk.wipeCache()
+		raise
+
+	####################
+	# VERIFY INTEGRITY #
+	####################
+
+	bk.upgrade_phase( 'verify_integrity' )
+
+	if not integrity_is_ok( sha256sums_filepath, [ archive_filepath ] ):
+		bk.wipeCache()
+		msg = 'ERROR: Integrity check failed. '
+		logger.debug( msg )
+		raise RuntimeError( msg )
+
+	bk.set_upgrade_status( "Verifying integrity" )
+	msg = "DEBUG: New version's integrity is valid."
+	logger.debug( msg )
+
+	###########
+	# INSTALL #
+	###########
+
+	bk.upgrade_phase( 'install' )
+
+	bk.set_upgrade_status( "Extracting archive" )
+	msg = "DEBUG: Extracting '" +str(archive_filepath)+ "' to '" +str(bk.APPS_DIR)+ "'"
+	logger.debug( msg )
+
+	if bk.OS_NAME_SHORT == 'lin':
+	
+		import tarfile
+		with tarfile.open( archive_filepath ) as archive_tarfile:
+
+			# get the path to the new executable
+			new_version_exe = [ file for file in archive_tarfile.getnames() if re.match( ".*buskill-[^/]+\.AppImage$", file ) ][0]
+			new_version_exe = bk.APPS_DIR + '/' + new_version_exe
+			archive_tarfile.extractall( path=bk.APPS_DIR )
+
+	elif bk.OS_NAME_SHORT == 'win':
+
+		import zipfile
+		with zipfile.ZipFile( archive_filepath ) as archive_zipfile:
+
+			# get the path to the new executable
+			new_version_exe = [ file for file in archive_zipfile.namelist() if re.match( ".*buskill\.exe$", file ) ][0]
+			new_version_exe = bk.APPS_DIR + '\\' + new_version_exe
+
+			archive_zipfile.extractall( path=bk.APPS_DIR )
+
+	elif bk.OS_NAME_SHORT == 'mac':
+
+		# create a new dir where we'll mount the dmg temporarily (since we can't
+		# extract DMGs and the python modules for extracting 7zip archives
+		# has many dependencies [so we don't use it])
+		dmg_mnt_path = os.path.join( bk.CACHE_DIR, 'dmg_mnt' )
+		os.makedirs( dmg_mnt_path, mode=0o700 )
+		os.chmod( dmg_mnt_path, mode=0o0700 )
+
+		# mount the dmg, copy the .app out, and unmount
+		subprocess.run( ['hdiutil', 'attach', '-mountpoint', dmg_mnt_path, archive_filepath] )
+		app_path = os.listdir( dmg_mnt_path ).pop()
+		shutil.copytree( dmg_mnt_path +'/'+ app_path, bk.APPS_DIR + '/' + app_path )
+		subprocess.run( ['hdiutil', 'detach', dmg_mnt_path] )
+
+		new_version_exe = bk.APPS_DIR+ '/' +app_path+ '/Contents/MacOS/buskill'
+
+	# create a file in new version's EXE_DIR so that it will know where the
+	# old version lives and be able to delete it on its first execution
+	contents = { 'APP_DIR': bk.APP_DIR }
+	new_version_exe_dir = os.path.abspath(
+	 os.path.join( new_version_exe, os.pardir)
+	)
+	with open( os.path.join( new_version_exe_dir, 'upgraded_from.py' ), 'w' ) as fd:
+		fd.write( 'UPGRADED_FROM = ' +str(contents) )
+	
+	# create a file in this current (now outdated) version's EXE_DIR so that
+	# it will be able to prompt the user to execute the newer version if they
+	# open this older version by mistake in the future
+	bk.UPGRADED_TO = { 'EXE_PATH': new_version_exe }
+	with open( os.path.join( bk.EXE_DIR, 'upgraded_to.py' ), 'w' ) as fd:
+		fd.write( 'UPGRADED_TO = ' +str(bk.UPGRADED_TO) )
+
+	msg = "INFO: Installed new version executable to  '" +str(new_version_exe)
+	logger.info( msg )
+
+	bk.upgrade_phase( None )
+	return bk.set_upgrade_result( new_version_exe )
+
+################################################################################
+#                                   OBJECTS                                    #
+################################################################################
+
+# raised by download() when a mirror is too slow. 'status' is a short reason
+# for the user (eg in the GUI's upgrade dialog)
+class SlowMirror( RuntimeWarning ):
+
+	def __init__( self, msg, status ):
+		super().__init__( msg )
+		self.status = status
+
+# keeps track of how fast a download is going. update() raises SlowMirror if
+# it averaged less than UPGRADE_MIN_BYTES_PER_SECOND over the last
+# UPGRADE_THROUGHPUT_WINDOW seconds
+class ThroughputMonitor:
+
+	def __init__( self, url, min_bytes_per_second=None, window=None ):
+
+		self.url = url
+		self.min_bytes_per_second = min_bytes_per_second or UPGRADE_MIN_BYTES_PER_SECOND
+		self.window = window or UPGRADE_THROUGHPUT_WINDOW
+
+		self.started_at = time.monotonic()
+		self.total_bytes = 0
+
+		# ( time, total_bytes ) samples; the first one is the newest sample that's
+		# at least 'window' seconds old
+		self.samples = collections.deque( [ ( self.started_at, 0 ) ] )
+
+	def update( self, nbytes ):
+
+		now = time.monotonic()
+		self.total_bytes += nbytes
+		self.samples.append( ( now, self.total_bytes ) )
+
+		while len(self.samples) > 1 and self.samples[1][0] <= now - self.window:
+			self.samples.popleft()
+
+		# give the download a whole window before judging it
+		if now - self.started_at < self.window:
+			return
+
+		since, since_bytes = self.samples[0]
+		bytes_per_second = ( self.total_bytes - since_bytes ) / max( now - since, 1e-9 )
+		if bytes_per_second >= self.min_bytes_per_second:
+			return
+
+		host = urllib.parse.urlparse( self.url ).netloc
+		msg = "'" +str(self.url)+ "' averaged " +str( int(bytes_per_second) )+ " bytes/s over the last " +str(self.window)+ " seconds (the minimum is " +str(self.min_bytes_per_second)+ " bytes/s)"
+		status = "Mirror " +str(host)[:64]+ " is too slow (" +str( math.ceil( bytes_per_second / 1024 ) )+ " KB/s); trying the next mirror"
+		raise SlowMirror( msg, status )
+